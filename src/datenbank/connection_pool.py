@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Speicher, den SQLite pro Verbindung per mmap einblenden darf (256 MB)
+MMAP_SIZE = 256 * 1024 * 1024
+# Anzahl vorbereiteter Statements, die jede Verbindung im Cache hält
+CACHED_STATEMENTS = 256
+
+# Tabellen, deren name -> id Zuordnung gecacht wird
+_ID_COLUMNS = {
+    "products": "product_id",
+    "substances": "substance_id",
+    "effects": "effect_id",
+}
+
+FileIdentity = Tuple[int, int]
+# Identität plus Änderungszeit und Größe: ändert sich bei jedem Schreibzugriff
+FileVersion = Tuple[int, int, int, int]
+
+_local = threading.local()
+_lock = threading.Lock()
+# (pfad, datei-version) -> {tabelle: {name: id}}
+_id_cache: Dict[Tuple[str, FileVersion], Dict[str, Dict[str, int]]] = {}
+# pfad -> (identität, anzahl offener verbindungen) des geteilten Caches
+_shared_cache_owner: Dict[str, Tuple[FileIdentity, int]] = {}
+# Vom Elternprozess geerbte Verbindungen (siehe _reset_after_fork)
+_inherited_connections: List[sqlite3.Connection] = []
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection mit Weakref-Unterstützung, damit das Schließen verfolgt werden kann."""
+
+
+def _stat(db_path: str) -> os.stat_result:
+    try:
+        return os.stat(db_path)
+    except FileNotFoundError:
+        raise ValueError(f"Database '{db_path}' not found!") from None
+
+
+def _file_identity(db_path: str) -> FileIdentity:
+    st = _stat(db_path)
+    return st.st_dev, st.st_ino
+
+
+def _file_version(db_path: str) -> FileVersion:
+    st = _stat(db_path)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _release_shared_cache(path: str, identity: FileIdentity) -> None:
+    with _lock:
+        owner = _shared_cache_owner.get(path)
+        if owner and owner[0] == identity:
+            if owner[1] <= 1:
+                del _shared_cache_owner[path]
+            else:
+                _shared_cache_owner[path] = (identity, owner[1] - 1)
+
+
+def _claim_shared_cache(path: str, identity: FileIdentity) -> bool:
+    """
+    SQLite ordnet den geteilten Cache über den Pfad zu. Wurde die Datei ersetzt,
+    während noch Verbindungen auf die alte Datei offen sind, würde eine neue
+    Verbindung mit cache=shared die alte Datei sehen. In diesem Fall wird ein
+    privater Cache verwendet.
+    """
+    with _lock:
+        owner = _shared_cache_owner.get(path)
+        if owner is None or owner[0] == identity:
+            count = owner[1] if owner else 0
+            _shared_cache_owner[path] = (identity, count + 1)
+            return True
+        return False
+
+
+def _open_read_connection(path: str, identity: FileIdentity) -> sqlite3.Connection:
+    shared = _claim_shared_cache(path, identity)
+    uri = f"{Path(path).as_uri()}?mode=ro&cache={'shared' if shared else 'private'}"
+    try:
+        conn = sqlite3.connect(
+            uri, uri=True, cached_statements=CACHED_STATEMENTS, factory=_PooledConnection
+        )
+    except Exception:
+        if shared:
+            _release_shared_cache(path, identity)
+        raise
+    if shared:
+        weakref.finalize(conn, _release_shared_cache, path, identity)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+def get_read_connection(db_path: str = "combinations.db") -> sqlite3.Connection:
+    """
+    Liefert eine langlebige, nur lesende Verbindung für den aktuellen Thread.
+
+    Jeder Thread erhält pro Datenbankdatei genau eine Verbindung (mode=ro,
+    shared cache, mmap). Wird die Datei ausgetauscht (z.B. durch einen Rebuild),
+    wird die Verbindung beim nächsten Aufruf neu geöffnet.
+    Die Verbindung darf nicht geschlossen werden.
+    """
+    path = os.path.abspath(db_path)
+    identity = _file_identity(path)
+
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    entry = connections.get(path)
+    if entry is not None:
+        if entry[0] == identity:
+            return entry[1]
+        entry[1].close()
+
+    conn = _open_read_connection(path, identity)
+    connections[path] = (identity, conn)
+    return conn
+
+
+def close_thread_connections() -> None:
+    """Schließt alle Verbindungen, die der aktuelle Thread geöffnet hat."""
+    connections = getattr(_local, "connections", None) or {}
+    for _, conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _reset_after_fork() -> None:
+    """
+    SQLite-Verbindungen dürfen nicht über einen fork hinweg benutzt werden. Ein Worker
+    (z.B. unter `gunicorn --preload`) öffnet deshalb eigene Verbindungen. Die geerbten
+    werden weder benutzt noch geschlossen, damit der Elternprozess nicht gestört wird.
+    """
+    global _local, _lock
+
+    connections = getattr(_local, "connections", None) or {}
+    _inherited_connections.extend(conn for _, conn in connections.values())
+    _local = threading.local()
+    _lock = threading.Lock()
+    _shared_cache_owner.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _load_id_map(db_path: str, table: str) -> Dict[str, int]:
+    conn = get_read_connection(db_path)
+    rows = conn.execute(f"SELECT name, {_ID_COLUMNS[table]} FROM {table}").fetchall()
+    return dict(rows)
+
+
+def get_id_map(db_path: str, table: str) -> Dict[str, int]:
+    """
+    Gibt die gecachte Zuordnung name -> id für 'products', 'substances' oder 'effects' zurück.
+    Der Cache gilt pro Datenbankdatei und Dateiversion: nach einem Austausch der Datei
+    oder einem Schreibzugriff (auch aus einem anderen Prozess) wird er neu geladen.
+    """
+    if table not in _ID_COLUMNS:
+        raise ValueError(f"No id map for table '{table}'")
+
+    path = os.path.abspath(db_path)
+    key = (path, _file_version(path))
+    with _lock:
+        cached = _id_cache.get(key, {}).get(table)
+    if cached is not None:
+        return cached
+
+    id_map = _load_id_map(path, table)
+    with _lock:
+        # Einträge zu ersetzten oder geänderten Dateien entfernen
+        for stale in [k for k in _id_cache if k[0] == path and k != key]:
+            del _id_cache[stale]
+        _id_cache.setdefault(key, {})[table] = id_map
+    return id_map
+
+
+def lookup_id(db_path: str, table: str, name: str) -> Optional[int]:
+    """
+    Sucht die id zu einem Namen (None, wenn es ihn nicht gibt). Unbekannte Namen laden
+    die Zuordnung nicht neu; das geschieht nur, wenn sich die Datei geändert hat.
+    """
+    return get_id_map(db_path, table).get(name)
+
+
+def invalidate_id_cache(db_path: Optional[str] = None) -> None:
+    """Verwirft die gecachten id-Zuordnungen (für eine Datei oder alle)."""
+    with _lock:
+        if db_path is None:
+            _id_cache.clear()
+            return
+        path = os.path.abspath(db_path)
+        for key in [k for k in _id_cache if k[0] == path]:
+            del _id_cache[key]
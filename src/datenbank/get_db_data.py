@@ -1,57 +1,100 @@
+import sqlite3
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.datenbank.connection_pool import get_id_map, get_read_connection, lookup_id
+from src.datenbank.initialize_db import effect_bit, get_layout
+
+_BEST_RECIPE_QUERY = """
+    SELECT c.id, c.modifier, c.sell_price, c.substance_cost,
+           (c.sell_price - c.substance_cost) AS profit
+    FROM calculated_combinations c
+    WHERE c.product_id = ?
+      AND c.combination_size = ?
+      AND c.max_level_id <= ?
+    ORDER BY profit DESC
+    LIMIT 1
+"""
+
+# Ältere Dateien ohne max_level_id: das Level wird über die Substanzen bestimmt
+_LEGACY_BEST_RECIPE_QUERY = """
+    SELECT c.id, c.modifier, c.sell_price, c.substance_cost,
+           (c.sell_price - c.substance_cost) AS profit
+    FROM calculated_combinations c
+    JOIN calculated_combination_substances cs ON c.id = cs.combination_id
+    JOIN substances s ON s.substance_id = cs.substance_id
+    WHERE c.product_id = ?
+      AND c.combination_size = ?
+    GROUP BY c.id
+    HAVING MAX(s.level_id) <= ?
+    ORDER BY profit DESC
+    LIMIT 1
+"""
+
+_RECIPE_SUBSTANCES_QUERY = """
+    SELECT s.name
+    FROM calculated_combination_substances cs
+    JOIN substances s ON s.substance_id = cs.substance_id
+    WHERE cs.combination_id = ?
+    ORDER BY cs.position
+"""
+
+
+# Leseverbindungen, deren Datei das aktuelle Schema hat (siehe _has_current_schema)
+_schema_checked: "weakref.WeakKeyDictionary[sqlite3.Connection, bool]" = weakref.WeakKeyDictionary()
+
+
+def _has_level_columns(conn: sqlite3.Connection) -> bool:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(calculated_combinations)")}
+    return {"effect_mask", "max_level_id"} <= columns
+
+
+def _has_current_schema(conn: sqlite3.Connection) -> bool:
+    """
+    Prüft, ob die Datei effect_mask/max_level_id und calculated_coverage hat. Leser
+    führen migrate_schema nicht aus (mode=ro); ältere Dateien gelten deshalb als leer,
+    und die Aufrufer berechnen die Ergebnisse selbst. Nur ein positives Ergebnis wird
+    pro Verbindung gemerkt: ältere Dateien werden bei jedem Aufruf neu geprüft, damit
+    eine Migration durch einen Schreiber ohne Neustart sichtbar wird.
+    """
+    if _schema_checked.get(conn):
+        return True
+    has_coverage = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'calculated_coverage'"
+    ).fetchone() is not None
+    current = has_coverage and _has_level_columns(conn)
+    if current:
+        _schema_checked[conn] = True
+    return current
+
+
 def get_best_recipe_filtered(product_name: str, max_level: int, combination_size: int, db_path="combinations.db"):
     """
     Führt eine Abfrage in der Datenbank durch, um das beste Rezept (höchster Profit)
     für das angegebene Produkt zu ermitteln, das nur Substanzen bis zu 'max_level' benutzt
     und genau 'combination_size' Substanzen enthält.
-    """
-    import sqlite3
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Finde die product_id
-    cursor.execute("SELECT product_id FROM products WHERE name = ? LIMIT 1", (product_name,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
+    Verwendet die thread-lokale Leseverbindung aus dem connection_pool und die
+    gecachte product_id.
+    """
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
         return None  # Produkt nicht gefunden
 
-    product_id = row[0]
+    conn = get_read_connection(db_path)
+    # ältere Dateien ohne max_level_id: Level über die Substanzen (langsamer)
+    query = _BEST_RECIPE_QUERY if _has_current_schema(conn) or _has_level_columns(conn) else _LEGACY_BEST_RECIPE_QUERY
 
     # Suche die beste Kombination basierend auf Profit, gefiltert nach Level und Kombinationgröße
-    query = """
-        SELECT c.id, c.modifier, c.sell_price, c.substance_cost,
-               (c.sell_price - c.substance_cost) AS profit
-        FROM calculated_combinations c
-        JOIN calculated_combination_substances cs ON c.id = cs.combination_id
-        JOIN substances s ON s.substance_id = cs.substance_id
-        WHERE c.product_id = ?
-          AND c.combination_size = ?
-        GROUP BY c.id
-        HAVING MAX(s.level_id) <= ?
-        ORDER BY profit DESC
-        LIMIT 1
-    """
-    cursor.execute(query, (product_id, combination_size, max_level))
-    best_combination = cursor.fetchone()
+    best_combination = conn.execute(query, (product_id, combination_size, max_level)).fetchone()
 
     if not best_combination:
-        conn.close()
         return None  # Keine passende Kombination gefunden
 
     combination_id, modifier, sell_price, substance_cost, profit = best_combination
 
     # Hole die zugehörigen Substanzen
-    cursor.execute("""
-        SELECT s.name
-        FROM calculated_combination_substances cs
-        JOIN substances s ON s.substance_id = cs.substance_id
-        WHERE cs.combination_id = ?
-        ORDER BY cs.position
-    """, (combination_id,))
-    substances = [r[0] for r in cursor.fetchall()]
-
-    conn.close()
+    substances = [r[0] for r in conn.execute(_RECIPE_SUBSTANCES_QUERY, (combination_id,))]
 
     return {
         "combination_id": combination_id,
@@ -60,4 +103,320 @@ def get_best_recipe_filtered(product_name: str, max_level: int, combination_size
         "substance_cost": substance_cost,
         "profit": profit,
         "substances": substances
-    }
\ No newline at end of file
+    }
+
+
+def get_stored_coverage(product_name: str, db_path="combinations.db") -> Dict[int, int]:
+    """
+    Gibt pro Kombinationsgröße das Substanz-Level zurück, bis zu dem alle
+    Kombinationen des Produkts in der Datenbank gespeichert sind.
+    """
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return {}
+    conn = get_read_connection(db_path)
+    if not _has_current_schema(conn):
+        return {}  # ältere Datei: keine Abdeckung bekannt
+    rows = conn.execute(
+        "SELECT combination_size, max_level_id FROM calculated_coverage WHERE product_id = ?",
+        (product_id,),
+    )
+    return dict(rows)
+
+
+def get_generation_checkpoint(product_name: str, combination_size: int, db_path="combinations.db") -> Optional[dict]:
+    """
+    Gibt den Checkpoint einer Batch-Generierung zurück (max_level, next_index,
+    completed) oder None, wenn für Produkt und Größe noch keiner existiert.
+    """
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return None
+    conn = get_read_connection(db_path)
+    try:
+        row = conn.execute("""
+            SELECT max_level_id, next_index, completed FROM generation_checkpoints
+            WHERE product_id = ? AND combination_size = ?
+        """, (product_id, combination_size)).fetchone()
+    except sqlite3.OperationalError:
+        return None  # Datenbank ohne Checkpoint-Tabelle
+    if not row:
+        return None
+    return {"max_level": row[0], "next_index": row[1], "completed": bool(row[2])}
+
+
+def has_stored_combinations(product_name: str, combination_size: int, db_path="combinations.db") -> bool:
+    """Prüft, ob für Produkt und Kombinationsgröße schon Kombinationen gespeichert sind."""
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return False
+    conn = get_read_connection(db_path)
+    row = conn.execute(
+        "SELECT 1 FROM calculated_combinations WHERE product_id = ? AND combination_size = ? LIMIT 1",
+        (product_id, combination_size),
+    ).fetchone()
+    return row is not None
+
+
+def get_stored_sizes(product_name: str, db_path="combinations.db") -> List[int]:
+    """Gibt die Kombinationsgrößen zurück, für die Kombinationen des Produkts gespeichert sind."""
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return []
+    conn = get_read_connection(db_path)
+    rows = conn.execute(
+        "SELECT DISTINCT combination_size FROM calculated_combinations WHERE product_id = ? ORDER BY combination_size",
+        (product_id,),
+    )
+    return [row[0] for row in rows]
+
+
+# (id, modifier, sell_price, substance_cost, effect_mask, max_level_id, Substanz-ids in Reihenfolge)
+StoredRow = Tuple[int, float, float, float, int, int, Tuple[int, ...]]
+
+
+def iter_stored_combinations(
+    product_name: str,
+    combination_size: int,
+    max_level: Optional[int] = None,
+    chunk_size: int = 50_000,
+    db_path="combinations.db",
+) -> Iterator[List[StoredRow]]:
+    """
+    Liest alle gespeicherten Kombinationen einer Größe in Blöcken von höchstens
+    'chunk_size' Zeilen (sortiert nach id), ohne die ganze Tabelle im Speicher zu halten.
+
+    Jeder Block ist eine Abfrage ab der letzten gelesenen id (Index auf product_id,
+    combination_size), die Substanzen eines Blocks kommen aus einer einzigen
+    Bereichsabfrage über den Primärschlüssel der Substanz-Tabelle statt einer
+    Abfrage pro Kombination. Im packed-Layout werden sie direkt aus der Hauptzeile entpackt.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return
+    conn = get_read_connection(db_path)
+    if not _has_current_schema(conn):
+        raise ValueError(f"Database '{db_path}' uses an old schema; store a combination or run migrate_schema first.")
+    packed = get_layout(conn.cursor()) == "packed"
+
+    conditions = "product_id = ? AND combination_size = ? AND id > ?"
+    params: list = [product_id, combination_size]
+    if max_level is not None:
+        conditions += " AND max_level_id <= ?"
+    query = f"""
+        SELECT id, modifier, sell_price, substance_cost, effect_mask, max_level_id{", substances" if packed else ""}
+        FROM calculated_combinations
+        WHERE {conditions}
+        ORDER BY id
+        LIMIT ?
+    """
+
+    last_id = 0
+    while True:
+        chunk_params = params + [last_id] + ([max_level] if max_level is not None else []) + [chunk_size]
+        rows = conn.execute(query, chunk_params).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        if packed:
+            yield [row[:6] + (tuple(row[6]),) for row in rows]
+        else:
+            # Ids anderer Produkte/Größen im Bereich werden übersprungen
+            substance_ids: Dict[int, List[int]] = {row[0]: [] for row in rows}
+            for combination_id, substance_id in conn.execute("""
+                SELECT combination_id, substance_id FROM calculated_combination_substances
+                WHERE combination_id BETWEEN ? AND ?
+                ORDER BY combination_id, position
+            """, (rows[0][0], last_id)):
+                ids = substance_ids.get(combination_id)
+                if ids is not None:
+                    ids.append(substance_id)
+            yield [row + (tuple(substance_ids[row[0]]),) for row in rows]
+
+        if len(rows) < chunk_size:
+            return
+
+
+def get_cheapest_states(
+    product_name: str, combination_size: int, max_level: int, db_path="combinations.db"
+) -> Dict[int, List[str]]:
+    """
+    Gibt pro gespeichertem Effekt-Zustand (effect_mask) die Substanzen der
+    günstigsten Kombination mit genau 'combination_size' Substanzen bis 'max_level' zurück.
+    """
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return {}
+    conn = get_read_connection(db_path)
+    if not _has_current_schema(conn):
+        return {}
+
+    # SQLite liefert bei MIN() die übrigen Spalten aus der Zeile mit dem Minimum
+    rows = conn.execute("""
+        WITH cheapest AS (
+            SELECT id, effect_mask, MIN(substance_cost)
+            FROM calculated_combinations
+            WHERE product_id = ? AND combination_size = ? AND max_level_id <= ?
+            GROUP BY effect_mask
+        )
+        SELECT c.effect_mask, s.name
+        FROM cheapest c
+        JOIN calculated_combination_substances cs ON cs.combination_id = c.id
+        JOIN substances s ON s.substance_id = cs.substance_id
+        ORDER BY c.id, cs.position
+    """, (product_id, combination_size, max_level))
+
+    states: Dict[int, List[str]] = {}
+    for effect_mask, substance_name in rows:
+        states.setdefault(effect_mask, []).append(substance_name)
+    return states
+
+
+def find_combinations_by_effects(
+    product_name: str,
+    include_effects: Iterable[str] = (),
+    exclude_effects: Iterable[str] = (),
+    max_level: Optional[int] = None,
+    combination_size: Optional[int] = None,
+    limit: int = 10,
+    order_by: str = "profit",
+    db_path="combinations.db",
+) -> List[dict]:
+    """
+    Sucht gespeicherte Kombinationen über die effect_mask: enthält alle Effekte aus
+    'include_effects', keinen aus 'exclude_effects', nur Substanzen bis 'max_level'
+    und optional genau 'combination_size' Substanzen.
+
+    order_by="profit" sortiert nach Profit absteigend, order_by="size" zuerst nach
+    Kombinationsgröße aufsteigend und dann nach Profit.
+    """
+    if order_by not in ("profit", "size"):
+        raise ValueError(f"Invalid order_by: {order_by}")
+
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        return []  # Produkt nicht gefunden
+
+    effect_ids = get_id_map(db_path, "effects")
+    include_bits = []
+    for name in include_effects:
+        if name not in effect_ids:
+            return []  # Unbekannter Effekt kann nie enthalten sein
+        include_bits.append(effect_bit(effect_ids[name]))
+    exclude_mask = 0
+    for name in exclude_effects:
+        if name in effect_ids:
+            exclude_mask |= effect_bit(effect_ids[name])
+
+    # Die Bits der geforderten Effekte werden als Literale eingesetzt (es sind
+    # intern berechnete Zahlen), damit SQLite die partiellen Effekt-Indizes nutzt.
+    conditions = ["product_id = ?"]
+    params: list = [product_id]
+    conditions += [f"(effect_mask & {bit}) != 0" for bit in include_bits]
+    if exclude_mask:
+        conditions.append("(effect_mask & ?) = 0")
+        params.append(exclude_mask)
+    if max_level is not None:
+        conditions.append("max_level_id <= ?")
+        params.append(max_level)
+    if combination_size is not None:
+        conditions.append("combination_size = ?")
+        params.append(combination_size)
+
+    order = "(sell_price - substance_cost) DESC"
+    if order_by == "size":
+        order = "combination_size ASC, " + order
+
+    query = f"""
+        SELECT id, combination_size, modifier, sell_price, substance_cost,
+               (sell_price - substance_cost) AS profit, effect_mask
+        FROM calculated_combinations
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {order}
+        LIMIT ?
+    """
+    params.append(limit)
+
+    conn = get_read_connection(db_path)
+    if not _has_current_schema(conn):
+        return []
+    bit_to_effect = {effect_bit(effect_id): name for name, effect_id in effect_ids.items()}
+
+    results = []
+    for combination_id, size, modifier, sell_price, substance_cost, profit, effect_mask in conn.execute(query, params).fetchall():
+        results.append({
+            "combination_id": combination_id,
+            "combination_size": size,
+            "modifier": modifier,
+            "sell_price": sell_price,
+            "substance_cost": substance_cost,
+            "profit": profit,
+            "substances": [r[0] for r in conn.execute(_RECIPE_SUBSTANCES_QUERY, (combination_id,))],
+            "effects": [name for bit, name in bit_to_effect.items() if effect_mask & bit],
+        })
+    return results
+
+
+def _unpooled_best_recipe(product_name: str, max_level: int, combination_size: int, db_path: str):
+    """Referenz für den Lasttest: öffnet pro Aufruf eine neue Verbindung (altes Verhalten)."""
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT product_id FROM products WHERE name = ? LIMIT 1", (product_name,)).fetchone()
+        if not row:
+            return None
+        best = conn.execute(_BEST_RECIPE_QUERY, (row[0], combination_size, max_level)).fetchone()
+        if not best:
+            return None
+        return [r[0] for r in conn.execute(_RECIPE_SUBSTANCES_QUERY, (best[0],))]
+    finally:
+        conn.close()
+
+
+def run_load_test(
+    product_name: str,
+    max_level: int,
+    combination_size: int,
+    db_path: str = "combinations.db",
+    threads: int = 8,
+    requests_per_thread: int = 200,
+):
+    """
+    Misst den Durchsatz (Abfragen/Sekunde) von get_best_recipe_filtered mit mehreren
+    Threads, einmal mit Pool und einmal mit neuer Verbindung pro Abfrage.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    results = {}
+    for label, func in (("unpooled", _unpooled_best_recipe), ("pooled", get_best_recipe_filtered)):
+        def worker(_):
+            for _ in range(requests_per_thread):
+                func(product_name, max_level, combination_size, db_path)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+        elapsed = time.perf_counter() - start
+        results[label] = threads * requests_per_thread / elapsed
+        print(f"{label:>9}: {results[label]:.1f} requests/s ({threads} threads, {elapsed:.2f}s)")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-threaded load test for get_best_recipe_filtered.")
+    parser.add_argument("--db", default="combinations.db")
+    parser.add_argument("--product", default="cocaine")
+    parser.add_argument("--max_level", type=int, default=51)
+    parser.add_argument("--combination_size", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per thread")
+    args = parser.parse_args()
+
+    run_load_test(args.product, args.max_level, args.combination_size, args.db, args.threads, args.requests)
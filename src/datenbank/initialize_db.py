@@ -1,8 +1,70 @@
 import sqlite3
 
-def initialize_database(db_path="combinations.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Effects that get their own partial index over calculated_combinations.
+# These are the effects that are filtered for most often.
+INDEXED_EFFECTS = (
+    "anti_gravity",
+    "cyclopean",
+    "electrifying",
+    "glowing",
+    "long_faced",
+    "shrinking",
+    "thought_provoking",
+    "tropic_thunder",
+    "zombifying",
+)
+
+
+# Storage layouts for calculated combinations:
+# - "normalized": one row per substance / effect in the child tables
+# - "packed": substance ids as a byte blob on the main row, effects only as
+#   effect_mask; the child tables are replaced by views with the same columns
+LAYOUTS = ("normalized", "packed")
+
+# Longest substance sequence the packed views unpack
+MAX_PACKED_SIZE = 16
+
+
+def effect_bit(effect_id: int) -> int:
+    """Bit of an effect in calculated_combinations.effect_mask (effect_id 1 -> bit 0)."""
+    return 1 << (effect_id - 1)
+
+
+def pack_substance_ids(substance_ids) -> bytes:
+    """Substance ids of a combination in order, one byte each (packed layout)."""
+    if len(substance_ids) > MAX_PACKED_SIZE:
+        raise ValueError(f"Packed layout stores at most {MAX_PACKED_SIZE} substances per combination!")
+    if any(not 0 < substance_id < 256 for substance_id in substance_ids):
+        raise ValueError("Packed layout requires substance ids between 1 and 255!")
+    return bytes(substance_ids)
+
+
+def unpack_substance_ids(blob: bytes):
+    """Inverse of pack_substance_ids."""
+    return list(blob)
+
+
+def get_layout(cursor: sqlite3.Cursor) -> str:
+    """Layout of an existing database ("normalized" for new, empty databases)."""
+    row = cursor.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'calculated_combination_substances'"
+    ).fetchone()
+    return "packed" if row and row[0] == "view" else "normalized"
+
+def create_schema(cursor: sqlite3.Cursor, layout=None):
+    """
+    Creates all tables that do not exist yet. 'layout' defaults to the layout
+    of the existing database; asking for a different one raises ValueError.
+    """
+    existing = get_layout(cursor)
+    layout = layout or existing
+    if layout not in LAYOUTS:
+        raise ValueError(f"Invalid layout: {layout}")
+    has_combinations = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'calculated_combinations'"
+    ).fetchone()
+    if has_combinations and layout != existing:
+        raise ValueError(f"Database uses the {existing} layout, not {layout}!")
 
     # Levels
     cursor.execute("""
@@ -79,10 +141,41 @@ def initialize_database(db_path="combinations.db"):
             modifier NUMERIC NOT NULL,
             sell_price NUMERIC NOT NULL,
             substance_cost NUMERIC NOT NULL,
+            effect_mask INTEGER NOT NULL DEFAULT 0,
+            max_level_id INTEGER,{packed_columns}
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        );
+    """.format(packed_columns="\n            substances BLOB NOT NULL," if layout == "packed" else ""))
+
+    # Highest substance level for which all combinations of a size are stored
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calculated_coverage (
+            product_id INTEGER NOT NULL,
+            combination_size INTEGER NOT NULL,
+            max_level_id INTEGER NOT NULL,
+            PRIMARY KEY (product_id, combination_size),
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        );
+    """)
+
+    # Progress of resumable batch generation: combinations with an enumeration
+    # index below next_index are stored (written in the same transaction)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS generation_checkpoints (
+            product_id INTEGER NOT NULL,
+            combination_size INTEGER NOT NULL,
+            max_level_id INTEGER NOT NULL,
+            next_index INTEGER NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, combination_size),
             FOREIGN KEY (product_id) REFERENCES products(product_id)
         );
     """)
 
+    if layout == "packed":
+        _create_packed_views(cursor)
+        return
+
     # Calculated_combination substances
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS calculated_combination_substances (
@@ -106,9 +199,114 @@ def initialize_database(db_path="combinations.db"):
         );
     """)
 
+
+def _create_packed_views(cursor: sqlite3.Cursor):
+    # Same columns as the normalized child tables, unpacked from the main row.
+    # Substance ids are compared byte by byte as hex, which works on every
+    # SQLite version (no unhex()).
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS calculated_combination_substances AS
+        WITH RECURSIVE positions(position) AS (
+            SELECT 0 UNION ALL SELECT position + 1 FROM positions WHERE position < {MAX_PACKED_SIZE - 1}
+        )
+        SELECT c.id AS combination_id, s.substance_id AS substance_id, p.position AS position
+        FROM calculated_combinations c
+        JOIN positions p ON p.position < length(c.substances)
+        JOIN substances s ON printf('%02X', s.substance_id) = hex(substr(c.substances, p.position + 1, 1));
+    """)
+
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS calculated_combination_effects AS
+        SELECT c.id AS combination_id, e.effect_id AS effect_id
+        FROM calculated_combinations c
+        JOIN effects e ON (c.effect_mask & (1 << (e.effect_id - 1))) != 0;
+    """)
+
+
+def migrate_schema(cursor: sqlite3.Cursor):
+    """Add the effect_mask / max_level_id columns to databases created before they existed."""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(calculated_combinations)")}
+
+    if "effect_mask" not in columns:
+        cursor.execute("ALTER TABLE calculated_combinations ADD COLUMN effect_mask INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("""
+            UPDATE calculated_combinations
+            SET effect_mask = (
+                SELECT COALESCE(SUM(1 << (ce.effect_id - 1)), 0)
+                FROM calculated_combination_effects ce
+                WHERE ce.combination_id = calculated_combinations.id
+            )
+        """)
+
+    if "max_level_id" not in columns:
+        cursor.execute("ALTER TABLE calculated_combinations ADD COLUMN max_level_id INTEGER")
+        cursor.execute("""
+            UPDATE calculated_combinations
+            SET max_level_id = (
+                SELECT MAX(s.level_id)
+                FROM calculated_combination_substances cs
+                JOIN substances s ON s.substance_id = cs.substance_id
+                WHERE cs.combination_id = calculated_combinations.id
+            )
+        """)
+
+
+def create_indexes(cursor: sqlite3.Cursor):
+    # Lookup of stored results by product and size
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_calculated_combinations_product_size
+        ON calculated_combinations (product_id, combination_size);
+    """)
+
+    # Reverse lookup: which combinations contain a substance / an effect
+    # (packed layout: views, effect lookups go through the effect indexes)
+    if get_layout(cursor) == "normalized":
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_calculated_combination_substances_substance
+            ON calculated_combination_substances (substance_id, combination_id);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_calculated_combination_effects_effect
+            ON calculated_combination_effects (effect_id, combination_id);
+        """)
+
+    # Effect queries: scan a product's results by descending profit
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_calculated_combinations_product_profit
+        ON calculated_combinations (product_id, (sell_price - substance_cost));
+    """)
+
+
+def create_effect_indexes(cursor: sqlite3.Cursor, effect_names=INDEXED_EFFECTS):
+    """
+    Partial indexes over the combinations that contain one of the common effects.
+    Queries have to repeat the literal predicate `(effect_mask & <bit>) != 0`
+    for SQLite to use them. Requires the effects table to be populated.
+    """
+    effect_ids = dict(cursor.execute("SELECT name, effect_id FROM effects"))
+    for name in effect_names:
+        if name not in effect_ids:
+            continue
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_calculated_combinations_effect_{name}
+            ON calculated_combinations (product_id, (sell_price - substance_cost))
+            WHERE (effect_mask & {effect_bit(effect_ids[name])}) != 0;
+        """)
+
+
+def initialize_database(db_path="combinations.db", layout=None):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    create_schema(cursor, layout)
+    migrate_schema(cursor)
+    create_indexes(cursor)
+    create_effect_indexes(cursor)
+    layout = get_layout(cursor)
+
     conn.commit()
     conn.close()
-    print(f"Database initialized at: {db_path}")
+    print(f"Database initialized at: {db_path} ({layout} layout)")
 
 # Run the function
 if __name__ == "__main__":
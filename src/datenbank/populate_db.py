@@ -1,129 +1,410 @@
+import os
 import sqlite3
-from typing import Dict
+from typing import Dict, Iterable, List, Optional
 
 from src.util.models import CombinationResult
+from src.datenbank.connection_pool import get_id_map, invalidate_id_cache, lookup_id
+from src.datenbank.initialize_db import (
+    create_schema, migrate_schema, create_indexes, create_effect_indexes, effect_bit, get_layout, pack_substance_ids
+)
 from src.lookup.lookup import effects, substances, products, level_name_to_int
 
-def populate_database(db_path="combinations.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
+def _bulk_load_reference_data(cursor: sqlite3.Cursor):
+    """
+    Schreibt alle Stammdaten mengenbasiert: ein executemany pro Tabelle und
+    eine einzige Abfrage pro Tabelle, um die vergebenen ids aufzulösen.
+    """
     # 1. LEVELS
-    for level_name, level_id in level_name_to_int.items():
-        cursor.execute("""
-            INSERT OR IGNORE INTO levels (level_id, level_name) VALUES (?, ?)
-        """, (level_id, level_name))
+    cursor.executemany("""
+        INSERT OR IGNORE INTO levels (level_id, level_name) VALUES (?, ?)
+    """, [(level_id, level_name) for level_name, level_id in level_name_to_int.items()])
 
     # 2. EFFECTS
-    effect_ids = {}
-    for effect in effects:
-        cursor.execute("""
-            INSERT OR IGNORE INTO effects (name, modificator) VALUES (?, ?)
-        """, (effect.name, float(effect.modificator)))
-        cursor.execute("SELECT effect_id FROM effects WHERE name = ?", (effect.name,))
-        effect_ids[effect.name] = cursor.fetchone()[0]
+    cursor.executemany("""
+        INSERT OR IGNORE INTO effects (name, modificator) VALUES (?, ?)
+    """, [(effect.name, float(effect.modificator)) for effect in effects])
+    effect_ids = dict(cursor.execute("SELECT name, effect_id FROM effects"))
 
     # 3. SUBSTANCES + SIDE EFFECTS
-    for substance in substances:
-        resulting_id = effect_ids.get(substance.resulting_effect)
-        level_id = substance.level
+    cursor.executemany("""
+        INSERT OR IGNORE INTO substances (name, price, level_id, resulting_effect_id)
+        VALUES (?, ?, ?, ?)
+    """, [
+        (substance.name, float(substance.price), substance.level, effect_ids.get(substance.resulting_effect))
+        for substance in substances
+    ])
+    substance_ids = dict(cursor.execute("SELECT name, substance_id FROM substances"))
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO substances (name, price, level_id, resulting_effect_id)
-            VALUES (?, ?, ?, ?)
-        """, (substance.name, float(substance.price), level_id, resulting_id))
+    cursor.executemany("""
+        INSERT OR IGNORE INTO side_effect_replacements
+        (substance_id, original_effect_id, replacement_effect_id)
+        VALUES (?, ?, ?)
+    """, [
+        (substance_ids[substance.name], effect_ids.get(orig), effect_ids.get(repl))
+        for substance in substances
+        for orig, repl in substance.side_effect_replacements.items()
+    ])
 
-        cursor.execute("SELECT substance_id FROM substances WHERE name = ?", (substance.name,))
-        substance_id = cursor.fetchone()[0]
+    # 4. PRODUCTS + PRODUCT_EFFECTS
+    cursor.executemany("""
+        INSERT OR IGNORE INTO products (name, base_sell_price, buy_price, level_id)
+        VALUES (?, ?, ?, ?)
+    """, [
+        (product.name, float(product.base_sell_price), float(product.buy_price), product.level)
+        for product in products
+    ])
+    product_ids = dict(cursor.execute("SELECT name, product_id FROM products"))
 
-        for orig, repl in substance.side_effect_replacements.items():
-            cursor.execute("""
-                INSERT OR IGNORE INTO side_effect_replacements
-                (substance_id, original_effect_id, replacement_effect_id)
-                VALUES (?, ?, ?)
-            """, (
-                substance_id,
-                effect_ids.get(orig),
-                effect_ids.get(repl)
-            ))
+    cursor.executemany("""
+        INSERT OR IGNORE INTO product_effects (product_id, effect_id)
+        VALUES (?, ?)
+    """, [
+        (product_ids[product.name], effect_ids[effect_name])
+        for product in products
+        for effect_name in product.effects
+        if effect_name in effect_ids
+    ])
 
-    # 4. PRODUCTS + PRODUCT_EFFECTS
-    for product in products:
-        level_id = product.level
-        cursor.execute("""
-            INSERT OR IGNORE INTO products (name, base_sell_price, buy_price, level_id)
-            VALUES (?, ?, ?, ?)
-        """, (product.name, float(product.base_sell_price), float(product.buy_price), level_id))
 
-        cursor.execute("SELECT product_id FROM products WHERE name = ?", (product.name,))
-        product_id = cursor.fetchone()[0]
+def populate_database(db_path="combinations.db"):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
 
-        for effect_name in product.effects:
-            effect_id = effect_ids.get(effect_name)
-            if effect_id:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO product_effects (product_id, effect_id)
-                    VALUES (?, ?)
-                """, (product_id, effect_id))
+    _bulk_load_reference_data(cursor)
+    create_effect_indexes(cursor)
 
     conn.commit()
     conn.close()
+    invalidate_id_cache(db_path)
     print("Datenbank erfolgreich befüllt.")
 
 
+# Tabellen mit berechneten Ergebnissen, die ein Rebuild übernimmt
+_RESULT_TABLES = ("calculated_combinations", "calculated_coverage", "generation_checkpoints")
+_NORMALIZED_RESULT_TABLES = ("calculated_combination_substances", "calculated_combination_effects")
 
-def store_all_combinations_normalized(
+
+def _table_columns(cursor: sqlite3.Cursor, schema: str, table: str) -> List[str]:
+    return [row[1] for row in cursor.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _has_results(db_path: str) -> bool:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT 1 FROM calculated_combinations LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False  # Datenbank ohne Ergebnistabelle
+    finally:
+        conn.close()
+
+
+def _copy_results(cursor: sqlite3.Cursor, old_path: str, layout: str):
+    """
+    Übernimmt alle berechneten Kombinationen, Coverage und Checkpoints aus 'old_path'.
+    Die ids der Stammdaten müssen in beiden Dateien gleich sein, sonst würden die
+    Ergebnisse auf falsche Produkte/Substanzen/Effekte zeigen.
+    """
+    cursor.execute("ATTACH DATABASE ? AS old", (old_path,))
+    try:
+        for table, id_column in (("products", "product_id"), ("substances", "substance_id"), ("effects", "effect_id")):
+            old_ids = dict(cursor.execute(f"SELECT name, {id_column} FROM old.{table}"))
+            new_ids = dict(cursor.execute(f"SELECT name, {id_column} FROM main.{table}"))
+            if any(new_ids.get(name) != old_id for name, old_id in old_ids.items()):
+                raise ValueError(
+                    f"The ids in '{table}' changed, stored results cannot be kept. "
+                    f"Use drop_results=True and generate them again."
+                )
+
+        tables = _RESULT_TABLES + (_NORMALIZED_RESULT_TABLES if layout == "normalized" else ())
+        for table in tables:
+            old_columns = set(_table_columns(cursor, "old", table))
+            if not old_columns:
+                continue  # ältere Datei ohne diese Tabelle
+            columns = ", ".join(c for c in _table_columns(cursor, "main", table) if c in old_columns)
+            cursor.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM old.{table}")
+    finally:
+        cursor.connection.commit()
+        cursor.execute("DETACH DATABASE old")
+
+
+def rebuild_database(db_path="combinations.db", layout=None, drop_results=False):
+    """
+    Baut Schema, Stammdaten und Indizes in einer neuen Datei auf und tauscht sie
+    atomar gegen 'db_path' aus. Leser arbeiten bis zum Austausch mit der alten Datei
+    weiter; der connection_pool öffnet danach automatisch die neue.
+
+    Berechnete Kombinationen, Coverage und Checkpoints werden in die neue Datei
+    kopiert. Das geht nur bei gleichem Speicherlayout und gleichen Stammdaten-ids;
+    sonst bricht der Rebuild mit ValueError ab, außer 'drop_results' ist gesetzt
+    (dann müssen die Ergebnisse neu erzeugt werden). Ohne 'layout' wird das
+    Speicherlayout der bestehenden Datei übernommen.
+    """
+    db_path = os.path.abspath(db_path)
+    existing_layout = None
+    keep_results = False
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        existing_layout = get_layout(conn.cursor())
+        conn.close()
+        keep_results = not drop_results and _has_results(db_path)
+    layout = layout or existing_layout
+    if keep_results:
+        if layout != existing_layout:
+            raise ValueError(
+                f"Stored results use the {existing_layout} layout and cannot be kept in the {layout} layout. "
+                f"Use drop_results=True."
+            )
+        # ältere Dateien erst um effect_mask / max_level_id ergänzen
+        conn = sqlite3.connect(db_path)
+        migrate_schema(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    tmp_path = f"{db_path}.rebuild-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        cursor = conn.cursor()
+        create_schema(cursor, layout)
+        _bulk_load_reference_data(cursor)
+        conn.commit()
+        if keep_results:
+            _copy_results(cursor, db_path, layout)
+        create_indexes(cursor)
+        create_effect_indexes(cursor)
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    invalidate_id_cache(db_path)
+    print(f"Datenbank neu aufgebaut: {db_path}" + (" (Ergebnisse übernommen)" if keep_results else ""))
+
+
+def store_all_combinations(
     db_path: str,
     product_name: str,
     combination_size: int,
-    combinations: Dict[str, CombinationResult]
+    combinations: Dict[str, CombinationResult],
+    record_coverage: bool = False,
+    max_level: Optional[int] = None
 ):
+    """
+    Speichert Kombinationen im Speicherlayout der Datenbank (normalisiert oder gepackt).
+    Zur Abdeckung siehe store_all_combinations_normalized.
+    """
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    layout = get_layout(conn.cursor())
+    conn.close()
 
-    # Lookup maps
-    cursor.execute("SELECT product_id FROM products WHERE name = ?", (product_name,))
-    product_id = cursor.fetchone()[0]
+    if layout == "packed":
+        store_all_combinations_packed(db_path, product_name, combination_size, combinations, record_coverage, max_level)
+    else:
+        store_all_combinations_normalized(
+            db_path, product_name, combination_size, combinations, record_coverage, max_level
+        )
 
-    cursor.execute("SELECT name, substance_id FROM substances")
-    substance_map = dict(cursor.fetchall())
 
-    cursor.execute("SELECT name, effect_id FROM effects")
-    effect_map = dict(cursor.fetchall())
+def _combination_rows(db_path: str, product_name: str, combinations: Iterable[CombinationResult]):
+    """
+    Bereitet die Kombinationen für das Schreiben vor.
 
-    for result in combinations.values():
+    Returns:
+        product_id und pro Kombination
+        (Hauptzeile ohne product_id/Größe, Substanz-ids in Reihenfolge, Effekt-ids).
+    """
+    # Lookup maps (gecacht im connection_pool)
+    product_id = lookup_id(db_path, "products", product_name)
+    if product_id is None:
+        raise ValueError(f"Product '{product_name}' not found in {db_path}!")
+    substance_map = get_id_map(db_path, "substances")
+    effect_map = get_id_map(db_path, "effects")
+    substance_levels = {substance.name: substance.level for substance in substances}
 
-        cursor.execute("""
-            INSERT INTO calculated_combinations (
-                product_id, combination_size, modifier, sell_price, substance_cost
-            ) VALUES (?, ?, ?, ?, ?)
-        """, (
-            product_id,
-            combination_size,
+    rows = []
+    for result in combinations:
+        effect_ids = [effect_map[eff] for eff in result.effects if eff in effect_map]
+        effect_mask = 0
+        for effect_id in effect_ids:
+            effect_mask |= effect_bit(effect_id)
+        max_level_id = max((substance_levels.get(sub, 0) for sub in result.substances), default=0)
+
+        main_row = (
             round(float(result.modifier), 2),
             round(float(result.sell_price), 2),
-            round(float(result.substance_cost), 2)
-        ))
+            round(float(result.substance_cost), 2),
+            effect_mask,
+            max_level_id
+        )
+        substance_ids = [substance_map[sub] for sub in result.substances if sub in substance_map]
+        rows.append((main_row, substance_ids, effect_ids))
+    return product_id, rows
+
+
+def _record_coverage(cursor: sqlite3.Cursor, product_id: int, combination_size: int, max_level: int):
+    """
+    Vermerkt, dass alle Kombinationen der Größe mit Substanzen bis 'max_level' gespeichert
+    sind (als höchstes tatsächlich vorkommendes Substanz-Level). Eine bestehende höhere
+    Abdeckung bleibt erhalten.
+    """
+    covered_level = max((substance.level for substance in substances if substance.level <= max_level), default=0)
+    cursor.execute("""
+        INSERT INTO calculated_coverage (product_id, combination_size, max_level_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT (product_id, combination_size)
+        DO UPDATE SET max_level_id = MAX(max_level_id, excluded.max_level_id)
+    """, (product_id, combination_size, covered_level))
+
+
+def _insert_normalized(cursor: sqlite3.Cursor, product_id: int, combination_size: int, rows):
+    for main_row, substance_ids, effect_ids in rows:
+        cursor.execute("""
+            INSERT INTO calculated_combinations (
+                product_id, combination_size, modifier, sell_price, substance_cost,
+                effect_mask, max_level_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (product_id, combination_size) + main_row)
         combination_id = cursor.lastrowid
 
-        for idx, sub in enumerate(result.substances):
-            substance_id = substance_map.get(sub)
-            if substance_id:
-                cursor.execute("""
-                    INSERT INTO calculated_combination_substances (
-                        combination_id, substance_id, position
-                    ) VALUES (?, ?, ?)
-                """, (combination_id, substance_id, idx))
-
-        for eff in result.effects:
-            effect_id = effect_map.get(eff)
-            if effect_id:
-                cursor.execute("""
-                    INSERT INTO calculated_combination_effects (
-                        combination_id, effect_id
-                    ) VALUES (?, ?)
-                """, (combination_id, effect_id))
+        for idx, substance_id in enumerate(substance_ids):
+            cursor.execute("""
+                INSERT INTO calculated_combination_substances (
+                    combination_id, substance_id, position
+                ) VALUES (?, ?, ?)
+            """, (combination_id, substance_id, idx))
+
+        for effect_id in effect_ids:
+            cursor.execute("""
+                INSERT INTO calculated_combination_effects (
+                    combination_id, effect_id
+                ) VALUES (?, ?)
+            """, (combination_id, effect_id))
+
+
+def _insert_packed(cursor: sqlite3.Cursor, product_id: int, combination_size: int, rows):
+    cursor.executemany("""
+        INSERT INTO calculated_combinations (
+            product_id, combination_size, modifier, sell_price, substance_cost,
+            effect_mask, max_level_id, substances
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (product_id, combination_size) + main_row + (pack_substance_ids(substance_ids),)
+        for main_row, substance_ids, _ in rows
+    ))
+
+
+def _check_coverage_args(record_coverage: bool, max_level: Optional[int]):
+    if record_coverage and max_level is None:
+        raise ValueError("record_coverage needs the max_level the combinations were enumerated with.")
+
+
+def store_all_combinations_normalized(
+    db_path: str,
+    product_name: str,
+    combination_size: int,
+    combinations: Dict[str, CombinationResult],
+    record_coverage: bool = False,
+    max_level: Optional[int] = None
+):
+    """
+    Speichert Kombinationen normalisiert und zusätzlich mit effect_mask und
+    max_level_id auf der Hauptzeile. Mit 'record_coverage' wird vermerkt, dass alle
+    Kombinationen dieser Größe mit Substanzen bis 'max_level' gespeichert sind. Das darf
+    nur der Aufrufer entscheiden, der sie vollständig aufgezählt hat (nicht bei Pruning
+    oder abgebrochener Suche); 'max_level' ist dann Pflicht.
+    """
+    _check_coverage_args(record_coverage, max_level)
+    product_id, rows = _combination_rows(db_path, product_name, combinations.values())
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_schema(cursor, "normalized")
+    migrate_schema(cursor)
+
+    _insert_normalized(cursor, product_id, combination_size, rows)
+
+    if record_coverage:
+        _record_coverage(cursor, product_id, combination_size, max_level)
 
     conn.commit()
     conn.close()
     print(f"{len(combinations)} Kombinationen (normalisiert) gespeichert.")
+
+
+def store_all_combinations_packed(
+    db_path: str,
+    product_name: str,
+    combination_size: int,
+    combinations: Dict[str, CombinationResult],
+    record_coverage: bool = False,
+    max_level: Optional[int] = None
+):
+    """
+    Speichert Kombinationen im gepackten Layout: eine Zeile pro Kombination mit
+    den Substanz-ids als Byte-Blob und den Effekten als effect_mask. Die Views
+    calculated_combination_substances/-effects liefern dieselbe Form wie das
+    normalisierte Layout. Abdeckung wie bei store_all_combinations_normalized.
+    """
+    _check_coverage_args(record_coverage, max_level)
+    product_id, rows = _combination_rows(db_path, product_name, combinations.values())
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_schema(cursor, "packed")
+
+    _insert_packed(cursor, product_id, combination_size, rows)
+
+    if record_coverage:
+        _record_coverage(cursor, product_id, combination_size, max_level)
+
+    conn.commit()
+    conn.close()
+    print(f"{len(combinations)} Kombinationen (gepackt) gespeichert.")
+
+
+def store_combination_chunk(
+    db_path: str,
+    product_name: str,
+    combination_size: int,
+    max_level: int,
+    combinations: List[CombinationResult],
+    next_index: int,
+    completed: bool = False
+):
+    """
+    Speichert einen Teil einer Batch-Generierung und setzt den Checkpoint in
+    derselben Transaktion: nach einem Abbruch sind entweder die Kombinationen
+    und der Checkpoint gespeichert oder keins von beiden. 'next_index' ist der
+    Enumerationsindex der ersten noch nicht gespeicherten Kombination.
+    Mit 'completed' wird zusätzlich die Abdeckung der Größe vermerkt.
+    """
+    product_id, rows = _combination_rows(db_path, product_name, combinations)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        create_schema(cursor)
+        migrate_schema(cursor)
+
+        if get_layout(cursor) == "packed":
+            _insert_packed(cursor, product_id, combination_size, rows)
+        else:
+            _insert_normalized(cursor, product_id, combination_size, rows)
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO generation_checkpoints
+            (product_id, combination_size, max_level_id, next_index, completed)
+            VALUES (?, ?, ?, ?, ?)
+        """, (product_id, combination_size, max_level, next_index, int(completed)))
+
+        if completed:
+            _record_coverage(cursor, product_id, combination_size, max_level)
+
+        conn.commit()
+    finally:
+        conn.close()
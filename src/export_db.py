@@ -0,0 +1,31 @@
+import argparse
+import sys
+
+from functionality.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, EXPORT_SOURCES, export_combinations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stream combination tables to CSV, Arrow or Parquet (Arrow/Parquet need pyarrow), "
+                    "from the enumerator or from a database, in bounded-memory chunks."
+    )
+    parser.add_argument("--products", nargs="+", required=True, help="e.g. cocaine og_kush")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help="combination sizes, e.g. 1 2 3 (default with --source db: all stored sizes)")
+    parser.add_argument("--source", choices=EXPORT_SOURCES, default="enumerate")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", required=True, help="output file, or directory with --per_product")
+    parser.add_argument("--per_product", action="store_true", help="one file per product in the --output directory")
+    parser.add_argument("--workers", type=int, default=1, help="processes for --per_product")
+    parser.add_argument("--max_level", default="max")
+    parser.add_argument("--db", default="combinations.db")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk")
+    args = parser.parse_args()
+
+    max_level = int(args.max_level) if args.max_level.isdigit() else args.max_level
+    written = export_combinations(
+        args.products, args.output, args.format, args.source, args.sizes, max_level,
+        args.chunk_size, args.db, args.per_product, args.workers
+    )
+    for path, rows in written.items():
+        print(f"{path}: {rows} row(s)", file=sys.stderr)
@@ -0,0 +1,238 @@
+import json
+import multiprocessing
+import queue
+import sys
+import time
+from dataclasses import asdict
+from functools import partial
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from functionality.calc_modifier import decimal_default, find_min_substances_for_effect, get_best_mix
+from functionality.engine import is_preloaded, preload_engine
+from functionality.planner import plan_search, resolve_max_level, run_plan
+from functionality.profiling import run_profiled, worker_profile_dir
+from functionality.search_control import SearchControl
+
+QUERY_TYPES = ("best_mix", "min_substances")
+
+
+def _effect_list(effects) -> List[str]:
+    if effects is None:
+        return []
+    if isinstance(effects, str):
+        effects = effects.split(",")
+    return sorted({effect.strip().lower().replace(" ", "_") for effect in effects if effect.strip()})
+
+
+def normalize_query(raw: dict) -> dict:
+    """
+    Complete a batch query with its defaults and normalize names, so identical queries
+    compare equal. Raises ValueError for invalid queries.
+
+    best_mix: product, max_level ("max"), combination_size (4), beam_width, time_budget
+    min_substances: product, desired, not_desired, max_level ("max"), max_search_size (4),
+        max_results (10), time_budget
+    The type defaults to "min_substances" if `desired` is given, else "best_mix".
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Query must be a JSON object")
+    query_type = raw.get("type") or ("min_substances" if raw.get("desired") else "best_mix")
+    if query_type not in QUERY_TYPES:
+        raise ValueError(f"Unknown query type: {query_type}")
+    if not raw.get("product"):
+        raise ValueError("Missing 'product'")
+
+    query = {
+        "type": query_type,
+        "product": raw["product"].lower().replace(" ", "_"),
+        "max_level": resolve_max_level(raw.get("max_level", "max")),
+        "time_budget": raw.get("time_budget"),
+    }
+    if query_type == "best_mix":
+        query["combination_size"] = int(raw.get("combination_size", 4))
+        query["beam_width"] = raw.get("beam_width")
+    else:
+        query["desired"] = _effect_list(raw.get("desired"))
+        query["not_desired"] = _effect_list(raw.get("not_desired"))
+        query["max_search_size"] = int(raw.get("max_search_size", 4))
+        query["max_results"] = int(raw.get("max_results", 10))
+        if not query["desired"]:
+            raise ValueError("No desired effects provided.")
+    return query
+
+
+def _query_key(query: dict) -> str:
+    return json.dumps(query, sort_keys=True)
+
+
+def run_query(query: dict) -> dict:
+    """Run one normalized query; errors are returned as {"error": message}."""
+    try:
+        control = SearchControl(time_budget=query["time_budget"])
+        if query["type"] == "best_mix":
+            if query["beam_width"]:
+                _, best_modifier, best_profit = get_best_mix(
+                    query["combination_size"], query["product"], query["max_level"], control=control,
+                    approximate=True, beam_width=query["beam_width"]
+                )
+            else:
+                plan = plan_search(
+                    "best_mix", query["product"], query["max_level"], query["combination_size"],
+                    allow_parallel=False
+                )
+                best_modifier, best_profit = run_plan(plan, control)
+            result = {
+                "best_modifier": asdict(best_modifier) if best_modifier else None,
+                "best_profit": asdict(best_profit) if best_profit else None,
+            }
+        else:
+            size, results = find_min_substances_for_effect(
+                product_name=query["product"],
+                desired_effects=query["desired"],
+                not_desired_effects=query["not_desired"],
+                max_level=query["max_level"],
+                max_search_size=query["max_search_size"],
+                max_results=query["max_results"],
+                control=control,
+            )
+            result = {"size": size, "results": [asdict(entry) for entry in results]}
+        result["optimal"] = control.optimal
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _init_worker() -> None:
+    # forked workers inherit the preloaded engine, spawned ones build it here
+    if not is_preloaded():
+        preload_engine()
+
+
+def _read_lines(source: TextIO) -> Iterator[Tuple[Optional[str], Optional[dict], Optional[str]]]:
+    """
+    (key, normalized query, id) per non-empty input line, as soon as the line is read;
+    (None, error record, None) for invalid lines. The error record carries the line's id
+    if the line is a JSON object.
+    """
+    # readline instead of iterating the file, which reads ahead on some streams
+    for number, line in enumerate(iter(source.readline, ""), start=1):
+        if not line.strip():
+            continue
+        raw = None
+        try:
+            raw = json.loads(line)
+            query = normalize_query(raw)
+            yield _query_key(query), query, raw.get("id")
+        except (ValueError, TypeError, AttributeError) as e:
+            record = {"id": raw.get("id")} if isinstance(raw, dict) else {}
+            yield None, {**record, "error": f"line {number}: {e}"}, None
+
+
+# Put into the entry queue after the last input line
+_END_OF_INPUT = object()
+
+
+def _dispatch(lines: Iterator[tuple], entries: "queue.Queue") -> Iterator[dict]:
+    """
+    Unique queries of `lines` for the process pool, in order of their first line. Every
+    line is also passed on to `entries`, so the results can be written in input order
+    while later lines are still being read. Runs in the pool's task thread.
+    """
+    seen = set()
+    try:
+        for entry in lines:
+            entries.put(entry)
+            key, query, _ = entry
+            if key is not None and key not in seen:
+                seen.add(key)
+                yield query
+    except Exception as e:
+        entries.put(e)
+    finally:
+        entries.put(_END_OF_INPUT)
+
+
+def _queued(entries: "queue.Queue") -> Iterator[tuple]:
+    while True:
+        entry = entries.get()
+        if entry is _END_OF_INPUT:
+            return
+        if isinstance(entry, Exception):
+            raise entry
+        yield entry
+
+
+def run_batch(
+    source: TextIO,
+    output: TextIO,
+    workers: int = 1,
+    chunk_size: int = 1
+) -> Dict[str, float]:
+    """
+    Answer JSONL queries from `source` and write one JSONL result per query to `output`,
+    in input order.
+
+    Identical queries (after normalization) are run once. The engine is preloaded once
+    for the whole batch; with `workers` > 1 the unique queries are spread over a process
+    pool. Lines are read and dispatched as they arrive (e.g. on stdin), and results are
+    written as soon as all earlier lines are answered.
+
+    Returns:
+        Dict[str, float]: Number of queries, unique queries, errors and seconds.
+    """
+    start = time.perf_counter()
+    preload_engine()
+    lines = _read_lines(source)
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        profile_dir = worker_profile_dir()
+        task = partial(run_profiled, profile_dir, run_query) if profile_dir else run_query
+        queued: "queue.Queue" = queue.Queue()
+        # imap pulls the unique queries from the input in its own thread
+        answers: Iterator[dict] = pool.imap(task, _dispatch(lines, queued), chunk_size)
+        entries = _queued(queued)
+        answer = lambda query: next(answers)
+    else:
+        entries = lines
+        answer = run_query
+
+    # unique queries are answered in order of their first line
+    results: Dict[str, dict] = {}
+    count = errors = 0
+    try:
+        for key, query, extra in entries:
+            if key is None:
+                record = query
+            else:
+                if key not in results:
+                    results[key] = answer(query)
+                record = {"id": extra, "query": query, **results[key]}
+            count += 1
+            errors += "error" in record
+            output.write(json.dumps(record, default=decimal_default) + "\n")
+            output.flush()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return {
+        "queries": count,
+        "unique": len(results),
+        "errors": errors,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def run_batch_file(path: str, output_path: Optional[str] = None, workers: int = 1) -> Dict[str, float]:
+    """run_batch on a file ("-" for stdin), writing to `output_path` or stdout."""
+    source = sys.stdin if path == "-" else open(path)
+    output = open(output_path, "w") if output_path else sys.stdout
+    try:
+        return run_batch(source, output, workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
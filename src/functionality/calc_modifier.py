@@ -1,8 +1,9 @@
 import sys
 import os
+import logging
 from decimal import Decimal
-from typing import Dict, List, Union, Tuple
-from itertools import product as itertool_product
+from typing import Dict, List, Optional, Union, Tuple
+from itertools import islice, product as itertool_product
 import time 
 from functools import wraps
 
@@ -10,14 +11,33 @@ from functools import wraps
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from functionality.logging.logging_config import setup_logging
-logger = setup_logging()
+logger = setup_logging(__name__)
 logger.info("Starting the calculation process...")
 
 from src.lookup.lookup import substances, effects, products, level_name_to_int
-from src.util.models import CombinationResult
+from src.util.models import CombinationResult, Substance
 from src.datenbank.initialize_db import initialize_database
-from src.datenbank.populate_db import populate_database, store_all_combinations_normalized
-from src.datenbank.get_db_data import get_best_recipe_filtered
+from src.datenbank.populate_db import populate_database, store_all_combinations, store_combination_chunk
+from src.datenbank.get_db_data import (
+    get_best_recipe_filtered, get_stored_coverage, find_combinations_by_effects, get_generation_checkpoint,
+    has_stored_combinations
+)
+from functionality.pareto import ParetoFrontier
+from functionality.dominance import compute_substance_dominance
+from functionality.search_control import SearchControl
+from functionality.state_layers import (
+    expand_layer, layer_from_db, layer_results, load_layer_snapshot, save_layer_snapshot, snapshot_path, start_layer
+)
+from functionality.transitions import TransitionTable
+from functionality.transition_memo import memo as transition_memo
+from functionality.solvers import (
+    beam_search_best_mix, meet_in_middle_min_substances, multi_state_bfs_min_substances, state_dp_best_mix
+)
+
+# Lookup maps used for every evaluated combination, built once at import
+_EFFECT_MODIFICATORS: Dict[str, float] = {effect.name: effect.modificator for effect in effects}
+_SUBSTANCE_MAP: Dict[str, Substance] = {substance.name: substance for substance in substances}
+_PRODUCT_MAP = {product.name: product for product in products}
 
 def timing(func):
     """
@@ -45,6 +65,25 @@ def decimal_default(obj):
 
 
 
+def _apply_substance(state: Tuple[str, ...], substance: Substance) -> Tuple[str, ...]:
+    """Active effects (in activation order) after adding `substance` to `state`."""
+    active_effects = dict.fromkeys(state)
+    replace_effects: List[str] = []
+
+    # Apply side effect replacements
+    for effect, replacement in substance.side_effect_replacements.items():
+        if effect in active_effects:
+            active_effects.pop(effect)
+            replace_effects.append(replacement)
+
+    for effect in replace_effects:
+        active_effects[effect] = None
+
+    # Apply resulting effect
+    active_effects[substance.resulting_effect] = None
+    return tuple(active_effects)
+
+
 def _calculate_modificator(
     substance_names: List[str], 
     product_name: str = None
@@ -52,6 +91,9 @@ def _calculate_modificator(
     """
     Calculate the total price modifier and returns the modifier and the active effects.
 
+    Transitions and modifier sums are looked up in the process-wide transition memo
+    and only computed on a miss.
+
     Args:
         substance_names (List[str]): List of substance names to calculate the modifier for.
         product_name (str, optional): Name of the product to include its effects.
@@ -59,66 +101,80 @@ def _calculate_modificator(
     Returns:
         Tuple[float, Dict[str, float]]: The total price modifier and a dictionary of active effects with their modifiers.
     """
-    effect_modificators = {effect.name: effect.modificator for effect in effects}
-    substance_map = {substance.name: substance for substance in substances}
-    product_map = {product.name: product for product in products}
-
-    total_modificator: float = 0.0
-    active_effects: Dict[str, float] = {}
-    
+    state: Tuple[str, ...] = ()
 
     # Add product effects if a product is provided
     if product_name:
-        product = product_map.get(product_name)
+        product = _PRODUCT_MAP.get(product_name)
         if not product:
             logger.error(f"Product '{product_name}' not found!")
             raise ValueError(f"Product '{product_name}' not found!")
-        for effect in product.effects:
-            active_effects[effect] = effect_modificators.get(effect, 0.0)
-
+        state = tuple(dict.fromkeys(product.effects))
 
     # Process substances
+    transitions = transition_memo.name_transitions
     for name in substance_names:
-        replace_effects: List[str] = []
-
-        substance = substance_map.get(name)
-        if not substance:
-            logger.error(f"Substance '{name}' not found!")
-            raise ValueError(f"Substance '{name}' not found!")
-        
-        # Apply side effect replacements
-        for effect, replacement in substance.side_effect_replacements.items():
-            if effect in active_effects:
-                active_effects.pop(effect)
-                replace_effects.append(replacement)
-
-        for effect in replace_effects:
-            active_effects[effect] = effect_modificators.get(effect, 0.0)  
-
-        # Apply resulting effect
-        resulting_effect = substance.resulting_effect
-        active_effects[resulting_effect] = effect_modificators.get(resulting_effect, 0.0)
-
-
-    total_modificator = sum(active_effects.values())
+        key = (state, name)
+        next_state = transitions.get(key)
+        if next_state is None:
+            substance = _SUBSTANCE_MAP.get(name)
+            if not substance:
+                logger.error(f"Substance '{name}' not found!")
+                raise ValueError(f"Substance '{name}' not found!")
+            next_state = _apply_substance(state, substance)
+            transitions.put(key, next_state)
+        state = next_state
+
+    total_modificator = transition_memo.name_modifiers.get(state)
+    if total_modificator is None:
+        total_modificator = sum(_EFFECT_MODIFICATORS.get(effect, 0.0) for effect in state)
+        transition_memo.name_modifiers.put(state, total_modificator)
+
+    active_effects = {effect: _EFFECT_MODIFICATORS.get(effect, 0.0) for effect in state}
     return total_modificator, active_effects
 
 
 def _calculate_price(product_name: str, total_effect_multiplier: float) -> Decimal:
     """Calculate the final price based on the product's base price and total effect multiplier."""
-    product_map = {product.name: product for product in products}
-    product = product_map.get(product_name)
-    
+    product = _PRODUCT_MAP.get(product_name)
+
     if not product:
         raise ValueError(f"Product '{product_name}' not found!")
     
     return Decimal(float(product.base_sell_price) * (1 + total_effect_multiplier))
 
+def _evaluate_combination(
+    combination: Tuple[str, ...],
+    product_name: str,
+    substance_map: Dict[str, Substance]
+) -> CombinationResult:
+    """Modifier, sell price, cost and effects of one combination."""
+    # Calculate the modifier for the current combination
+    current_multiplier, active_effects = _calculate_modificator(list(combination), product_name)
+
+    sell_price = _calculate_price(product_name, current_multiplier)
+
+    # Calculate the manufacturing cost
+    substance_cost = sum(
+        substance_map[substance].price for substance in combination
+    )
+
+    return CombinationResult(
+        sell_price=sell_price,
+        substance_cost=substance_cost,
+        modifier=current_multiplier,
+        substances=list(combination),
+        effects=list(active_effects.keys()),
+    )
+
 @timing
 def _find_best_combinations(
     combination_size: int, 
     product_name: str, 
-    max_level: Union[int, str]
+    max_level: Union[int, str],
+    prune_dominated: bool = False,
+    control: Optional[SearchControl] = None,
+    keep_combinations: Optional[bool] = None
 ) -> Tuple[Dict[int, Dict[str, CombinationResult]], CombinationResult, CombinationResult]:
     """
     Find all combinations of substances and calculate their total effect multiplier, price, and profit.
@@ -128,16 +184,28 @@ def _find_best_combinations(
         combination_size (int): Number of substances to combine.
         product_name (str): The product for which the price is calculated.
         max_level (int or str): Maximum level of substances to include (as int or str).
+        prune_dominated (bool): Drop substances dominated by an equivalent, cheaper one
+            from the branching set. The best entries stay optimal, but the returned
+            combinations no longer contain every combination.
+        control (SearchControl, optional): Time budget, cancellation and progress reporting.
+            If the search is stopped early, the best entries found so far are returned
+            and `control.optimal` is False. With a control the sizes are searched from the
+            smallest up, so a budget that runs out still covers the cheap sizes completely.
+        keep_combinations (bool, optional): Return every evaluated combination. Defaults to
+            True without a control and False with one, because a budgeted search is meant
+            to bound run time and memory.
 
     Returns:
-        Dict[str, CombinationResult]: A dictionary with combination keys and their results.
+        Dict[str, CombinationResult]: A dictionary with combination keys and their results
+            (empty per size if `keep_combinations` is False).
         Tuple[CombinationResult, CombinationResult]: The combination with the best modifier and the combination with the highest profit.
     """
     # Convert max_level to int if it's a string
     if isinstance(max_level, str):
-        max_level = level_name_to_int.get(max_level)
-        if max_level is None:
+        level = level_name_to_int.get(max_level)
+        if level is None:
             raise ValueError(f"Invalid level name: {max_level}")
+        max_level = level
 
 
     # Create a map of substances for quick lookup
@@ -157,6 +225,26 @@ def _find_best_combinations(
     if not product:
         raise ValueError(f"Product '{product_name}' not found!")
 
+    if prune_dominated:
+        report = compute_substance_dominance(product_name, max_level, combination_size)
+        for name, reason in report.pruned.items():
+            logger.info(f"Pruned substance '{name}': {reason}")
+        logger.info(
+            f"Dominance pruning removed {len(report.pruned)} substance(s); search space "
+            f"{report.original_space} -> {report.reduced_space} combinations."
+        )
+        filtered_substances = report.kept
+
+    if control:
+        control.start(sum(len(filtered_substances) ** size for size in range(1, combination_size + 1)))
+
+    # Formatting the per-combination debug line is expensive, only do it when it is logged
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+    if keep_combinations is None:
+        keep_combinations = control is None
+    sizes = range(1, combination_size + 1) if control is not None else range(combination_size, 0, -1)
+
     all_combinations_by_size = {}
     best_modifier_entry = None
     best_profit_entry = None
@@ -164,38 +252,23 @@ def _find_best_combinations(
     highest_profit = Decimal("-inf")
 
 
-    for size in range(combination_size, 0, -1):
+    for size in sizes:
         logger.info(f"Calculating combinations of size {size}...")
         combinations_data = {}
 
         # Test all combinations of the given size
         for combination in itertool_product(filtered_substances, repeat=size):
-            # Calculate the modifier for the current combination
-            current_multiplier, active_effects = _calculate_modificator(list(combination), product_name)
-
-            sell_price = _calculate_price(product_name, current_multiplier)
-
-
-            # Calculate the manufacturing cost
-            substance_cost = sum(
-                substance_map[substance].price for substance in combination
-            )
+            combination_result = _evaluate_combination(combination, product_name, substance_map)
+            current_multiplier = combination_result.modifier
+            sell_price = combination_result.sell_price
+            substance_cost = combination_result.substance_cost
 
             # Calculate the profit
             profit = sell_price - substance_cost
 
-            # Create a unique key for the combination
-            combination_key = "_".join(combination)
-
-            # Store the result in the dictionary
-            combination_result = CombinationResult(
-                sell_price=sell_price,
-                substance_cost=substance_cost,
-                modifier=current_multiplier,
-                substances=list(combination),
-                effects=list(active_effects.keys()),
-            )
-            combinations_data[combination_key] = combination_result
+            # Store the result under a unique key for the combination
+            if keep_combinations:
+                combinations_data["_".join(combination)] = combination_result
             
 
             # Update the best modifier entry
@@ -208,19 +281,35 @@ def _find_best_combinations(
                 highest_profit = profit
                 best_profit_entry = combination_result
 
-            logger.debug(
-                f"Combination: {combination}, Modifier: {current_multiplier:.2f}, "
-                f"Sell Price: {sell_price:.2f}, Cost: {substance_cost:.2f}, Profit: {profit:.2f}"
-            )
+            if debug_enabled:
+                logger.debug(
+                    f"Combination: {combination}, Modifier: {current_multiplier:.2f}, "
+                    f"Sell Price: {sell_price:.2f}, Cost: {substance_cost:.2f}, Profit: {profit:.2f}"
+                )
+
+            if control and control.step(best_profit_entry):
+                break
 
         all_combinations_by_size[size] = combinations_data
+        if control and control.interrupted:
+            logger.warning(f"Search stopped early ({control.reason}); result may not be optimal.")
+            break
+
+    if control:
+        control.report(best_profit_entry)
     return all_combinations_by_size, best_modifier_entry, best_profit_entry
 
 @timing
 def get_best_mix(
     combination_size: int, 
     product_name: str, 
-    max_level: Union[int, str]
+    max_level: Union[int, str],
+    prune_dominated: bool = False,
+    control: Optional[SearchControl] = None,
+    approximate: bool = False,
+    beam_width: int = 200,
+    restarts: int = 0,
+    keep_combinations: Optional[bool] = None
 ) -> Tuple[CombinationResult, CombinationResult, Dict[str,CombinationResult]]:
     """
     Get the best mix of substances for a given product and level.
@@ -229,6 +318,15 @@ def get_best_mix(
         combination_size (int): Number of substances to combine.
         product_name (str): The product for which the price is calculated.
         max_level (int or str): Maximum level of substances to include (as int or str).
+        prune_dominated (bool): Skip substances that are dominated by an equivalent, cheaper one.
+        control (SearchControl, optional): Time budget, cancellation and progress reporting.
+        approximate (bool): Use beam search (see `beam_search_best_mix`) for sizes that are
+            too large for an exact search. No combinations are returned, and the optimality
+            gap measured at a small size is logged.
+        beam_width (int): States kept per layer in approximate mode.
+        restarts (int): Additional randomized beam runs in approximate mode.
+        keep_combinations (bool, optional): Return all combinations (default: only without
+            a control, see `_find_best_combinations`).
 
     Returns:
         Tuple[CombinationResult, CombinationResult]: The combination with the best modifier and the combination with the highest profit.
@@ -239,7 +337,142 @@ def get_best_mix(
     if isinstance(max_level, str):
         max_level = max_level.lower().replace(" ", "_")
 
-    return _find_best_combinations(combination_size, product_name, max_level)
+    if approximate:
+        level = level_name_to_int.get(max_level) if isinstance(max_level, str) else max_level
+        if level is None:
+            raise ValueError(f"Invalid level name: {max_level}")
+        table = TransitionTable.shared(level)
+        best_modifier_entry, best_profit_entry, _ = beam_search_best_mix(
+            table, product_name, combination_size, control, beam_width, restarts
+        )
+        _log_beam_gap(table, product_name, level, combination_size, beam_width, restarts)
+        return {}, best_modifier_entry, best_profit_entry
+
+    return _find_best_combinations(
+        combination_size, product_name, max_level, prune_dominated, control, keep_combinations
+    )
+
+
+# Largest size at which the beam search is compared with the exact state DP
+BEAM_CALIBRATION_SIZE = 5
+# Gaps above this share of the optimal profit are logged as warnings
+BEAM_GAP_WARNING = 0.01
+
+_beam_gaps: Dict[tuple, Dict[int, float]] = {}
+
+
+def measure_beam_gap(
+    table: TransitionTable,
+    product_name: str,
+    sizes: List[int],
+    beam_width: int = 200,
+    restarts: int = 0
+) -> Dict[int, float]:
+    """
+    Optimality gap of the beam search per size: (exact profit - beam profit) / exact profit,
+    with the exact profit from `state_dp_best_mix`.
+    """
+    gaps = {}
+    for size in sizes:
+        _, exact, _ = state_dp_best_mix(table, product_name, size)
+        _, approximate, _ = beam_search_best_mix(table, product_name, size, beam_width=beam_width, restarts=restarts)
+        exact_profit = exact.sell_price - exact.substance_cost
+        approximate_profit = approximate.sell_price - approximate.substance_cost
+        gaps[size] = float((exact_profit - approximate_profit) / abs(exact_profit)) if exact_profit else 0.0
+    return gaps
+
+
+def _log_beam_gap(
+    table: TransitionTable,
+    product_name: str,
+    max_level: int,
+    combination_size: int,
+    beam_width: int,
+    restarts: int
+) -> None:
+    """Log the gap measured at the calibration sizes (once per product, level and beam settings)."""
+    key = (product_name, max_level, beam_width, restarts)
+    if key not in _beam_gaps:
+        sizes = list(range(1, BEAM_CALIBRATION_SIZE + 1))
+        _beam_gaps[key] = measure_beam_gap(table, product_name, sizes, beam_width, restarts)
+
+    gaps = _beam_gaps[key]
+    worst_size = max(gaps, key=gaps.get)
+    message = (
+        f"Beam search (width {beam_width}, {restarts} restarts) for '{product_name}': "
+        f"optimality gap up to {gaps[worst_size]:.2%} (size {worst_size}) at sizes 1-{max(gaps)}"
+    )
+    if combination_size in gaps:
+        message += f", {gaps[combination_size]:.2%} at size {combination_size}."
+    else:
+        message += f"; size {combination_size} is not verified."
+    if gaps[worst_size] > BEAM_GAP_WARNING:
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+@timing
+def get_pareto_frontier(
+    combination_size: int,
+    product_name: str,
+    max_level: Union[int, str],
+    include_modifier: bool = False
+) -> List[CombinationResult]:
+    """
+    Compute the Pareto frontier (profit vs. substance cost vs. number of substances)
+    over all combinations of size 1 to `combination_size` in a single enumeration.
+
+    Args:
+        combination_size (int): Maximum number of substances to combine.
+        product_name (str): The product for which the price is calculated.
+        max_level (int or str): Maximum level of substances to include (as int or str).
+        include_modifier (bool): Also treat a higher modifier as an objective.
+
+    Returns:
+        List[CombinationResult]: The non-dominated combinations, sorted by substance cost,
+        size and descending profit.
+    """
+    product_name = product_name.lower().replace(" ", "_")
+
+    if isinstance(max_level, str):
+        level = level_name_to_int.get(max_level.lower().replace(" ", "_"))
+        if level is None:
+            raise ValueError(f"Invalid level name: {max_level}")
+        max_level = level
+
+    substance_map = {substance.name: substance for substance in substances}
+    filtered_substances = [
+        substance.name for substance in substances if substance.level <= max_level
+    ]
+
+    if combination_size > len(filtered_substances):
+        raise ValueError("Not enough substances available for the given combination size and level.")
+
+    if product_name not in {product.name for product in products}:
+        raise ValueError(f"Product '{product_name}' not found!")
+
+    frontier = ParetoFrontier(include_modifier=include_modifier)
+    for size in range(1, combination_size + 1):
+        for combination in itertool_product(filtered_substances, repeat=size):
+            current_multiplier, active_effects = _calculate_modificator(list(combination), product_name)
+            frontier.add(CombinationResult(
+                sell_price=_calculate_price(product_name, current_multiplier),
+                substance_cost=sum(substance_map[substance].price for substance in combination),
+                modifier=current_multiplier,
+                substances=list(combination),
+                effects=list(active_effects.keys()),
+            ))
+        logger.info(f"Pareto frontier after size {size}: {len(frontier)} entries.")
+
+    return frontier.sorted()
+
+def _normalize_effects(effect_names: Union[str, List[str], None]) -> List[str]:
+    """Effect names from a list or comma-separated string, lower case with underscores."""
+    if effect_names is None:
+        return []
+    if isinstance(effect_names, str):
+        effect_names = effect_names.split(",")
+    return [e.strip().lower().replace(" ", "_") for e in effect_names if e.strip()]
 
 @timing
 def find_min_substances_for_effect(
@@ -249,12 +482,20 @@ def find_min_substances_for_effect(
     max_level: Union[int, str],
     max_search_size: int = 6,
     max_results: int = 10,
-    combination_search_limit: int = 200_000
+    combination_search_limit: int = 200_000,
+    db_path: Optional[str] = None,
+    control: Optional[SearchControl] = None
 ) -> Tuple[int, List[CombinationResult]]:
     """
     Find the minimum number of substances (combined with the given product)
     required to activate all `desired_effects`.
 
+    If `db_path` points to a database that holds all stored combinations up to the
+    answer's size, the answer is read from the database instead of enumerated.
+
+    With a `control`, the search stops when its time budget is used up or it is
+    cancelled; it then returns what it found so far and `control.optimal` is False.
+
     Returns:
         Tuple[int, List[CombinationResult]]: (found_size, list_of_CombinationResult).
         If nothing is found, returns (0, []).
@@ -262,26 +503,18 @@ def find_min_substances_for_effect(
     product_name = product_name.lower().replace(" ", "_")
 
     # support list or comma-separated string for (not)desired effects
-    if isinstance(desired_effects, str):
-        desired_list = [e.strip().lower().replace(" ", "_") for e in desired_effects.split(",") if e.strip()]
-    else:
-        desired_list = [e.strip().lower().replace(" ", "_") for e in desired_effects]
-
-    if not_desired_effects is None:
-        not_desired_list: List[str] = []
-    elif isinstance(not_desired_effects, str):
-        not_desired_list = [e.strip().lower().replace(" ", "_") for e in not_desired_effects.split(",") if e.strip()]
-    else:
-        not_desired_list = [e.strip().lower().replace(" ", "_") for e in not_desired_effects]
+    desired_list = _normalize_effects(desired_effects)
+    not_desired_list = _normalize_effects(not_desired_effects)
 
     if not desired_list:
         raise ValueError("No desired effects provided.")
 
     # Handle max_level same way as in _find_best_combinations
     if isinstance(max_level, str):
-        max_level = level_name_to_int.get(max_level)
-        if max_level is None:
+        level = level_name_to_int.get(max_level)
+        if level is None:
             raise ValueError(f"Invalid level name: {max_level}")
+        max_level = level
 
     # Build quick lookup maps for substances and filter by level
     substance_map = {substance.name: substance for substance in substances}
@@ -296,15 +529,35 @@ def find_min_substances_for_effect(
     if not product:
         raise ValueError(f"Product '{product_name}' not found!")
 
+    max_size = min(max_search_size, len(filtered_substances))
+
+    if db_path and os.path.exists(db_path):
+        stored = _find_min_from_db(
+            db_path, product_name, desired_list, not_desired_list, max_level,
+            filtered_substances, max_size, max_results
+        )
+        if stored is not None:
+            logger.info(f"Answered effect query for '{product_name}' from {db_path}.")
+            return stored
+
+    if control:
+        control.start(sum(
+            len(filtered_substances) ** size for size in range(1, max_size + 1)
+            if len(filtered_substances) ** size <= combination_search_limit
+        ))
+
     # Search for the smallest combination size that yields the desired effects
-    for size in range(1, min(max_search_size, len(filtered_substances)) + 1):
+    for size in range(1, max_size + 1):
         estimated_count = len(filtered_substances) ** size
         if estimated_count > combination_search_limit:
-            logger.warning(
+            logger.info(
                 f"Search for size={size} would check {estimated_count} combinations; "
-                "skipping this size due to limit."
+                f"continuing with the meet-in-the-middle search up to size {max_size}."
+            )
+            return _find_min_meet_in_middle(
+                product_name, desired_list, not_desired_list, filtered_substances,
+                size, max_size, max_results, control
             )
-            continue
 
         found_results: List[CombinationResult] = []
         # iterate over all ordered combinations with repetition
@@ -332,15 +585,180 @@ def find_min_substances_for_effect(
                 if len(found_results) >= max_results:
                     break
 
+            if control and control.step(found_results[0] if found_results else None):
+                break
+
+        if control and (found_results or control.interrupted):
+            control.report(found_results[0] if found_results else None)
+
         if found_results:
             logger.info(f"Found {len(found_results)} combinations with minimal size {size}.")
             return size, found_results
 
+        if control and control.interrupted:
+            logger.warning(f"Search stopped early at size {size} ({control.reason}).")
+            return 0, []
+
     # nothing found
+    if control:
+        control.report()
     logger.info(f"No results found for '{', '.join(desired_list)}' with Product '{product_name}'.")
     return 0, []
 
 
+@timing
+def find_min_substances_for_effects(
+    product_name: str,
+    desired_effect_sets: Optional[List[Union[str, List[str]]]] = None,
+    not_desired_effects: Union[str, List[str], None] = None,
+    max_level: Union[int, str] = "max",
+    max_search_size: int = 6,
+    max_results: int = 10,
+    control: Optional[SearchControl] = None
+) -> Dict[str, Tuple[int, List[CombinationResult]]]:
+    """
+    Answer many minimal-substance queries for one product from a single search.
+
+    Instead of one find_min_substances_for_effect call per effect set, the effect-states
+    of the product are expanded once in breadth-first layers and every layer is checked
+    against all queries that are still open (see `multi_state_bfs_min_substances`).
+
+    Args:
+        product_name (str): Product the substances are mixed into.
+        desired_effect_sets (List[Union[str, List[str]]], optional): One entry per query, each
+            a list or comma-separated string of effects. Defaults to every single effect.
+        not_desired_effects (Union[str, List[str]], optional): Effects none of the results may have.
+        max_level (Union[int, str]): Highest substance level (int or level name).
+        max_search_size (int): Largest combination size searched.
+        max_results (int): Results per query.
+        control (SearchControl, optional): Time budget / cancellation for the whole search.
+
+    Returns:
+        Dict[str, Tuple[int, List[CombinationResult]]]: (found_size, results) per query, keyed by
+        its effects joined with ","; (0, []) if nothing was found.
+    """
+    product_name = product_name.lower().replace(" ", "_")
+    if desired_effect_sets is None:
+        desired_effect_sets = [[effect.name] for effect in effects]
+    desired_lists = [_normalize_effects(desired) for desired in desired_effect_sets]
+    if not desired_lists or not all(desired_lists):
+        raise ValueError("No desired effects provided.")
+    not_desired_list = _normalize_effects(not_desired_effects)
+
+    if isinstance(max_level, str):
+        level = level_name_to_int.get(max_level)
+        if level is None:
+            raise ValueError(f"Invalid level name: {max_level}")
+        max_level = level
+    if product_name not in _PRODUCT_MAP:
+        raise ValueError(f"Product '{product_name}' not found!")
+
+    table = TransitionTable.shared(max_level)
+    if not len(table):
+        raise ValueError("Keine Substanzen für das gegebene Level verfügbar.")
+
+    queries = [(desired, not_desired_list) for desired in desired_lists]
+    answers, evaluated = multi_state_bfs_min_substances(
+        table, product_name, queries, min(max_search_size, len(table)), max_results, control
+    )
+    answered = sum(1 for size, _ in answers if size)
+    logger.info(
+        f"Answered {answered} of {len(queries)} effect queries for '{product_name}' "
+        f"with one search ({evaluated} states evaluated)."
+    )
+    return {",".join(desired): answer for desired, answer in zip(desired_lists, answers)}
+
+
+def _find_min_meet_in_middle(
+    product_name: str,
+    desired_list: List[str],
+    not_desired_list: List[str],
+    filtered_substances: List[str],
+    min_size: int,
+    max_size: int,
+    max_results: int,
+    control: Optional[SearchControl] = None
+) -> Tuple[int, List[CombinationResult]]:
+    """
+    Continue a minimal-substance search at `min_size` with the bidirectional solver,
+    within the deadline of `control`.
+    """
+    sub_control = None
+    if control:
+        sub_control = SearchControl(
+            deadline=control.stop_at,
+            cancel_token=control.cancel_token,
+            progress_callback=control.progress_callback,
+            progress_interval=control.progress_interval,
+        )
+
+    size, results, evaluated = meet_in_middle_min_substances(
+        TransitionTable(filtered_substances), product_name, desired_list, not_desired_list,
+        max_size, max_results, sub_control, min_size=min_size
+    )
+
+    if control:
+        control.evaluated += evaluated
+        control.interrupted, control.reason = sub_control.interrupted, sub_control.reason
+        control.report(results[0] if results else None)
+    if size:
+        logger.info(f"Found {len(results)} combinations with minimal size {size}.")
+    elif control and control.interrupted:
+        logger.warning(f"Search stopped early ({control.reason}).")
+    else:
+        logger.info(f"No results found for '{', '.join(desired_list)}' with Product '{product_name}'.")
+    return size, results
+
+
+def _find_min_from_db(
+    db_path: str,
+    product_name: str,
+    desired_list: List[str],
+    not_desired_list: List[str],
+    max_level: int,
+    filtered_substances: List[str],
+    max_size: int,
+    max_results: int
+) -> Optional[Tuple[int, List[CombinationResult]]]:
+    """
+    Answer a minimal-substance effect query from stored combinations.
+
+    Returns:
+        Optional[Tuple[int, List[CombinationResult]]]: The answer, or None if the database
+        does not hold all combinations for the sizes that would have to be checked.
+    """
+    substance_map = {substance.name: substance for substance in substances}
+    required_level = max(substance_map[name].level for name in filtered_substances)
+    coverage = get_stored_coverage(product_name, db_path)
+
+    for size in range(1, max_size + 1):
+        if coverage.get(size, 0) < required_level:
+            return None
+
+        rows = find_combinations_by_effects(
+            product_name,
+            include_effects=desired_list,
+            exclude_effects=not_desired_list,
+            max_level=max_level,
+            combination_size=size,
+            limit=max_results,
+            db_path=db_path,
+        )
+        if rows:
+            return size, [
+                CombinationResult(
+                    sell_price=Decimal(str(row["sell_price"])),
+                    substance_cost=Decimal(str(row["substance_cost"])),
+                    modifier=row["modifier"],
+                    substances=row["substances"],
+                    effects=row["effects"],
+                )
+                for row in rows
+            ]
+
+    return 0, []
+
+
 def print_result(combination: CombinationResult, message: str = None) -> None:
     """
     Print the result of a combination.
@@ -361,13 +779,214 @@ def print_result(combination: CombinationResult, message: str = None) -> None:
     print(f"Profit: {combination.sell_price - combination.substance_cost:.2f}$")
     print("-" * 40)
 
+def generate_size_entries(
+    combination_size: int,
+    product_name: str,
+    max_level: Union[int, str],
+    db_path: str = "combinations.db",
+    chunk_size: int = 50_000
+) -> int:
+    """
+    Enumerate all combinations of exactly `combination_size` substances and store them in
+    committed chunks. Every chunk is written together with a checkpoint (next enumeration
+    index), so a restarted run continues after the last committed chunk without duplicates.
+    The coverage of the size is only recorded once the enumeration is complete.
+
+    Args:
+        combination_size (int): Number of substances to combine.
+        product_name (str): The product for which the combinations are stored.
+        max_level (int or str): Maximum level of substances to include (as int or str).
+        db_path (str): Database to write to.
+        chunk_size (int): Combinations per transaction.
+
+    Returns:
+        int: Number of combinations written by this call.
+    """
+    product_name = product_name.lower().replace(" ", "_")
+    if isinstance(max_level, str):
+        level_name = max_level.lower().replace(" ", "_")
+        max_level = level_name_to_int.get(level_name)
+        if max_level is None:
+            raise ValueError(f"Invalid level name: {level_name}")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+
+    substance_map = {substance.name: substance for substance in substances}
+    filtered_substances = [
+        substance.name for substance in substances if substance.level <= max_level
+    ]
+    total = len(filtered_substances) ** combination_size
+
+    start_index = 0
+    checkpoint = get_generation_checkpoint(product_name, combination_size, db_path)
+    if checkpoint:
+        if checkpoint["max_level"] != max_level:
+            raise ValueError(
+                f"Size {combination_size} of '{product_name}' was started with max_level "
+                f"{checkpoint['max_level']}, not {max_level}. Delete its rows and checkpoint first."
+            )
+        if checkpoint["completed"]:
+            logger.info(f"Size {combination_size} of '{product_name}' already complete, skipping.")
+            return 0
+        start_index = checkpoint["next_index"]
+        logger.info(f"Resuming size {combination_size} of '{product_name}' at {start_index}/{total}.")
+    elif get_stored_coverage(product_name, db_path).get(combination_size, 0) >= max(
+        substance_map[name].level for name in filtered_substances
+    ):
+        logger.info(f"Size {combination_size} of '{product_name}' already stored, skipping.")
+        return 0
+
+    chunk: List[CombinationResult] = []
+    index = start_index
+    combinations = itertool_product(filtered_substances, repeat=combination_size)
+    for index, combination in enumerate(islice(combinations, start_index, None), start=start_index):
+        chunk.append(_evaluate_combination(combination, product_name, substance_map))
+        if len(chunk) == chunk_size and index + 1 < total:
+            store_combination_chunk(db_path, product_name, combination_size, max_level, chunk, index + 1)
+            logger.info(f"Size {combination_size} of '{product_name}': {index + 1}/{total} stored.")
+            chunk = []
+
+    store_combination_chunk(db_path, product_name, combination_size, max_level, chunk, total, completed=True)
+    logger.info(f"Size {combination_size} of '{product_name}' complete ({total} combinations).")
+    return total - start_index
+
+
+def extend_size_entries(
+    combination_size: int,
+    product_name: str,
+    max_level: Union[int, str],
+    db_path: str = "combinations.db",
+    snapshot_dir: Optional[str] = None
+) -> int:
+    """
+    Store size `combination_size` by expanding the distinct effect-states of the previous
+    size by one substance instead of enumerating all combinations again.
+
+    The previous layer (cheapest path per state) is read from the snapshot in `snapshot_dir`
+    if there is one, otherwise from the stored combinations of the previous size. One row
+    per distinct state is stored, with its cheapest path, so the best profit per state is
+    preserved but the coverage of the size is not recorded.
+
+    Args:
+        combination_size (int): Number of substances to combine.
+        product_name (str): The product for which the combinations are stored.
+        max_level (int or str): Maximum level of substances to include (as int or str).
+        db_path (str): Database to read the previous size from and to write to.
+        snapshot_dir (str, optional): Directory for state snapshot files; the new layer
+            is written there as well.
+
+    Returns:
+        int: Number of stored states (0 if the size was already stored).
+    """
+    product_name = product_name.lower().replace(" ", "_")
+    if isinstance(max_level, str):
+        level_name = max_level.lower().replace(" ", "_")
+        max_level = level_name_to_int.get(level_name)
+        if max_level is None:
+            raise ValueError(f"Invalid level name: {level_name}")
+
+    if has_stored_combinations(product_name, combination_size, db_path):
+        logger.info(f"Size {combination_size} of '{product_name}' already stored, skipping.")
+        return 0
+
+    table = TransitionTable.for_level(max_level)
+    previous_size = combination_size - 1
+    previous_snapshot = snapshot_dir and snapshot_path(snapshot_dir, product_name, max_level, previous_size)
+
+    if previous_size == 0:
+        layer = start_layer(product_name)
+    elif previous_snapshot and os.path.exists(previous_snapshot):
+        layer = load_layer_snapshot(previous_snapshot, table, product_name, max_level, previous_size)
+    else:
+        layer = layer_from_db(table, product_name, previous_size, max_level, db_path)
+    if not layer:
+        raise ValueError(f"No stored states of size {previous_size} for '{product_name}' to extend.")
+
+    next_layer = expand_layer(table, layer)
+    logger.info(
+        f"Extended {len(layer)} states of size {previous_size} to {len(next_layer)} states "
+        f"of size {combination_size} ({len(layer) * len(table)} transitions)."
+    )
+
+    store_all_combinations(
+        db_path, product_name, combination_size, layer_results(table, product_name, next_layer),
+        record_coverage=False
+    )
+    if snapshot_dir:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        save_layer_snapshot(
+            snapshot_path(snapshot_dir, product_name, max_level, combination_size),
+            table, product_name, max_level, combination_size, next_layer
+        )
+    return len(next_layer)
+
+
 def generate_db_entrys(
     combination_size: int, 
     product_name: str, 
-    max_level: Union[int, str]
+    max_level: Union[int, str],
+    db_path: str = "combinations.db",
+    chunk_size: int = 50_000,
+    extend: bool = False,
+    snapshot_dir: Optional[str] = None
 ) -> None:
+    """
+    Store all combinations of 1 to `combination_size` substances, resumable per size
+    (see generate_size_entries). With `extend`, each size is instead grown from the
+    distinct states of the previous one (see extend_size_entries).
+    """
+    for size in range(1, combination_size + 1):
+        if extend:
+            extend_size_entries(size, product_name, max_level, db_path, snapshot_dir)
+        else:
+            generate_size_entries(size, product_name, max_level, db_path, chunk_size)
+
+
+def compare_storage_layouts(
+    combination_size: int,
+    product_name: str,
+    max_level: Union[int, str],
+    directory: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Store one full get_best_mix run in a fresh normalized and a fresh packed database
+    and compare write time and file size.
+
+    Args:
+        combination_size (int): Number of substances to combine.
+        product_name (str): The product for which the combinations are stored.
+        max_level (int or str): Maximum level of substances to include.
+        directory (str, optional): Where the two databases are created (temporary directory if None).
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per layout the write time in seconds and the file size in MB.
+    """
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix="layout_comparison_")
+    if isinstance(max_level, str):
+        level = level_name_to_int.get(max_level)
+        if level is None:
+            raise ValueError(f"Invalid level name: {max_level}")
+        max_level = level
+    # a full get_best_mix run (no pruning, no budget) holds every combination of each size
+    all_combinations_by_size, _, _ = get_best_mix(combination_size, product_name, max_level)
+
+    results = {}
+    for layout in ("normalized", "packed"):
+        db_path = os.path.join(directory, f"combinations_{layout}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        initialize_database(db_path, layout)
+        populate_database(db_path)
+
+        start = time.perf_counter()
+        for size, combinations_data in all_combinations_by_size.items():
+            store_all_combinations(
+                db_path, product_name, size, combinations_data, record_coverage=True, max_level=max_level
+            )
+        elapsed = time.perf_counter() - start
 
-    all_combinations_by_size, best_modifier_entry, best_profit_entry = get_best_mix(combination_size, product_name, max_level)
-    for size, combinations_data in all_combinations_by_size.items():
-        store_all_combinations_normalized("combinations.db", product_name, size, combinations_data)
-    
\ No newline at end of file
+        results[layout] = {"seconds": elapsed, "size_mb": os.path.getsize(db_path) / 1e6}
+        logger.info(f"{layout:>10}: {elapsed:.1f}s write time, {results[layout]['size_mb']:.1f} MB ({db_path})")
+    return results
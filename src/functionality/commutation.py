@@ -0,0 +1,131 @@
+import os
+import sys
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.lookup.lookup import level_name_to_int
+from src.util.models import CommutationReport
+from functionality.solvers import _dfs, run_canonical_dfs, search_space_size
+from functionality.transitions import TransitionTable, product_start_mask, reachable_states
+
+
+class _LayerCollector:
+    """Stands in for the incumbent of a DFS: cheapest cost per effect-state and size."""
+
+    def __init__(self, combination_size: int):
+        self.layers: List[Dict[int, float]] = [{} for _ in range(combination_size + 1)]
+        self.evaluated = 0
+
+    def offer(self, mask: int, cost: float, path: List[int]) -> None:
+        self.evaluated += 1
+        layer = self.layers[len(path)]
+        if cost < layer.get(mask, float("inf")):
+            layer[mask] = cost
+
+
+def commuting_pairs(table: TransitionTable) -> List[Tuple[int, int]]:
+    """Index pairs (a < b) of substances that commute on every effect-state."""
+    return [
+        (a, b) for a in range(len(table)) for b in range(a + 1, len(table)) if table.commutes(a, b)
+    ]
+
+
+def _static_space(table: TransitionTable, pairs: List[Tuple[int, int]], combination_size: int) -> int:
+    """Number of sequences of size 1..combination_size without a commuting pair in descending order."""
+    blocked = set(pairs)
+    counts = [1] * len(table)  # sequences of size 1 ending in each substance
+    total = sum(counts)
+    for _ in range(combination_size - 1):
+        counts = [
+            sum(counts[last] for last in range(len(table)) if not (index < last and (index, last) in blocked))
+            for index in range(len(table))
+        ]
+        total += sum(counts)
+    return total
+
+
+def compute_commutation_report(
+    product_name: str,
+    max_level: int,
+    combination_size: int,
+    verify: bool = True
+) -> CommutationReport:
+    """
+    Analyse which substance pairs commute and how much of the search space a canonical
+    order removes.
+
+    Args:
+        product_name (str): The product whose effects form the start state.
+        max_level (int): Maximum level of substances to include.
+        combination_size (int): Maximum number of substances in a combination.
+        verify (bool): Also enumerate the full space and check that every size reaches the
+            same effect-states at the same cheapest cost with and without the reduction.
+
+    Returns:
+        CommutationReport: Pairs that commute on every state, the share of (reachable state,
+        pair) combinations that commute, and the search-space sizes without reduction,
+        with static reduction and with per-state reduction.
+    """
+    table = TransitionTable.for_level(max_level)
+    start = product_start_mask(product_name)
+    pairs = commuting_pairs(table)
+
+    states = set().union(*reachable_states(table, start, max(combination_size - 2, 0)))
+    commuting = sum(
+        table.commutes_at(state, a, b)
+        for state in states for a in range(len(table)) for b in range(a + 1, len(table))
+    )
+    pair_count = len(table) * (len(table) - 1) // 2
+
+    reduced = _LayerCollector(combination_size)
+    run_canonical_dfs(table, product_name, combination_size, reduced, reduction="per_state")
+
+    results_preserved = None
+    if verify:
+        full = _LayerCollector(combination_size)
+        prices = [float(price) for price in table.prices]
+        _dfs(table, prices, start, 0.0, [], combination_size, full, None)
+        results_preserved = all(
+            set(reduced_layer) == set(full_layer)
+            and all(abs(reduced_layer[mask] - full_layer[mask]) < 1e-9 for mask in full_layer)
+            for reduced_layer, full_layer in zip(reduced.layers, full.layers)
+        )
+
+    return CommutationReport(
+        commuting_pairs=[(table.names[a], table.names[b]) for a, b in pairs],
+        state_commuting_share=commuting / (len(states) * pair_count) if pair_count else 0.0,
+        original_space=search_space_size(len(table), combination_size),
+        static_space=_static_space(table, pairs, combination_size),
+        per_state_space=reduced.evaluated,
+        results_preserved=results_preserved,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Partial-order reduction report for commuting substances.")
+    parser.add_argument("--product", default="cocaine")
+    parser.add_argument("--max_level", default="max")
+    parser.add_argument("--combination_size", type=int, default=4)
+    parser.add_argument("--no_verify", action="store_true", help="skip the full enumeration")
+    args = parser.parse_args()
+
+    level = level_name_to_int.get(args.max_level.lower().replace(" ", "_"))
+    if level is None:
+        raise ValueError(f"Invalid level name: {args.max_level}")
+    report = compute_commutation_report(args.product, level, args.combination_size, not args.no_verify)
+
+    print(f"Pairs commuting on every state: {len(report.commuting_pairs)}")
+    for a, b in report.commuting_pairs:
+        print(f"  {a} <-> {b}")
+    print(f"Pairs commuting per reachable state: {report.state_commuting_share:.1%}")
+    for label, space in (("static", report.static_space), ("per state", report.per_state_space)):
+        print(
+            f"Search space {label:>9}: {space} of {report.original_space} "
+            f"({1 - space / report.original_space:.1%} cut)"
+        )
+    if report.results_preserved is not None:
+        print(f"Reachable results unchanged: {report.results_preserved}")
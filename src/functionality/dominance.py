@@ -0,0 +1,72 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from src.util.models import DominanceReport
+from functionality.transitions import TransitionTable, product_start_mask, reachable_states
+
+
+def _search_space(substance_count: int, combination_size: int) -> int:
+    """Number of ordered combinations of size 1..combination_size."""
+    return sum(substance_count ** size for size in range(1, combination_size + 1))
+
+
+def compute_substance_dominance(
+    product_name: str,
+    max_level: int,
+    combination_size: int
+) -> DominanceReport:
+    """
+    Find substances that can be removed from the branching set without losing the optimum.
+
+    Two substances are equivalent if they lead to the same effect-state from every
+    effect-state reachable with fewer than `combination_size` substances. Within a group
+    of equivalent substances, a substance is dominated if another one has an equal or
+    lower price and level (ties are broken by name). Replacing a dominated substance by
+    its dominator never changes effects and never increases the cost.
+
+    Args:
+        product_name (str): The product whose effects form the start state.
+        max_level (int): Maximum level of substances to include.
+        combination_size (int): Maximum number of substances in a combination.
+
+    Returns:
+        DominanceReport: Kept substances, pruned substances with the reason, and the
+        search-space size before and after pruning.
+    """
+    table = TransitionTable.for_level(max_level)
+    layers = reachable_states(table, product_start_mask(product_name), max(combination_size - 1, 0))
+    states = sorted(set().union(*layers))
+
+    groups: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+    for index in range(len(table)):
+        signature = tuple(table.apply(state, index) for state in states)
+        groups[signature].append(index)
+
+    pruned: Dict[str, str] = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        for index in members:
+            for other in members:
+                if other == index or table.names[other] in pruned:
+                    continue
+                key = (table.prices[other], table.levels[other], table.names[other])
+                if (
+                    table.prices[other] <= table.prices[index]
+                    and table.levels[other] <= table.levels[index]
+                    and key < (table.prices[index], table.levels[index], table.names[index])
+                ):
+                    pruned[table.names[index]] = (
+                        f"same transitions as '{table.names[other]}' on all {len(states)} reachable states "
+                        f"(price {table.prices[index]} >= {table.prices[other]}, "
+                        f"level {table.levels[index]} >= {table.levels[other]})"
+                    )
+                    break
+
+    kept = [name for name in table.names if name not in pruned]
+    return DominanceReport(
+        kept=kept,
+        pruned=pruned,
+        original_space=_search_space(len(table), combination_size),
+        reduced_space=_search_space(len(kept), combination_size),
+    )
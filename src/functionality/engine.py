@@ -0,0 +1,185 @@
+import gc
+import json
+import os
+import sys
+import time
+import traceback
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.lookup.lookup import DATA_HASH, products, substances
+from functionality.transition_memo import memo
+from functionality.transitions import TransitionTable, estimate_layer_sizes, product_start_mask, reachable_states
+
+# Layers whose transitions and modifiers are memoized during preloading
+PRELOAD_DEPTH = 3
+
+_preloaded = False
+
+
+def lookup_data_hash() -> str:
+    """
+    SHA-256 of the lookup data file (see src/lookup/snapshot.py). Every change of a
+    price, level or effect changes the hash, so results derived from the data can be
+    keyed by it.
+    """
+    return DATA_HASH
+
+
+def preload_engine(product_names: Optional[Iterable[str]] = None, depth: int = PRELOAD_DEPTH) -> Dict[str, float]:
+    """
+    Build everything a search request needs before a server forks its workers.
+
+    Imports the calculation modules (which configures logging), builds the shared
+    transition table of every level, samples the planner's state counts and computes the
+    transitions and modifiers of every state reachable with up to `depth` substances, for
+    every product. These are frozen into flat read-only arrays (`TransitionMemo.freeze`),
+    which the workers only read, so those pages stay shared copy-on-write; each worker
+    memoizes the entries it uses in its own, initially empty LRU tables. Finally the
+    remaining objects are moved to the permanent GC generation (`gc.freeze`), so the
+    workers' garbage collections do not write to them (reference counts still do).
+    Calling it again freezes the new states together with the old ones.
+
+    Returns:
+        Dict[str, float]: Number of tables, frozen states and the seconds it took.
+    """
+    global _preloaded
+
+    start = time.perf_counter()
+    # imported here because calc_modifier configures logging on import
+    import functionality.calc_modifier  # noqa: F401
+
+    product_names = list(product_names or (product.name for product in products))
+    tables: Dict[Tuple[str, ...], TransitionTable] = {}
+    for level in sorted({substance.level for substance in substances}):
+        table = TransitionTable.shared(level)
+        tables[tuple(table.names)] = table
+
+    for table in tables.values():
+        for product_name in product_names:
+            estimate_layer_sizes(table, product_name, depth)
+            for layer in reachable_states(table, product_start_mask(product_name), depth):
+                for mask in layer:
+                    table.modifier(mask)
+    states = memo.freeze()
+
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    _preloaded = True
+    return {"tables": len(tables), "states": states, "seconds": time.perf_counter() - start}
+
+
+def is_preloaded() -> bool:
+    return _preloaded
+
+
+def _private_memory_kb() -> int:
+    """Memory only this process uses (private clean + dirty pages), 0 if unknown."""
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            return sum(
+                int(line.split()[1]) for line in file if line.startswith(("Private_Clean:", "Private_Dirty:"))
+            )
+    except OSError:
+        return 0
+
+
+def _serve(requests: List[Tuple[str, str, int]], seconds: float) -> Dict[str, float]:
+    """Run best-mix requests like the webapp does until `seconds` have passed."""
+    from functionality.planner import plan_search, run_plan
+    from functionality.search_control import SearchControl
+
+    start = time.perf_counter()
+    first_request = None
+    served = 0
+    while time.perf_counter() - start < seconds:
+        product_name, max_level, combination_size = requests[served % len(requests)]
+        plan = plan_search("best_mix", product_name, max_level, combination_size, allow_parallel=False)
+        run_plan(plan, SearchControl())
+        served += 1
+        if first_request is None:
+            first_request = time.perf_counter() - start
+    return {
+        "served": served,
+        "seconds": time.perf_counter() - start,
+        "first_request": first_request or 0.0,
+        "private_kb": _private_memory_kb(),
+    }
+
+
+def benchmark_workers(
+    worker_counts: Iterable[int],
+    requests: List[Tuple[str, str, int]],
+    seconds: float = 5.0,
+    preload: bool = True
+) -> List[Dict[str, float]]:
+    """
+    Load test of the pre-fork deployment without a web server: the master optionally
+    preloads the engine, then forks `workers` processes that each serve `requests` in a
+    loop for `seconds`. Reports requests per second, the time each worker needed for its
+    first request and its private memory.
+    """
+    if preload:
+        preload_engine()
+
+    results = []
+    for workers in worker_counts:
+        pipes = []
+        for _ in range(workers):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                try:
+                    report = _serve(requests, seconds)
+                    os.write(write_fd, json.dumps(report).encode())
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(0)
+            os.close(write_fd)
+            pipes.append((pid, read_fd))
+
+        reports = []
+        for pid, read_fd in pipes:
+            with os.fdopen(read_fd) as pipe:
+                data = pipe.read()
+            os.waitpid(pid, 0)
+            if data:
+                reports.append(json.loads(data))
+
+        if len(reports) < workers:
+            raise RuntimeError(f"{workers - len(reports)} of {workers} worker(s) failed")
+        served = sum(report["served"] for report in reports)
+        results.append({
+            "workers": workers,
+            "requests_per_second": served / max(max(report["seconds"] for report in reports), 1e-9),
+            "first_request": max(report["first_request"] for report in reports),
+            "private_kb": max(report["private_kb"] for report in reports),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test of the pre-fork engine with forked workers.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--products", nargs="+", default=["og_kush", "sour_diesel", "cocaine"])
+    parser.add_argument("--max_level", default="max")
+    parser.add_argument("--combination_size", type=int, default=4)
+    parser.add_argument("--no_preload", action="store_true", help="let every worker build its own tables")
+    args = parser.parse_args()
+
+    request_mix = [(product, args.max_level, args.combination_size) for product in args.products]
+    print(f"{os.cpu_count()} CPU(s), preload={'off' if args.no_preload else 'on'}")
+    print(f"{'workers':>8}{'req/s':>10}{'first request':>16}{'private MB/worker':>20}")
+    for row in benchmark_workers(args.workers, request_mix, args.seconds, not args.no_preload):
+        print(
+            f"{row['workers']:>8}{row['requests_per_second']:>10.1f}{row['first_request']:>15.3f}s"
+            f"{row['private_kb'] / 1024:>20.1f}"
+        )
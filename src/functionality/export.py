@@ -0,0 +1,395 @@
+import csv
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from itertools import product as itertool_product
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV export works without pyarrow
+    pa = None
+    pq = None
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.datenbank.connection_pool import get_id_map
+from src.datenbank.get_db_data import get_stored_sizes, iter_stored_combinations
+from src.datenbank.initialize_db import effect_bit
+from src.lookup.lookup import products, substance_ids, substances
+from functionality.planner import resolve_max_level
+from functionality.solvers import get_product
+from functionality.transitions import EFFECT_BITS, TransitionTable, mask_to_effects, product_start_mask
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "arrow", "parquet")
+EXPORT_SOURCES = ("enumerate", "db")
+# "arrow" is the Arrow IPC stream format, which allows dictionaries to grow between batches
+FILE_EXTENSIONS = {"csv": ".csv", "arrow": ".arrows", "parquet": ".parquet"}
+DEFAULT_CHUNK_SIZE = 50_000
+
+# (combination size, substance ids of the lookup data in order, effect mask in lookup order,
+#  modifier, sell price, substance cost, highest substance level)
+ExportRow = Tuple[int, Tuple[int, ...], int, float, float, float, int]
+
+
+def export_columns(max_size: int) -> List[str]:
+    """
+    Columns of an export: one substance column per position (empty after the end of
+    shorter combinations), the effects joined with ";" in lookup order and the same
+    effects as a bitmask (bit i = i-th effect of the lookup data).
+    """
+    return (
+        ["product", "combination_size"]
+        + [f"substance_{position}" for position in range(1, max_size + 1)]
+        + ["effects", "effect_mask", "modifier", "sell_price", "substance_cost", "profit", "max_level"]
+    )
+
+
+def arrow_schema(max_size: int) -> "pa.Schema":
+    """Arrow schema of `export_columns`; product, substance and effect columns are dictionary-encoded."""
+    _require_pyarrow("arrow")
+    substance_type = pa.dictionary(pa.int16(), pa.string())
+    return pa.schema(
+        [pa.field("product", pa.dictionary(pa.int8(), pa.string())), pa.field("combination_size", pa.int8())]
+        + [pa.field(f"substance_{position}", substance_type) for position in range(1, max_size + 1)]
+        + [
+            pa.field("effects", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("effect_mask", pa.int64()),
+            pa.field("modifier", pa.float64()),
+            pa.field("sell_price", pa.float64()),
+            pa.field("substance_cost", pa.float64()),
+            pa.field("profit", pa.float64()),
+            pa.field("max_level", pa.int16()),
+        ]
+    )
+
+
+def _require_pyarrow(file_format: str) -> None:
+    if pa is None:
+        raise ValueError(f"The {file_format} format needs pyarrow (pip install pyarrow); use csv instead.")
+
+
+def enumerated_chunks(
+    product_name: str, combination_size: int, max_level: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[List[ExportRow]]:
+    """
+    Every ordered combination of `combination_size` substances up to `max_level`, in the
+    order of generate_size_entries, in chunks of at most `chunk_size` rows.
+
+    The combinations are evaluated with the shared transition table: the state of each
+    prefix is computed once for all last substances. Values are rounded to cents like
+    the stored ones, so both sources export the same rows.
+    """
+    if combination_size < 1:
+        raise ValueError("combination_size must be at least 1.")
+    table = TransitionTable.shared(max_level)
+    base_price = float(get_product(product_name).base_sell_price)
+    ids = [substance_ids[name] for name in table.names]
+    prices = [float(price) for price in table.prices]
+    start = product_start_mask(product_name)
+
+    chunk: List[ExportRow] = []
+    for prefix in itertool_product(range(len(table)), repeat=combination_size - 1):
+        mask = start
+        cost = 0.0
+        level = 0
+        for index in prefix:
+            mask = table.apply(mask, index)
+            cost += prices[index]
+            level = max(level, table.levels[index])
+        prefix_ids = tuple(ids[index] for index in prefix)
+
+        for index in range(len(table)):
+            final = table.apply(mask, index)
+            modifier = table.modifier(final)
+            chunk.append((
+                combination_size,
+                prefix_ids + (ids[index],),
+                final,
+                round(modifier, 2),
+                round(base_price * (1 + modifier), 2),
+                round(cost + prices[index], 2),
+                max(level, table.levels[index]),
+            ))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def stored_chunks(
+    product_name: str,
+    combination_size: int,
+    max_level: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    db_path: str = "combinations.db"
+) -> Iterator[List[ExportRow]]:
+    """
+    Stored combinations of one size in chunks (see `iter_stored_combinations`), as export rows.
+    Raises ValueError for a stored substance that is missing from the lookup data.
+    """
+    # database ids -> ids / bits of the lookup data
+    db_substances = get_id_map(db_path, "substances")
+    lookup_substances = {db_id: substance_ids[name] for name, db_id in db_substances.items() if name in substance_ids}
+    lookup_bits = {
+        effect_bit(db_id): EFFECT_BITS[name] for name, db_id in get_id_map(db_path, "effects").items() if name in EFFECT_BITS
+    }
+    masks: Dict[int, int] = {}
+
+    for rows in iter_stored_combinations(product_name, combination_size, max_level, chunk_size, db_path):
+        chunk: List[ExportRow] = []
+        for _, modifier, sell_price, substance_cost, db_mask, level, substance_db_ids in rows:
+            mask = masks.get(db_mask)
+            if mask is None:
+                mask = masks[db_mask] = sum(bit for db_bit, bit in lookup_bits.items() if db_mask & db_bit)
+            try:
+                ids = tuple(lookup_substances[db_id] for db_id in substance_db_ids)
+            except KeyError as e:
+                name = next((name for name, db_id in db_substances.items() if db_id == e.args[0]), e.args[0])
+                raise ValueError(
+                    f"Substance '{name}' stored in '{db_path}' not found in the lookup data! "
+                    "Rebuild the database or update the lookup data."
+                ) from None
+            chunk.append((
+                combination_size,
+                ids,
+                mask,
+                modifier,
+                sell_price,
+                substance_cost,
+                level or 0,
+            ))
+        yield chunk
+
+
+class _CsvWriter:
+    def __init__(self, path: str, max_size: int):
+        self.max_size = max_size
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(export_columns(max_size))
+        self._names = [substance.name for substance in substances]
+        self._effects: Dict[int, str] = {}
+
+    def write(self, product_name: str, rows: List[ExportRow]) -> None:
+        padding = [""] * self.max_size
+        for size, ids, mask, modifier, sell_price, substance_cost, level in rows:
+            effects = self._effects.get(mask)
+            if effects is None:
+                effects = self._effects[mask] = ";".join(mask_to_effects(mask))
+            self._writer.writerow([
+                product_name, size, *[self._names[substance_id] for substance_id in ids], *padding[size:],
+                effects, mask, f"{modifier:.2f}", f"{sell_price:.2f}", f"{substance_cost:.2f}",
+                f"{sell_price - substance_cost:.2f}", level,
+            ])
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowWriter:
+    """
+    Writes each chunk as one record batch (Arrow IPC stream) or row group (Parquet).
+
+    Products and substances use the full lookup lists as dictionaries. The effect sets
+    are numbered as they appear; the dictionary only grows, so the stream writer sends
+    the new entries as dictionary deltas. Only the entries new in a chunk are converted
+    and appended to the dictionary array; chunks without new effect sets reuse it as is.
+    """
+
+    def __init__(self, path: str, file_format: str, max_size: int):
+        _require_pyarrow(file_format)
+        self.max_size = max_size
+        self.file_format = file_format
+        self.schema = arrow_schema(max_size)
+        self._products = pa.array([product.name for product in products], pa.string())
+        self._product_index = {product.name: index for index, product in enumerate(products)}
+        self._substances = pa.array([substance.name for substance in substances], pa.string())
+        self._effect_sets = pa.array([], pa.string())
+        self._effect_index: Dict[int, int] = {}
+
+        if file_format == "parquet":
+            self._sink = None
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_stream(
+                self._sink, self.schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            )
+
+    def write(self, product_name: str, rows: List[ExportRow]) -> None:
+        effect_indices = []
+        new_effect_sets: List[str] = []
+        for row in rows:
+            index = self._effect_index.get(row[2])
+            if index is None:
+                index = self._effect_index[row[2]] = len(self._effect_index)
+                new_effect_sets.append(";".join(mask_to_effects(row[2])))
+            effect_indices.append(index)
+        if new_effect_sets:
+            self._effect_sets = pa.concat_arrays([self._effect_sets, pa.array(new_effect_sets, pa.string())])
+
+        columns = [
+            pa.DictionaryArray.from_arrays(
+                pa.array([self._product_index[product_name]] * len(rows), pa.int8()), self._products
+            ),
+            pa.array([row[0] for row in rows], pa.int8()),
+        ]
+        for position in range(self.max_size):
+            columns.append(pa.DictionaryArray.from_arrays(
+                pa.array([row[1][position] if position < row[0] else None for row in rows], pa.int16()),
+                self._substances,
+            ))
+        columns += [
+            pa.DictionaryArray.from_arrays(pa.array(effect_indices, pa.int32()), self._effect_sets),
+            pa.array([row[2] for row in rows], pa.int64()),
+            pa.array([row[3] for row in rows], pa.float64()),
+            pa.array([row[4] for row in rows], pa.float64()),
+            pa.array([row[5] for row in rows], pa.float64()),
+            pa.array([round(row[4] - row[5], 2) for row in rows], pa.float64()),
+            pa.array([row[6] for row in rows], pa.int16()),
+        ]
+        batch = pa.RecordBatch.from_arrays(columns, schema=self.schema)
+        if self.file_format == "parquet":
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+def _open_writer(path: str, file_format: str, max_size: int):
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format: {file_format}")
+    if file_format == "csv":
+        return _CsvWriter(path, max_size)
+    return _ArrowWriter(path, file_format, max_size)
+
+
+def _export_sizes(product_name: str, sizes: Optional[Sequence[int]], source: str, db_path: str) -> List[int]:
+    if sizes:
+        return sorted(set(sizes))
+    if source == "db":
+        return get_stored_sizes(product_name, db_path)
+    raise ValueError("Combination sizes are required when exporting from the enumerator.")
+
+
+def _product_chunks(
+    product_name: str,
+    sizes: List[int],
+    source: str,
+    max_level: int,
+    chunk_size: int,
+    db_path: str
+) -> Iterator[List[ExportRow]]:
+    for size in sizes:
+        if source == "db":
+            yield from stored_chunks(product_name, size, max_level, chunk_size, db_path)
+        else:
+            yield from enumerated_chunks(product_name, size, max_level, chunk_size)
+
+
+def _write_products(
+    path: str,
+    product_sizes: Dict[str, List[int]],
+    file_format: str,
+    source: str,
+    max_level: int,
+    chunk_size: int,
+    db_path: str
+) -> int:
+    """Write the combinations of all `product_sizes` to one file; returns the number of rows."""
+    start = time.perf_counter()
+    max_size = max((max(sizes) for sizes in product_sizes.values() if sizes), default=1)
+    writer = _open_writer(path, file_format, max_size)
+    rows = 0
+    try:
+        for product_name, sizes in product_sizes.items():
+            for chunk in _product_chunks(product_name, sizes, source, max_level, chunk_size, db_path):
+                writer.write(product_name, chunk)
+                rows += len(chunk)
+    finally:
+        writer.close()
+    logger.info(f"Exported {rows} combinations to {path} in {time.perf_counter() - start:.1f}s.")
+    return rows
+
+
+def _write_products_task(args: tuple) -> Tuple[str, int]:
+    return args[0], _write_products(*args)
+
+
+def export_combinations(
+    product_names: Sequence[str],
+    output: str,
+    file_format: str = "csv",
+    source: str = "enumerate",
+    sizes: Optional[Sequence[int]] = None,
+    max_level: Union[int, str] = "max",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    db_path: str = "combinations.db",
+    per_product: bool = False,
+    workers: int = 1
+) -> Dict[str, int]:
+    """
+    Export combination tables to CSV, Arrow (IPC stream) or Parquet in bounded memory.
+
+    Rows come straight from the enumerator (`source="enumerate"`, every ordered combination
+    of `sizes`) or from the stored combinations in `db_path` (`source="db"`, default: all
+    stored sizes) and are written in chunks of `chunk_size`, so only one chunk is held
+    in memory at a time. Arrow and Parquet need pyarrow.
+
+    Args:
+        product_names (Sequence[str]): Products to export.
+        output (str): Output file, or directory with `per_product`.
+        file_format (str): "csv", "arrow" or "parquet".
+        source (str): "enumerate" or "db".
+        sizes (Sequence[int], optional): Combination sizes.
+        max_level (int or str): Highest substance level.
+        chunk_size (int): Rows per chunk (record batch / row group).
+        db_path (str): Database for `source="db"`.
+        per_product (bool): Write one file per product into the directory `output`.
+        workers (int): Processes writing the per-product files in parallel.
+
+    Returns:
+        Dict[str, int]: Rows written per file.
+    """
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Invalid export source: {source}")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format: {file_format}")
+    if file_format != "csv":
+        _require_pyarrow(file_format)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    if source == "db" and not os.path.exists(db_path):
+        raise ValueError(f"Database '{db_path}' not found!")
+
+    max_level = resolve_max_level(max_level)
+    product_sizes: Dict[str, List[int]] = {}
+    for name in product_names:
+        name = name.lower().replace(" ", "_")
+        get_product(name)
+        product_sizes[name] = _export_sizes(name, sizes, source, db_path)
+
+    if not per_product:
+        return {output: _write_products(output, product_sizes, file_format, source, max_level, chunk_size, db_path)}
+
+    os.makedirs(output, exist_ok=True)
+    tasks = [
+        (os.path.join(output, name + FILE_EXTENSIONS[file_format]), {name: product_sizes[name]},
+         file_format, source, max_level, chunk_size, db_path)
+        for name in product_sizes
+    ]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            return dict(pool.imap_unordered(_write_products_task, tasks))
+    return dict(map(_write_products_task, tasks))
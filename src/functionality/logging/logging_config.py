@@ -1,39 +1,157 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
+from typing import Dict, Optional
 
-def setup_logging():
+# Rotation: max. 10 Dateien, jede max. 10 MB
+MAX_LOG_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 10
+
+# Standard-Verzeichnis der Log-Dateien
+DEFAULT_LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "logs"))
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    # Format: "functionality.calc_modifier=DEBUG,werkzeug=WARNING"
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_handlers(log_dir: Optional[str] = None):
     # Log-Verzeichnis
-    log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "logs"))
+    log_dir = log_dir or DEFAULT_LOG_DIR
     os.makedirs(log_dir, exist_ok=True)
 
     # Log-Dateiname mit aktuellem Datum
     log_filename = f"sh_log_{datetime.now().strftime('%d_%m_%y')}.log"
     log_filepath = os.path.join(log_dir, log_filename)
 
-    # Logger konfigurieren
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-
-    # Rotating File Handler (max. 10 Dateien, jede max. 1 MB)
+    # Rotating File Handler
     file_handler = RotatingFileHandler(
-        log_filepath, maxBytes=1_000_000_000_000, backupCount=10
+        log_filepath, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUP_COUNT
     )
-    file_handler.setLevel(logging.INFO)
     file_formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s"
+        "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
     )
     file_handler.setFormatter(file_formatter)
 
     # Stream Handler (für Konsole)
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
     console_formatter = logging.Formatter("%(levelname)s - %(message)s")
     console_handler.setFormatter(console_formatter)
 
-    # Handler dem Logger hinzufügen
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    return file_handler, console_handler
+
+
+def _restart_listener_after_fork() -> None:
+    """
+    A forked worker (e.g. under `gunicorn --preload`) inherits the handlers but not the
+    listener thread. Give it its own queue and listener so its records are still written.
+    """
+    global _lock, _listener
+
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueHandler) and handler.queue is _listener.queue:
+            handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def setup_logging(name: Optional[str] = None, levels: Optional[Dict[str, str]] = None) -> logging.Logger:
+    """
+    Configure logging once per process and return the logger `name` (root logger if None).
+
+    Records are put on a queue by the calling thread; a QueueListener thread writes them
+    to the rotating log file and the console, so file I/O stays off the request thread.
+    Calling this again does not add handlers. Per-module levels can be passed as
+    `levels` ({"functionality.calc_modifier": "DEBUG"}) or via the LOG_LEVELS
+    environment variable ("functionality.calc_modifier=DEBUG,werkzeug=WARNING").
+    """
+    global _listener
+
+    root = logging.getLogger()
+    with _lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+            _listener = QueueListener(log_queue, *_build_handlers(), respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+            root.addHandler(QueueHandler(log_queue))
+            root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+        module_levels = _parse_levels(os.environ.get("LOG_LEVELS", ""))
+        module_levels.update(levels or {})
+        for module, level in module_levels.items():
+            logging.getLogger(module).setLevel(level)
+
+    return logging.getLogger(name)
+
+
+def measure_logging_overhead(records: int = 20_000) -> Dict[str, float]:
+    """
+    Microseconds the calling thread spends per logged record, once with the file and
+    console handlers attached directly (previous setup) and once through the queue.
+    """
+    import tempfile
+    import time
+
+    results = {}
+    devnull = open(os.devnull, "w")
+    log_dir = tempfile.mkdtemp(prefix="logging_benchmark_")
+    for label in ("synchronous", "queued"):
+        logger = logging.getLogger(f"logging_benchmark.{label}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        file_handler, console_handler = _build_handlers(log_dir)
+        console_handler.setStream(devnull)
+
+        listener = None
+        if label == "synchronous":
+            logger.addHandler(file_handler)
+            logger.addHandler(console_handler)
+        else:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler, console_handler)
+            listener.start()
+            logger.addHandler(QueueHandler(log_queue))
+
+        start = time.perf_counter()
+        for i in range(records):
+            logger.info("Benchmark record %d", i)
+        results[label] = (time.perf_counter() - start) / records * 1e6
+
+        if listener:
+            listener.stop()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        file_handler.close()
+    devnull.close()
+
+    for label, micros in results.items():
+        print(f"{label:>12}: {micros:.1f} µs per record on the calling thread")
+    return results
+
 
-    return logger
\ No newline at end of file
+if __name__ == "__main__":
+    measure_logging_overhead()
@@ -0,0 +1,64 @@
+from typing import List, Tuple
+
+from src.util.models import CombinationResult
+
+
+class ParetoFrontier:
+    """
+    Incrementally maintained set of non-dominated combinations.
+
+    Objectives: maximize profit, minimize substance cost, minimize the number of
+    substances and (optionally) maximize the modifier. Only non-dominated entries are
+    kept, so memory is proportional to the size of the frontier. If two combinations
+    have identical objective values, the one added first is kept.
+    """
+
+    def __init__(self, include_modifier: bool = False):
+        self.include_modifier = include_modifier
+        self._entries: List[Tuple[tuple, CombinationResult]] = []
+
+    def _objectives(self, result: CombinationResult) -> tuple:
+        # All objectives oriented so that larger is better
+        objectives = (
+            result.sell_price - result.substance_cost,
+            -result.substance_cost,
+            -len(result.substances),
+        )
+        if self.include_modifier:
+            objectives += (result.modifier,)
+        return objectives
+
+    @staticmethod
+    def _dominates(a: tuple, b: tuple) -> bool:
+        """True if `a` is at least as good as `b` in every objective."""
+        return all(x >= y for x, y in zip(a, b))
+
+    def add(self, result: CombinationResult) -> bool:
+        """
+        Offer a combination to the frontier.
+
+        Returns:
+            bool: True if the combination was added (it is not dominated).
+        """
+        candidate = self._objectives(result)
+        for objectives, _ in self._entries:
+            if self._dominates(objectives, candidate):
+                return False
+
+        self._entries = [
+            (objectives, entry) for objectives, entry in self._entries
+            if not self._dominates(candidate, objectives)
+        ]
+        self._entries.append((candidate, result))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def sorted(self) -> List[CombinationResult]:
+        """Frontier sorted by substance cost, then size, then descending profit."""
+        return [
+            entry for _, entry in sorted(
+                self._entries, key=lambda item: (-item[0][1], -item[0][2], -item[0][0])
+            )
+        ]
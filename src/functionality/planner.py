@@ -0,0 +1,296 @@
+import os
+import time
+from typing import Dict, List, Optional, Union
+
+from src.lookup.lookup import level_name_to_int, products
+from src.util.models import SearchPlan, StrategyEstimate
+from functionality.search_control import SearchControl
+from functionality.transition_memo import TransitionMemo
+from functionality.transitions import TransitionTable, estimate_layer_sizes
+from functionality import solvers
+
+# Strategies the planner may choose from, per objective
+OBJECTIVE_STRATEGIES = {
+    # best modifier and best profit entry
+    "best_mix": ("prefix_dfs", "branch_and_bound", "state_dp", "parallel"),
+    # every combination (what generate_db_entrys stores)
+    "all_combinations": ("exhaustive",),
+    # smallest combination with the desired effects
+    "min_substances": ("exhaustive", "state_dp", "meet_in_middle"),
+}
+
+# Seconds per unit of work, measured on a developer machine. Work is the number of
+# evaluated combinations (exhaustive, DFS) or transitions (state DP). All of them are
+# scaled by the speed factor of the current machine, see `calibrate`.
+SECONDS_PER_UNIT = {
+    "exhaustive": 36e-6,
+    "prefix_dfs": 1.8e-6,
+    "branch_and_bound": 1.8e-6,
+    "state_dp": 1.7e-6,
+    "parallel": 1.8e-6,
+    "meet_in_middle": 7e-6,
+}
+# Share of the DFS nodes branch-and-bound still visits (measured at sizes 3-4)
+BRANCH_AND_BOUND_VISIT_RATIO = 0.85
+PARALLEL_STARTUP_SECONDS = 0.15
+BYTES_PER_STORED_COMBINATION = 700
+BYTES_PER_STATE = 200
+BYTES_PER_WORKER = 30_000_000
+DEFAULT_MAX_MEMORY = 2_000_000_000
+
+# Combination size and repetitions of the state DP run timed by `calibrate`
+CALIBRATION_SIZE = 4
+CALIBRATION_RUNS = 3
+# Measured speed factors outside these bounds are clamped (noisy or overloaded host)
+SPEED_FACTOR_BOUNDS = (0.1, 10.0)
+
+# Run time on this machine relative to SECONDS_PER_UNIT (2.0: twice as slow);
+# PLANNER_SPEED_FACTOR overrides it, otherwise `calibrate` measures it
+_speed_factor = float(os.environ.get("PLANNER_SPEED_FACTOR") or 1.0)
+
+
+def resolve_max_level(max_level: Union[int, str]) -> int:
+    if isinstance(max_level, str):
+        level = level_name_to_int.get(max_level.lower().replace(" ", "_"))
+        if level is None:
+            raise ValueError(f"Invalid level name: {max_level}")
+        return level
+    return max_level
+
+
+def speed_factor() -> float:
+    return _speed_factor
+
+
+def set_speed_factor(factor: float) -> None:
+    """Scale all SECONDS_PER_UNIT estimates by `factor` (run time relative to the reference machine)."""
+    global _speed_factor
+    if factor <= 0:
+        raise ValueError(f"Invalid speed factor: {factor}")
+    _speed_factor = factor
+
+
+def calibrate(product_name: Optional[str] = None) -> float:
+    """
+    Measure the speed of this machine with a short state DP run (some 30 milliseconds)
+    and use it for all run time estimates. Does nothing if PLANNER_SPEED_FACTOR is set.
+
+    The run uses a table with its own empty memo, so it measures uncached transitions
+    like the reference values, no matter how warm the process-wide memo already is.
+
+    Returns:
+        float: The speed factor in use.
+    """
+    if os.environ.get("PLANNER_SPEED_FACTOR"):
+        return _speed_factor
+    names = TransitionTable.shared(resolve_max_level("max")).names
+    product_name = product_name or products[0].name
+    seconds = float("inf")
+    for _ in range(CALIBRATION_RUNS):
+        table = TransitionTable(names, TransitionMemo())
+        start = time.perf_counter()
+        _, _, transitions = solvers.state_dp_best_mix(table, product_name, CALIBRATION_SIZE)
+        seconds = min(seconds, time.perf_counter() - start)
+    low, high = SPEED_FACTOR_BOUNDS
+    set_speed_factor(min(max(seconds / (transitions * SECONDS_PER_UNIT["state_dp"]), low), high))
+    return _speed_factor
+
+
+def estimate_costs(
+    objective: str,
+    product_name: str,
+    max_level: int,
+    combination_size: int,
+    workers: int = 1,
+    combination_search_limit: int = 200_000
+) -> Dict[str, StrategyEstimate]:
+    """
+    Estimate work, run time and memory of every strategy available for `objective`.
+    """
+    if objective not in OBJECTIVE_STRATEGIES:
+        raise ValueError(f"Unknown objective: {objective}")
+
+    table = TransitionTable.shared(max_level)
+    n = len(table)
+    combinations = solvers.search_space_size(n, combination_size)
+    # Source layers 0..size-1 are expanded with n transitions each
+    layers = estimate_layer_sizes(table, product_name, combination_size)
+    dp_work = sum(layers[:-1]) * n
+    # Forward and backward side each expand layers up to half the size; the backward
+    # cubes are assumed to grow like the forward states
+    half = (combination_size + 1) // 2
+    meet_in_middle_work = 2 * sum(layers[:half]) * n
+
+    estimates: Dict[str, StrategyEstimate] = {}
+    for strategy in OBJECTIVE_STRATEGIES[objective]:
+        if strategy == "parallel" and workers <= 1:
+            continue
+        if strategy == "exhaustive" and objective == "min_substances":
+            work = sum(
+                n ** size for size in range(1, combination_size + 1) if n ** size <= combination_search_limit
+            )
+            memory = 0
+            if n ** combination_size > combination_search_limit:
+                # sizes above the limit are handed over to the meet-in-the-middle search
+                work += meet_in_middle_work
+                memory = 2 * layers[half] * BYTES_PER_STATE
+        elif strategy == "meet_in_middle":
+            work = meet_in_middle_work
+            memory = 2 * layers[half] * BYTES_PER_STATE
+        elif strategy == "exhaustive":
+            work = combinations
+            memory = combinations * BYTES_PER_STORED_COMBINATION
+        elif strategy == "state_dp":
+            work = dp_work
+            memory = (sum(layers) if objective == "min_substances" else max(layers)) * BYTES_PER_STATE
+        elif strategy == "branch_and_bound":
+            work = int(combinations * BRANCH_AND_BOUND_VISIT_RATIO)
+            memory = 0
+        else:
+            work = combinations
+            memory = BYTES_PER_WORKER * workers if strategy == "parallel" else 0
+
+        seconds = work * SECONDS_PER_UNIT[strategy] * _speed_factor
+        if strategy == "parallel":
+            seconds = seconds / workers + PARALLEL_STARTUP_SECONDS
+        estimates[strategy] = StrategyEstimate(work=work, seconds=seconds, memory=memory)
+    return estimates
+
+
+def _check_combination_size(combination_size: int) -> None:
+    # the solvers would still return a one-substance mix for smaller sizes
+    if combination_size < 1:
+        raise ValueError("combination_size must be at least 1.")
+
+
+def plan_search(
+    objective: str,
+    product_name: str,
+    max_level: Union[int, str],
+    combination_size: int,
+    max_memory: int = DEFAULT_MAX_MEMORY,
+    workers: Optional[int] = None,
+    allow_parallel: bool = True
+) -> SearchPlan:
+    """
+    Pick the strategy with the lowest estimated run time whose estimated memory fits
+    into `max_memory` (or the one with the least memory if none fits).
+
+    Args:
+        objective (str): "best_mix", "all_combinations" or "min_substances".
+        product_name (str): The product to search for.
+        max_level (int or str): Maximum level of substances to include.
+        combination_size (int): Combination size (maximum search size for "min_substances").
+        max_memory (int): Memory limit in bytes.
+        workers (int, optional): Worker processes for the parallel strategy (default: CPU count).
+        allow_parallel (bool): Consider the process-pool strategy at all.
+    """
+    _check_combination_size(combination_size)
+    product_name = product_name.lower().replace(" ", "_")
+    max_level = resolve_max_level(max_level)
+    workers = (workers or os.cpu_count() or 1) if allow_parallel else 1
+
+    estimates = estimate_costs(objective, product_name, max_level, combination_size, workers)
+    fitting = [name for name, estimate in estimates.items() if estimate.memory <= max_memory]
+    if fitting:
+        strategy = min(fitting, key=lambda name: estimates[name].seconds)
+    else:
+        strategy = min(estimates, key=lambda name: estimates[name].memory)
+
+    return SearchPlan(
+        objective=objective,
+        product_name=product_name,
+        max_level=max_level,
+        combination_size=combination_size,
+        strategy=strategy,
+        estimates=estimates,
+    )
+
+
+def run_plan(
+    plan: SearchPlan,
+    control: Optional[SearchControl] = None,
+    desired_effects: Optional[List[str]] = None,
+    not_desired_effects: Optional[List[str]] = None,
+    max_results: int = 10,
+    workers: Optional[int] = None
+):
+    """
+    Execute a plan and record its actual work and run time on it.
+
+    Returns:
+        "best_mix": (best_modifier, best_profit)
+        "all_combinations": the tuple returned by `get_best_mix`
+        "min_substances": (found_size, results) like `find_min_substances_for_effect`
+    """
+    # imported here because calc_modifier configures logging on import
+    from functionality.calc_modifier import find_min_substances_for_effect, get_best_mix
+
+    _check_combination_size(plan.combination_size)
+    control = control or SearchControl()
+    table = TransitionTable.shared(plan.max_level)
+    start = time.time()
+
+    if plan.objective == "best_mix":
+        best_mix_solvers = {
+            "prefix_dfs": solvers.prefix_dfs_best_mix,
+            "branch_and_bound": solvers.branch_and_bound_best_mix,
+            "state_dp": solvers.state_dp_best_mix,
+        }
+        if plan.strategy == "parallel":
+            best_modifier, best_profit, work = solvers.parallel_best_mix(
+                table, plan.product_name, plan.combination_size, control, workers
+            )
+        else:
+            best_modifier, best_profit, work = best_mix_solvers[plan.strategy](
+                table, plan.product_name, plan.combination_size, control
+            )
+        result = (best_modifier, best_profit)
+    elif plan.objective == "all_combinations":
+        result = get_best_mix(
+            plan.combination_size, plan.product_name, plan.max_level, control=control, keep_combinations=True
+        )
+        work = control.evaluated
+    else:
+        desired = [e.strip().lower().replace(" ", "_") for e in desired_effects or []]
+        not_desired = [e.strip().lower().replace(" ", "_") for e in not_desired_effects or []]
+        if plan.strategy == "state_dp":
+            size, results, work = solvers.state_bfs_min_substances(
+                table, plan.product_name, desired, not_desired, plan.combination_size, max_results, control
+            )
+            result = (size, results)
+        elif plan.strategy == "meet_in_middle":
+            size, results, work = solvers.meet_in_middle_min_substances(
+                table, plan.product_name, desired, not_desired, plan.combination_size, max_results, control
+            )
+            result = (size, results)
+        else:
+            result = find_min_substances_for_effect(
+                plan.product_name, desired, not_desired, plan.max_level,
+                max_search_size=plan.combination_size, max_results=max_results, control=control
+            )
+            work = control.evaluated
+
+    plan.actual_work = work
+    plan.actual_seconds = time.time() - start
+    return result
+
+
+def explain(plan: SearchPlan) -> str:
+    """Human readable table of the estimates per strategy and, once run, the actual cost."""
+    lines = [
+        f"Plan for {plan.objective}: product={plan.product_name}, level={plan.max_level}, "
+        f"size={plan.combination_size} -> {plan.strategy}",
+        f"  {'strategy':<18}{'est. work':>14}{'est. seconds':>14}{'est. memory':>14}",
+    ]
+    for name, estimate in plan.estimates.items():
+        marker = "*" if name == plan.strategy else " "
+        lines.append(
+            f"{marker} {name:<18}{estimate.work:>14,}{estimate.seconds:>14.3f}{estimate.memory:>14,}"
+        )
+    if plan.actual_work is not None:
+        lines.append(
+            f"  actual: work={plan.actual_work:,} ({plan.actual_work / max(plan.estimate.work, 1):.2f}x estimate), "
+            f"seconds={plan.actual_seconds:.3f} (estimate {plan.estimate.seconds:.3f})"
+        )
+    return "\n".join(lines)
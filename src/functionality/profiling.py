@@ -0,0 +1,192 @@
+import cProfile
+import glob
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from src.util.models import ProfileReport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = "profiles"
+# Seconds between two stack samples
+SAMPLE_INTERVAL = 0.005
+# Hot functions written to the log
+PROFILE_TOP = 15
+
+# Worker profile directory of the profile_search running on this thread
+_active = threading.local()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a background thread
+    and counts the collapsed stacks ("outer;inner;leaf"), the input format of
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+
+class Profiler:
+    """
+    Deterministic profile (cProfile) plus sampled stacks of the calling thread.
+
+    Usage:
+        with Profiler() as profiler:
+            search()
+        profiler.dump("profiles/search")  # search.pstats, search.collapsed
+    """
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL):
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(interval=sample_interval)
+
+    def __enter__(self) -> "Profiler":
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profile.disable()
+        self.sampler.stop()
+
+    def dump(self, path_prefix: str) -> None:
+        self.profile.dump_stats(f"{path_prefix}.pstats")
+        write_collapsed(f"{path_prefix}.collapsed", self.sampler.stacks)
+
+
+def write_collapsed(path: str, stacks: Counter) -> None:
+    with open(path, "w") as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+
+def read_collapsed(path: str) -> Counter:
+    stacks: Counter = Counter()
+    with open(path) as file:
+        for line in file:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def worker_profile_dir() -> Optional[str]:
+    """
+    Directory for worker profiles if a profile_search is running on this thread.
+    Process pools wrap their tasks in `run_profiled` when this is set.
+    """
+    return getattr(_active, "worker_dir", None)
+
+
+def run_profiled(directory: str, func: Callable, *args):
+    """Run `func(*args)` in a pool worker and write its profile to `directory`."""
+    with Profiler() as profiler:
+        result = func(*args)
+    profiler.dump(os.path.join(directory, f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}"))
+    return result
+
+
+def top_functions(stats: pstats.Stats, top: int = PROFILE_TOP):
+    """(function, own seconds, cumulative seconds, calls) of the `top` functions by own time."""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append((f"{os.path.basename(filename)}:{line}({name})", own, cumulative, calls))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows[:top]
+
+
+@contextmanager
+def profile_search(
+    name: str,
+    output_dir: str = DEFAULT_PROFILE_DIR,
+    top: int = PROFILE_TOP,
+    sample_interval: float = SAMPLE_INTERVAL
+) -> Iterator[ProfileReport]:
+    """
+    Profile the code in the with-block and write `profile.pstats` and `profile.collapsed`
+    to a new directory below `output_dir`. Profiles of process-pool workers started in the
+    block (see `worker_profile_dir`) are merged into both files. The hottest functions are
+    logged; the yielded ProfileReport is filled in when the block ends.
+
+    View the results with `python -m pstats profile.pstats` or
+    `flamegraph.pl profile.collapsed > profile.svg`.
+    """
+    directory = os.path.abspath(os.path.join(
+        output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    ))
+    worker_dir = os.path.join(directory, "workers")
+    os.makedirs(worker_dir)
+    report = ProfileReport(directory=directory)
+
+    previous = worker_profile_dir()
+    _active.worker_dir = worker_dir
+    profiler = Profiler(sample_interval)
+    try:
+        with profiler:
+            yield report
+    finally:
+        _active.worker_dir = previous
+
+        stats = pstats.Stats(profiler.profile)
+        stacks = profiler.sampler.stacks
+        worker_files = sorted(glob.glob(os.path.join(worker_dir, "*.pstats")))
+        for path in worker_files:
+            stats.add(path)
+            collapsed = path[:-len(".pstats")] + ".collapsed"
+            if os.path.exists(collapsed):
+                stacks.update(read_collapsed(collapsed))
+
+        report.pstats_path = os.path.join(directory, "profile.pstats")
+        report.collapsed_path = os.path.join(directory, "profile.collapsed")
+        stats.dump_stats(report.pstats_path)
+        write_collapsed(report.collapsed_path, stacks)
+        report.top_functions = top_functions(stats, top)
+        report.worker_profiles = len(worker_files)
+        report.samples = sum(stacks.values())
+
+        lines = [
+            f"Profile '{name}' written to {directory} "
+            f"({report.worker_profiles} worker profile(s), {report.samples} samples). Hottest functions:",
+            f"  {'own s':>9}{'cum s':>9}{'calls':>10}  function",
+        ]
+        for function, own, cumulative, calls in report.top_functions:
+            lines.append(f"  {own:>9.3f}{cumulative:>9.3f}{calls:>10}  {function}")
+        logger.info("\n".join(lines))
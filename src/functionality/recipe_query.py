@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import sys
+import os
+import time
+from typing import List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.util.models import CombinationResult, RecipeQuery
+from functionality.planner import resolve_max_level
+from functionality.search_control import SearchControl
+from functionality.solvers import SearchStopped, build_result, get_product, search_space_size
+from functionality.transitions import TransitionTable, effects_to_mask, product_start_mask, EFFECT_BITS
+
+
+def _normalize(names: Optional[List[str]]) -> List[str]:
+    if isinstance(names, str):
+        names = names.split(",")
+    return [name.strip().lower().replace(" ", "_") for name in names or [] if name.strip()]
+
+
+def search_recipes(query: RecipeQuery, control: Optional[SearchControl] = None) -> List[CombinationResult]:
+    """
+    Find the most profitable combinations that satisfy all constraints of `query`.
+
+    Every constraint is applied while the combinations are enumerated instead of
+    afterwards:
+    - cost budget: a prefix whose cost already exceeds `max_substance_cost` is not extended
+    - excluded effects: a state holding an excluded effect that no substance can replace
+      is not extended; other excluded effects are checked on each result
+    - included effects: the query fails fast if no substance can ever produce one
+    - profit: a prefix is not extended if its profit upper bound is below `min_profit`
+      or below the worst of the best `max_results` found so far
+
+    Args:
+        query (RecipeQuery): The constraints.
+        control (SearchControl, optional): Time budget, cancellation and progress reporting.
+
+    Returns:
+        List[CombinationResult]: Up to `max_results` combinations, by descending profit.
+    """
+    product_name = query.product_name.lower().replace(" ", "_")
+    product = get_product(product_name)
+    table = TransitionTable.for_level(resolve_max_level(query.max_level))
+    start = product_start_mask(product_name)
+
+    include_names = _normalize(query.include_effects)
+    if any(name not in EFFECT_BITS for name in include_names):
+        return []
+    include_mask = effects_to_mask(include_names)
+    exclude_mask = effects_to_mask(name for name in _normalize(query.exclude_effects) if name in EFFECT_BITS)
+
+    if include_mask & ~(table.producible_mask() | start):
+        return []
+    sticky_excluded = exclude_mask & ~table.removable_mask()
+    if start & sticky_excluded:
+        return []
+
+    prices = [float(price) for price in table.prices]
+    min_price = min(prices, default=0.0)
+    base_price = float(product.base_sell_price)
+    budget = float(query.max_substance_cost) if query.max_substance_cost is not None else float("inf")
+    min_profit = float(query.min_profit) if query.min_profit is not None else float("-inf")
+    modifier_bound = table.modifier_bound()
+
+    # min-heap of (profit, tie breaker, path, mask) holding the best results so far
+    best: list = []
+    counter = itertools.count()
+
+    def threshold() -> float:
+        if len(best) >= query.max_results:
+            return max(min_profit, best[0][0])
+        return min_profit
+
+    def dfs(mask: int, cost: float, path: List[int], remaining: int) -> None:
+        for index in range(len(table)):
+            child_cost = cost + prices[index]
+            if child_cost > budget:
+                continue
+            child = table.apply(mask, index)
+            if control and control.step():
+                raise SearchStopped()
+            if child & sticky_excluded:
+                continue
+
+            path.append(index)
+            if child & include_mask == include_mask and not child & exclude_mask:
+                profit = base_price * (1 + table.modifier(child)) - child_cost
+                if profit >= threshold():
+                    entry = (profit, -next(counter), tuple(path), child)
+                    if len(best) < query.max_results:
+                        heapq.heappush(best, entry)
+                    else:
+                        heapq.heapreplace(best, entry)
+
+            if (
+                remaining > 1
+                and child_cost + min_price <= budget
+                and base_price * (1 + modifier_bound(child, remaining - 1)) - (child_cost + min_price) >= threshold()
+            ):
+                dfs(child, child_cost, path, remaining - 1)
+            path.pop()
+
+    if control:
+        control.start(search_space_size(len(table), query.max_substances))
+    try:
+        dfs(start, 0.0, [], query.max_substances)
+    except SearchStopped:
+        pass
+    if control:
+        control.report()
+
+    return [build_result(table, product, path, mask) for _, _, path, mask in sorted(best, reverse=True)]
+
+
+def _post_filter(query: RecipeQuery) -> List[CombinationResult]:
+    """Reference implementation: enumerate everything with get_best_mix, then filter."""
+    from functionality.calc_modifier import get_best_mix
+
+    include = set(_normalize(query.include_effects))
+    exclude = set(_normalize(query.exclude_effects))
+    all_combinations, _, _ = get_best_mix(query.max_substances, query.product_name, query.max_level)
+
+    matches = []
+    for combinations in all_combinations.values():
+        for result in combinations.values():
+            profit = result.sell_price - result.substance_cost
+            if not include.issubset(result.effects) or exclude.intersection(result.effects):
+                continue
+            if query.max_substance_cost is not None and result.substance_cost > query.max_substance_cost:
+                continue
+            if query.min_profit is not None and profit < query.min_profit:
+                continue
+            matches.append(result)
+    matches.sort(key=lambda result: result.sell_price - result.substance_cost, reverse=True)
+    return matches[:query.max_results]
+
+
+def benchmark_pushdown(query: RecipeQuery) -> None:
+    """Compare constraint pushdown with enumerating everything and filtering afterwards."""
+    start = time.perf_counter()
+    pushed = search_recipes(query)
+    pushdown_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    filtered = _post_filter(query)
+    post_filter_seconds = time.perf_counter() - start
+
+    best = lambda results: results[0].sell_price - results[0].substance_cost if results else None
+    print(f"pushdown:    {pushdown_seconds:8.3f}s, {len(pushed)} result(s), best profit {best(pushed)}")
+    print(f"post-filter: {post_filter_seconds:8.3f}s, {len(filtered)} result(s), best profit {best(filtered)}")
+    print(f"speedup:     {post_filter_seconds / max(pushdown_seconds, 1e-9):8.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+    from decimal import Decimal
+
+    parser = argparse.ArgumentParser(description="Benchmark constraint pushdown against post-filtering.")
+    parser.add_argument("--product", default="cocaine")
+    parser.add_argument("--max_level", default="hustler_iii")
+    parser.add_argument("--include", default="anti_gravity")
+    parser.add_argument("--exclude", default="paranoia")
+    parser.add_argument("--max_cost", default="20")
+    parser.add_argument("--min_profit", default="150")
+    parser.add_argument("--max_substances", type=int, default=4)
+    args = parser.parse_args()
+
+    benchmark_pushdown(RecipeQuery(
+        product_name=args.product,
+        max_level=args.max_level,
+        include_effects=args.include.split(","),
+        exclude_effects=args.exclude.split(","),
+        max_substance_cost=Decimal(args.max_cost),
+        min_profit=Decimal(args.min_profit),
+        max_substances=args.max_substances,
+    ))
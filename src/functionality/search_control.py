@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from src.util.models import CombinationResult, SearchProgress
+
+
+class CancellationToken:
+    """Thread-safe flag to cooperatively cancel a running search from another thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class SearchControl:
+    """
+    Time budget, cancellation and progress reporting for a single search.
+
+    The search calls `start` once with the number of combinations it may evaluate and
+    `step` after every evaluated combination. `step` returns True once the search has to
+    stop; the search then returns its best result so far and `optimal` is False.
+
+    Args:
+        time_budget (float, optional): Maximum run time in seconds.
+        deadline (float, optional): Absolute stop time as a `time.time()` timestamp.
+        cancel_token (CancellationToken, optional): Token to cancel the search.
+        progress_callback (Callable[[SearchProgress], None], optional): Called at most
+            every `progress_interval` seconds while the search runs; the search calls
+            `report` once more when it ends.
+        progress_interval (float): Minimum seconds between two progress callbacks.
+    """
+
+    # Clock and token are only checked every CHECK_EVERY steps to keep `step` cheap
+    CHECK_EVERY = 1024
+
+    def __init__(
+        self,
+        time_budget: Optional[float] = None,
+        deadline: Optional[float] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        progress_callback: Optional[Callable[[SearchProgress], None]] = None,
+        progress_interval: float = 1.0
+    ):
+        self.time_budget = time_budget
+        self.deadline = deadline
+        self.cancel_token = cancel_token
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+
+        self.evaluated = 0
+        self.total = 0
+        self.interrupted = False
+        self.reason: Optional[str] = None
+        self._started_at = 0.0
+        self._stop_at: Optional[float] = None
+        self._next_progress = 0.0
+
+    @property
+    def optimal(self) -> bool:
+        """False if the search stopped early and the result may not be optimal."""
+        return not self.interrupted
+
+    @property
+    def stop_at(self) -> Optional[float]:
+        """Absolute `time.time()` at which the running search has to stop, if any."""
+        return self._stop_at
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self._started_at
+
+    def start(self, total: int) -> None:
+        """
+        Reset the counters for a search over `total` steps: combinations, or for the
+        state-based searches the (estimated) transitions.
+        """
+        self.evaluated = 0
+        self.total = total
+        self.interrupted = False
+        self.reason = None
+        self._started_at = time.time()
+
+        stop_times = []
+        if self.time_budget is not None:
+            stop_times.append(self._started_at + self.time_budget)
+        if self.deadline is not None:
+            stop_times.append(self.deadline)
+        self._stop_at = min(stop_times) if stop_times else None
+        self._next_progress = self._started_at + self.progress_interval
+
+    def step(self, best_so_far: Optional[CombinationResult] = None) -> bool:
+        """
+        Count one evaluated combination.
+
+        Returns:
+            bool: True if the search has to stop now.
+        """
+        self.evaluated += 1
+        if self.evaluated % self.CHECK_EVERY:
+            return False
+
+        now = time.time()
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self.interrupted, self.reason = True, "cancelled"
+        elif self._stop_at is not None and now >= self._stop_at:
+            self.interrupted, self.reason = True, "time budget exceeded"
+
+        if self.progress_callback and not self.interrupted and now >= self._next_progress:
+            self._next_progress = now + self.progress_interval
+            self.report(best_so_far)
+        return self.interrupted
+
+    def report(self, best_so_far: Optional[CombinationResult] = None) -> None:
+        """
+        Send the current progress to the progress callback. `best_so_far` may also be
+        a function returning the best result, so it is only built when reported.
+        """
+        if not self.progress_callback:
+            return
+        if callable(best_so_far):
+            best_so_far = best_so_far()
+        # totals of the state-based searches are estimates and can be exceeded
+        percent = min(100.0, 100.0 * self.evaluated / self.total) if self.total else 100.0
+        self.progress_callback(SearchProgress(
+            evaluated=self.evaluated,
+            total=self.total,
+            percent=percent,
+            elapsed=self.elapsed,
+            best_so_far=best_so_far,
+        ))
@@ -0,0 +1,764 @@
+import heapq
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from src.lookup.lookup import products
+from src.util.models import CombinationResult, Product
+from functionality.profiling import run_profiled, worker_profile_dir
+from functionality.search_control import SearchControl
+from functionality.transitions import (
+    EFFECT_BITS,
+    TransitionTable,
+    effects_to_mask,
+    estimate_transitions,
+    mask_to_effects,
+    product_start_mask,
+)
+
+# (best modifier entry, best profit entry, evaluated nodes)
+BestMixResult = Tuple[Optional[CombinationResult], Optional[CombinationResult], int]
+
+
+class SearchStopped(Exception):
+    """Raised inside a search when its SearchControl asks it to stop."""
+
+
+def get_product(product_name: str) -> Product:
+    for product in products:
+        if product.name == product_name:
+            return product
+    raise ValueError(f"Product '{product_name}' not found!")
+
+
+def search_space_size(substance_count: int, combination_size: int) -> int:
+    """Number of ordered combinations of size 1..combination_size."""
+    return sum(substance_count ** size for size in range(1, combination_size + 1))
+
+
+def build_result(
+    table: TransitionTable, product: Product, path: Sequence[int], mask: int
+) -> CombinationResult:
+    """Turn a path of substance indices and its final effect-state into a CombinationResult."""
+    modifier = table.modifier(mask)
+    return CombinationResult(
+        sell_price=Decimal(float(product.base_sell_price) * (1 + modifier)),
+        substance_cost=sum((table.prices[index] for index in path), Decimal("0")),
+        modifier=modifier,
+        substances=[table.names[index] for index in path],
+        effects=mask_to_effects(mask),
+    )
+
+
+class _Incumbent:
+    """Best modifier and best profit seen so far, kept as (path, mask) until the end."""
+
+    def __init__(self, table: TransitionTable, product: Product):
+        self.table = table
+        self.product = product
+        self.base_price = float(product.base_sell_price)
+        self.best_modifier = float("-inf")
+        self.best_profit = float("-inf")
+        self.modifier_entry: Optional[Tuple[Tuple[int, ...], int]] = None
+        self.profit_entry: Optional[Tuple[Tuple[int, ...], int]] = None
+        self.evaluated = 0
+
+    def offer(self, mask: int, cost: float, path: Sequence[int]) -> None:
+        self.evaluated += 1
+        modifier = self.table.modifier(mask)
+        if modifier > self.best_modifier:
+            self.best_modifier = modifier
+            self.modifier_entry = (tuple(path), mask)
+        profit = self.base_price * (1 + modifier) - cost
+        if profit > self.best_profit:
+            self.best_profit = profit
+            self.profit_entry = (tuple(path), mask)
+
+    def merge(self, other: "_Incumbent") -> None:
+        """Take over the other incumbent's entries where they are strictly better."""
+        self.evaluated += other.evaluated
+        if other.best_modifier > self.best_modifier:
+            self.best_modifier, self.modifier_entry = other.best_modifier, other.modifier_entry
+        if other.best_profit > self.best_profit:
+            self.best_profit, self.profit_entry = other.best_profit, other.profit_entry
+
+    def best_profit_result(self) -> Optional[CombinationResult]:
+        if self.profit_entry is None:
+            return None
+        return build_result(self.table, self.product, *self.profit_entry)
+
+    def result(self) -> BestMixResult:
+        best_modifier = None
+        if self.modifier_entry is not None:
+            best_modifier = build_result(self.table, self.product, *self.modifier_entry)
+        return best_modifier, self.best_profit_result(), self.evaluated
+
+
+def _dfs(
+    table: TransitionTable,
+    prices: List[float],
+    mask: int,
+    cost: float,
+    path: List[int],
+    remaining: int,
+    incumbent: _Incumbent,
+    control: Optional[SearchControl],
+    expand: Optional[Callable[[int, float, int], bool]] = None,
+) -> None:
+    """
+    Depth-first enumeration of all extensions of `path` by 1..`remaining` substances.
+    The effect-state and cost are carried along the prefix, so every node costs one
+    transition. `expand(mask, cost, remaining)` can veto descending into a subtree.
+    """
+    for index in range(len(table)):
+        child = table.apply(mask, index)
+        child_cost = cost + prices[index]
+        path.append(index)
+        incumbent.offer(child, child_cost, path)
+        if control and control.step(incumbent.best_profit_result):
+            raise SearchStopped()
+        if remaining > 1 and (expand is None or expand(child, child_cost, remaining - 1)):
+            _dfs(table, prices, child, child_cost, path, remaining - 1, incumbent, control, expand)
+        path.pop()
+
+
+def _run_dfs(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl],
+    make_expand: Optional[Callable[[_Incumbent], Callable[[int, float, int], bool]]] = None,
+) -> BestMixResult:
+    incumbent = _Incumbent(table, get_product(product_name))
+    prices = [float(price) for price in table.prices]
+    if control:
+        control.start(search_space_size(len(table), combination_size))
+    try:
+        _dfs(
+            table, prices, product_start_mask(product_name), 0.0, [], combination_size,
+            incumbent, control, make_expand(incumbent) if make_expand else None
+        )
+    except SearchStopped:
+        pass
+    if control:
+        control.report(incumbent.best_profit_result)
+    return incumbent.result()
+
+
+def prefix_dfs_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None
+) -> BestMixResult:
+    """
+    Best modifier and best profit over all combinations of size 1..`combination_size`,
+    enumerated depth-first with the effect-state carried along each prefix.
+    """
+    return _run_dfs(table, product_name, combination_size, control)
+
+
+def branch_and_bound_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None
+) -> BestMixResult:
+    """
+    Like `prefix_dfs_best_mix`, but skips subtrees that cannot beat the incumbent.
+
+    A subtree with `remaining` more substances can at most raise the modifier by
+    `remaining * max_modifier_gain` and can hold at most `remaining` more effects, so its
+    modifier is bounded by the better of both limits. Every extension costs at least the
+    cheapest substance more.
+    """
+    modifier_bound = table.modifier_bound()
+    min_price = float(min(table.prices, default=0))
+
+    def make_expand(incumbent: _Incumbent) -> Callable[[int, float, int], bool]:
+        def expand(mask: int, cost: float, remaining: int) -> bool:
+            upper_modifier = modifier_bound(mask, remaining)
+            if upper_modifier > incumbent.best_modifier:
+                return True
+            upper_profit = incumbent.base_price * (1 + upper_modifier) - (cost + min_price)
+            return upper_profit > incumbent.best_profit
+        return expand
+
+    return _run_dfs(table, product_name, combination_size, control, make_expand)
+
+
+def state_dp_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None
+) -> BestMixResult:
+    """
+    Layered dynamic programming over distinct effect-states.
+
+    Layer k keeps, for every effect-state reachable with k substances, only the cheapest
+    path. Transitions depend on the state alone, so the cheapest path per state is also
+    the most profitable one and the result is exact. Work is proportional to the number
+    of distinct states instead of the number of combinations. The returned work count
+    is the number of transitions.
+    """
+    incumbent = _Incumbent(table, get_product(product_name))
+    prices = [float(price) for price in table.prices]
+    layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {product_start_mask(product_name): (0.0, ())}
+    transitions = 0
+    if control:
+        control.start(estimate_transitions(table, product_name, combination_size))
+
+    try:
+        for _ in range(combination_size):
+            next_layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+            for mask, (cost, path) in layer.items():
+                for index in range(len(table)):
+                    transitions += 1
+                    child = table.apply(mask, index)
+                    child_cost = cost + prices[index]
+                    known = next_layer.get(child)
+                    if known is None or child_cost < known[0]:
+                        next_layer[child] = (child_cost, path + (index,))
+                    if control and control.step(incumbent.best_profit_result):
+                        raise SearchStopped()
+            for mask, (cost, path) in next_layer.items():
+                incumbent.offer(mask, cost, path)
+            layer = next_layer
+    except SearchStopped:
+        pass
+
+    if control:
+        control.report(incumbent.best_profit_result)
+    best_modifier, best_profit, _ = incumbent.result()
+    return best_modifier, best_profit, transitions
+
+
+# Partial-order reduction modes for the canonical DFS
+REDUCTIONS = ("static", "per_state")
+
+
+def _canonical_dfs(
+    table: TransitionTable,
+    prices: List[float],
+    previous_mask: int,
+    mask: int,
+    cost: float,
+    path: List[int],
+    remaining: int,
+    incumbent: _Incumbent,
+    control: Optional[SearchControl],
+    reduction: str,
+    static_pairs: Set[Tuple[int, int]],
+) -> None:
+    """
+    Like `_dfs`, but a substance with a lower index than the last one is skipped if the
+    two commute (on every state, or on `previous_mask`, the state before the last one).
+    Swapping such a pair gives the same effect-state and cost, and repeated swapping ends
+    at a sequence without such a pair, so every reachable (effect-state, substances)
+    result is still visited once in canonical order.
+    """
+    last = path[-1] if path else None
+    for index in range(len(table)):
+        child = table.apply(mask, index)
+        if last is not None and index < last:
+            if reduction == "static":
+                if (index, last) in static_pairs:
+                    continue
+            elif table.apply(table.apply(previous_mask, index), last) == child:
+                continue
+        child_cost = cost + prices[index]
+        path.append(index)
+        incumbent.offer(child, child_cost, path)
+        if control and control.step(incumbent.best_profit_result):
+            raise SearchStopped()
+        if remaining > 1:
+            _canonical_dfs(
+                table, prices, mask, child, child_cost, path, remaining - 1,
+                incumbent, control, reduction, static_pairs
+            )
+        path.pop()
+
+
+def run_canonical_dfs(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    incumbent: _Incumbent,
+    control: Optional[SearchControl] = None,
+    reduction: str = "per_state",
+) -> None:
+    """Offer every canonical combination of size 1..`combination_size` to `incumbent`."""
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Invalid reduction: {reduction}")
+    static_pairs = {
+        (a, b) for a in range(len(table)) for b in range(a + 1, len(table)) if table.commutes(a, b)
+    }
+    prices = [float(price) for price in table.prices]
+    start = product_start_mask(product_name)
+    _canonical_dfs(
+        table, prices, start, start, 0.0, [], combination_size, incumbent, control, reduction, static_pairs
+    )
+
+
+def canonical_dfs_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None,
+    reduction: str = "per_state"
+) -> BestMixResult:
+    """
+    Prefix DFS that explores only one canonical order of commuting substances.
+
+    With reduction="static" only pairs that commute on every effect-state are reordered,
+    with "per_state" every pair that commutes on the state where it is added. The best
+    modifier and best profit are the same as for `prefix_dfs_best_mix`.
+    """
+    incumbent = _Incumbent(table, get_product(product_name))
+    if control:
+        control.start(search_space_size(len(table), combination_size))
+    try:
+        run_canonical_dfs(table, product_name, combination_size, incumbent, control, reduction)
+    except SearchStopped:
+        pass
+    if control:
+        control.report(incumbent.best_profit_result)
+    return incumbent.result()
+
+
+# Relative score noise of the random restarts of the beam search
+BEAM_RESTART_NOISE = 0.2
+
+
+def beam_search_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None,
+    beam_width: int = 200,
+    restarts: int = 0,
+    seed: Optional[int] = None
+) -> BestMixResult:
+    """
+    Approximate best mix: layered search over effect-states that keeps only the
+    `beam_width` most profitable states (cheapest path each) per layer.
+
+    Work is combination_size * beam_width * substances transitions per run. Each of the
+    `restarts` extra runs ranks the states by profit perturbed with random noise of up to
+    BEAM_RESTART_NOISE, which lets it keep states the first run dropped. Every state seen
+    is offered to the incumbent, so the result is the best combination found, not
+    necessarily the optimum.
+    """
+    if beam_width < 1:
+        raise ValueError("beam_width must be at least 1.")
+    incumbent = _Incumbent(table, get_product(product_name))
+    prices = [float(price) for price in table.prices]
+    rng = random.Random(seed)
+    if control:
+        control.start(combination_size * beam_width * len(table) * (restarts + 1))
+
+    try:
+        for run in range(restarts + 1):
+            beam: Dict[int, Tuple[float, Tuple[int, ...]]] = {product_start_mask(product_name): (0.0, ())}
+            for _ in range(combination_size):
+                candidates: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+                for mask, (cost, path) in beam.items():
+                    for index in range(len(table)):
+                        child = table.apply(mask, index)
+                        child_cost = cost + prices[index]
+                        known = candidates.get(child)
+                        if known is None or child_cost < known[0]:
+                            candidates[child] = (child_cost, path + (index,))
+                        if control and control.step(incumbent.best_profit_result):
+                            raise SearchStopped()
+
+                scores = {}
+                for mask, (cost, path) in candidates.items():
+                    incumbent.offer(mask, cost, path)
+                    score = incumbent.base_price * (1 + table.modifier(mask)) - cost
+                    if run:
+                        score *= 1 + rng.uniform(-BEAM_RESTART_NOISE, BEAM_RESTART_NOISE)
+                    scores[mask] = score
+                kept = heapq.nlargest(beam_width, candidates, key=scores.__getitem__)
+                beam = {mask: candidates[mask] for mask in kept}
+    except SearchStopped:
+        pass
+
+    if control:
+        control.report(incumbent.best_profit_result)
+    return incumbent.result()
+
+
+def _dfs_subtree(args: tuple) -> Tuple[Optional[tuple], float, Optional[tuple], float, int, bool]:
+    """Worker for `parallel_best_mix`: search all combinations starting with one substance."""
+    substance_names, product_name, combination_size, first, deadline = args
+    table = TransitionTable(substance_names)
+    incumbent = _Incumbent(table, get_product(product_name))
+    prices = [float(price) for price in table.prices]
+    control = SearchControl(deadline=deadline) if deadline else None
+    if control:
+        control.start(search_space_size(len(table), combination_size - 1) + 1)
+
+    mask = table.apply(product_start_mask(product_name), first)
+    incumbent.offer(mask, prices[first], [first])
+    try:
+        if combination_size > 1:
+            _dfs(table, prices, mask, prices[first], [first], combination_size - 1, incumbent, control)
+    except SearchStopped:
+        pass
+    interrupted = bool(control and control.interrupted)
+    return (
+        incumbent.modifier_entry, incumbent.best_modifier,
+        incumbent.profit_entry, incumbent.best_profit,
+        incumbent.evaluated, interrupted,
+    )
+
+
+def parallel_best_mix(
+    table: TransitionTable,
+    product_name: str,
+    combination_size: int,
+    control: Optional[SearchControl] = None,
+    workers: Optional[int] = None
+) -> BestMixResult:
+    """
+    Prefix DFS split by the first substance across a process pool.
+
+    Workers only receive the deadline of `control`; cancellation is checked between
+    finished subtrees and drops the remaining ones.
+    """
+    incumbent = _Incumbent(table, get_product(product_name))
+    deadline = None
+    if control:
+        control.start(search_space_size(len(table), combination_size))
+        deadline = control.stop_at
+
+    tasks = [(table.names, product_name, combination_size, first, deadline) for first in range(len(table))]
+    profile_dir = worker_profile_dir()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        if profile_dir:
+            futures = [executor.submit(run_profiled, profile_dir, _dfs_subtree, task) for task in tasks]
+        else:
+            futures = [executor.submit(_dfs_subtree, task) for task in tasks]
+        for future in futures:
+            modifier_entry, best_modifier, profit_entry, best_profit, evaluated, interrupted = future.result()
+            worker = _Incumbent(table, incumbent.product)
+            worker.modifier_entry, worker.best_modifier = modifier_entry, best_modifier
+            worker.profit_entry, worker.best_profit = profit_entry, best_profit
+            worker.evaluated = evaluated
+            incumbent.merge(worker)
+
+            if control:
+                control.evaluated = incumbent.evaluated
+                if interrupted:
+                    control.interrupted, control.reason = True, "time budget exceeded"
+                elif control.cancel_token is not None and control.cancel_token.cancelled:
+                    control.interrupted, control.reason = True, "cancelled"
+                if control.interrupted:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+                control.report(incumbent.best_profit_result)
+
+    if control:
+        control.report(incumbent.best_profit_result)
+    return incumbent.result()
+
+
+def state_bfs_min_substances(
+    table: TransitionTable,
+    product_name: str,
+    desired_effects: List[str],
+    not_desired_effects: List[str],
+    max_size: int,
+    max_results: int = 10,
+    control: Optional[SearchControl] = None
+) -> Tuple[int, List[CombinationResult], int]:
+    """
+    Breadth-first search over distinct effect-states for the smallest combination that
+    has all `desired_effects` and none of `not_desired_effects`.
+
+    A state already reached with fewer substances is not expanded again, so each state is
+    expanded at most once. Returns one (cheapest) combination per matching effect-state.
+
+    Returns:
+        Tuple[int, List[CombinationResult], int]: (found_size, results, evaluated nodes);
+        (0, [], evaluated) if nothing was found.
+    """
+    product = get_product(product_name)
+    try:
+        desired_mask = effects_to_mask(desired_effects)
+    except ValueError:
+        return 0, [], 0  # an unknown effect can never be active
+    forbidden_mask = effects_to_mask(e for e in not_desired_effects if e in EFFECT_BITS)
+
+    prices = [float(price) for price in table.prices]
+    start = product_start_mask(product_name)
+    seen = {start}
+    layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {start: (0.0, ())}
+    evaluated = 0
+    if control:
+        control.start(estimate_transitions(table, product_name, max_size))
+
+    for size in range(1, max_size + 1):
+        next_layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+        for mask, (cost, path) in layer.items():
+            for index in range(len(table)):
+                child = table.apply(mask, index)
+                evaluated += 1
+                if child in seen and child not in next_layer:
+                    continue
+                child_cost = cost + prices[index]
+                known = next_layer.get(child)
+                if known is None or child_cost < known[0]:
+                    next_layer[child] = (child_cost, path + (index,))
+                if control and control.step():
+                    control.report()
+                    return 0, [], evaluated
+
+        matches = [
+            (cost, path, mask) for mask, (cost, path) in next_layer.items()
+            if mask & desired_mask == desired_mask and not mask & forbidden_mask
+        ]
+        if matches:
+            matches.sort(key=lambda match: (match[0], match[1]))
+            if control:
+                control.report()
+            return size, [build_result(table, product, path, mask) for _, path, mask in matches[:max_results]], evaluated
+
+        seen.update(next_layer)
+        layer = next_layer
+
+    if control:
+        control.report()
+    return 0, [], evaluated
+
+
+def multi_state_bfs_min_substances(
+    table: TransitionTable,
+    product_name: str,
+    queries: Sequence[Tuple[List[str], List[str]]],
+    max_size: int,
+    max_results: int = 10,
+    control: Optional[SearchControl] = None
+) -> Tuple[List[Tuple[int, List[CombinationResult]]], int]:
+    """
+    `state_bfs_min_substances` for many (desired effects, not desired effects) queries on
+    one product in a single traversal.
+
+    The effect-states are expanded once, layer by layer, and every new layer is checked
+    against the queries that are still pending; a query retires with the first layer
+    that satisfies it. The traversal ends as soon as all queries are answered, so it
+    costs as much as the hardest query alone instead of the sum over all queries.
+
+    Returns:
+        Tuple[List[Tuple[int, List[CombinationResult]]], int]: (found_size, results) per
+        query in the order of `queries`, (0, []) for queries without an answer up to
+        `max_size`, and the evaluated nodes.
+    """
+    product = get_product(product_name)
+    answers: List[Tuple[int, List[CombinationResult]]] = [(0, [])] * len(queries)
+    # query number -> (desired mask, forbidden mask)
+    pending: Dict[int, Tuple[int, int]] = {}
+    for number, (desired_effects, not_desired_effects) in enumerate(queries):
+        try:
+            desired_mask = effects_to_mask(desired_effects)
+        except ValueError:
+            continue  # an unknown effect can never be active
+        pending[number] = (desired_mask, effects_to_mask(e for e in not_desired_effects if e in EFFECT_BITS))
+
+    prices = [float(price) for price in table.prices]
+    start = product_start_mask(product_name)
+    seen = {start}
+    layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {start: (0.0, ())}
+    evaluated = 0
+    if control:
+        control.start(estimate_transitions(table, product_name, max_size))
+
+    try:
+        for size in range(1, max_size + 1):
+            if not pending:
+                break
+            next_layer: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+            for mask, (cost, path) in layer.items():
+                for index in range(len(table)):
+                    child = table.apply(mask, index)
+                    evaluated += 1
+                    if child in seen and child not in next_layer:
+                        continue
+                    child_cost = cost + prices[index]
+                    known = next_layer.get(child)
+                    if known is None or child_cost < known[0]:
+                        next_layer[child] = (child_cost, path + (index,))
+                    if control and control.step():
+                        raise SearchStopped()
+
+            by_effect = _states_by_effect(next_layer)
+            all_states = list(next_layer)
+            for number, (desired_mask, forbidden_mask) in list(pending.items()):
+                matches = [
+                    (next_layer[mask][0], next_layer[mask][1], mask)
+                    for mask in _candidates(by_effect, all_states, desired_mask)
+                    if mask & desired_mask == desired_mask and not mask & forbidden_mask
+                ]
+                if matches:
+                    matches.sort(key=lambda match: (match[0], match[1]))
+                    answers[number] = (
+                        size, [build_result(table, product, path, mask) for _, path, mask in matches[:max_results]]
+                    )
+                    del pending[number]
+
+            seen.update(next_layer)
+            layer = next_layer
+    except SearchStopped:
+        pass
+
+    if control:
+        control.report()
+    return answers, evaluated
+
+
+def meet_in_middle_min_substances(
+    table: TransitionTable,
+    product_name: str,
+    desired_effects: List[str],
+    not_desired_effects: List[str],
+    max_size: int,
+    max_results: int = 10,
+    control: Optional[SearchControl] = None,
+    min_size: int = 1
+) -> Tuple[int, List[CombinationResult], int]:
+    """
+    Bidirectional search for the smallest combination that has all `desired_effects` and
+    none of `not_desired_effects`.
+
+    The forward side keeps the distinct effect-states reachable with k substances (cheapest
+    path each), the backward side the cubes of states (must have / must not have) from which
+    j more substances satisfy the query (cheapest suffix each, see
+    `TransitionTable.preimage`). A combination of size n is found by joining the forward
+    layer of ceil(n/2) with the backward layer of floor(n/2), so only two half-depth layers
+    are held in memory.
+
+    The found size and the cheapest combination are exact. The other results are the
+    cheapest combination per final effect-state among the joined paths, which can miss
+    states that `state_bfs_min_substances` would list.
+
+    Returns:
+        Tuple[int, List[CombinationResult], int]: (found_size, results, evaluated transitions);
+        (0, [], evaluated) if nothing was found up to `max_size`.
+    """
+    product = get_product(product_name)
+    try:
+        desired_mask = effects_to_mask(desired_effects)
+    except ValueError:
+        return 0, [], 0  # an unknown effect can never be active
+    forbidden_mask = effects_to_mask(e for e in not_desired_effects if e in EFFECT_BITS)
+
+    prices = [float(price) for price in table.prices]
+    forward: Dict[int, Tuple[float, Tuple[int, ...]]] = {product_start_mask(product_name): (0.0, ())}
+    backward: Dict[Tuple[int, int], Tuple[float, Tuple[int, ...]]] = {(desired_mask, forbidden_mask): (0.0, ())}
+    forward_depth = backward_depth = 0
+    evaluated = 0
+    if control:
+        control.start(2 * estimate_transitions(table, product_name, (max_size + 1) // 2))
+
+    try:
+        for size in range(1, max_size + 1):
+            if forward_depth < (size + 1) // 2:
+                next_forward: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+                for mask, (cost, path) in forward.items():
+                    for index in range(len(table)):
+                        evaluated += 1
+                        child = table.apply(mask, index)
+                        child_cost = cost + prices[index]
+                        known = next_forward.get(child)
+                        if known is None or child_cost < known[0]:
+                            next_forward[child] = (child_cost, path + (index,))
+                        if control and control.step():
+                            raise SearchStopped()
+                forward, forward_depth = next_forward, forward_depth + 1
+            else:
+                next_backward: Dict[Tuple[int, int], Tuple[float, Tuple[int, ...]]] = {}
+                for (must, must_not), (cost, suffix) in backward.items():
+                    for index in range(len(table)):
+                        evaluated += 1
+                        for cube in table.preimage(index, must, must_not):
+                            cube_cost = cost + prices[index]
+                            known = next_backward.get(cube)
+                            if known is None or cube_cost < known[0]:
+                                next_backward[cube] = (cube_cost, (index,) + suffix)
+                        if control and control.step():
+                            raise SearchStopped()
+                backward, backward_depth = next_backward, backward_depth + 1
+
+            if size < min_size:
+                continue
+            matches = _join_layers(table, forward, backward)
+            if matches:
+                matches.sort(key=lambda match: (match[0], match[1]))
+                if control:
+                    control.report()
+                results = [build_result(table, product, path, mask) for _, path, mask in matches[:max_results]]
+                return size, results, evaluated
+    except SearchStopped:
+        pass
+
+    if control:
+        control.report()
+    return 0, [], evaluated
+
+
+def _join_layers(
+    table: TransitionTable,
+    forward: Dict[int, Tuple[float, Tuple[int, ...]]],
+    backward: Dict[Tuple[int, int], Tuple[float, Tuple[int, ...]]],
+) -> List[Tuple[float, Tuple[int, ...], int]]:
+    """
+    Forward states inside a backward cube, as (cost, path, final mask) with the cheapest
+    path per final effect-state.
+    """
+    # Forward states by effect, to only test the states that have the rarest required effect
+    by_effect = _states_by_effect(forward)
+    all_states = list(forward)
+
+    best: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+    for (must, must_not), (suffix_cost, suffix) in backward.items():
+        for mask in _candidates(by_effect, all_states, must):
+            if mask & must != must or mask & must_not:
+                continue
+            cost, path = forward[mask]
+            final = mask
+            for index in suffix:
+                final = table.apply(final, index)
+            total = cost + suffix_cost
+            known = best.get(final)
+            if known is None or total < known[0]:
+                best[final] = (total, path + suffix)
+    return [(cost, path, mask) for mask, (cost, path) in best.items()]
+
+
+def _states_by_effect(states) -> Dict[int, List[int]]:
+    """Effect-states by each of their effect bits."""
+    by_effect: Dict[int, List[int]] = {}
+    for mask in states:
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            by_effect.setdefault(bit, []).append(mask)
+            remaining ^= bit
+    return by_effect
+
+
+def _candidates(by_effect: Dict[int, List[int]], all_states: List[int], must: int) -> List[int]:
+    """The states having the rarest effect of `must` (all states if `must` is empty)."""
+    candidates = all_states
+    remaining = must
+    while remaining:
+        bit = remaining & -remaining
+        postings = by_effect.get(bit, [])
+        if len(postings) < len(candidates):
+            candidates = postings
+        remaining ^= bit
+    return candidates
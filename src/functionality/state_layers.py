@@ -0,0 +1,120 @@
+import json
+import os
+from typing import Dict, Tuple
+
+from src.datenbank.connection_pool import get_id_map
+from src.datenbank.get_db_data import get_cheapest_states
+from src.datenbank.initialize_db import effect_bit
+from src.util.models import CombinationResult
+from functionality.solvers import build_result, get_product
+from functionality.transitions import EFFECT_BITS, TransitionTable, product_start_mask
+
+# Effect-state -> (cost, cheapest path of substance indices), like in state_dp_best_mix
+Layer = Dict[int, Tuple[float, Tuple[int, ...]]]
+
+SNAPSHOT_VERSION = 1
+
+
+def start_layer(product_name: str) -> Layer:
+    """Layer of size 0: the product's own effects, no substances."""
+    return {product_start_mask(product_name): (0.0, ())}
+
+
+def expand_layer(table: TransitionTable, layer: Layer) -> Layer:
+    """
+    Add one more substance to every state of `layer`, keeping the cheapest path per
+    resulting state. Costs one transition per state and substance.
+    """
+    prices = [float(price) for price in table.prices]
+    next_layer: Layer = {}
+    for mask, (cost, path) in layer.items():
+        for index in range(len(table)):
+            child = table.apply(mask, index)
+            child_cost = cost + prices[index]
+            known = next_layer.get(child)
+            if known is None or child_cost < known[0]:
+                next_layer[child] = (child_cost, path + (index,))
+    return next_layer
+
+
+def layer_results(table: TransitionTable, product_name: str, layer: Layer) -> Dict[str, CombinationResult]:
+    """One CombinationResult per state, keyed like the results of get_best_mix."""
+    product = get_product(product_name)
+    results = {}
+    for mask, (_, path) in layer.items():
+        result = build_result(table, product, path, mask)
+        results["_".join(result.substances)] = result
+    return results
+
+
+def layer_from_db(
+    table: TransitionTable, product_name: str, combination_size: int, max_level: int, db_path: str
+) -> Layer:
+    """
+    Cheapest stored combination per distinct effect-state of size `combination_size`.
+    Only complete if the database holds every state of that size (all combinations,
+    or a layer stored by extension).
+    """
+    index_of = {name: index for index, name in enumerate(table.names)}
+    # effect_mask in the database uses effect ids, the transitions use lookup order
+    db_bits = {effect_bit(effect_id): EFFECT_BITS[name] for name, effect_id in get_id_map(db_path, "effects").items()}
+    prices = [float(price) for price in table.prices]
+
+    layer: Layer = {}
+    for db_mask, names in get_cheapest_states(product_name, combination_size, max_level, db_path).items():
+        if any(name not in index_of for name in names):
+            continue  # substance not in this table
+        mask = 0
+        for db_bit, bit in db_bits.items():
+            if db_mask & db_bit:
+                mask |= bit
+        path = tuple(index_of[name] for name in names)
+        layer[mask] = (sum(prices[index] for index in path), path)
+    return layer
+
+
+def save_layer_snapshot(
+    path: str, table: TransitionTable, product_name: str, max_level: int, combination_size: int, layer: Layer
+) -> None:
+    """Write a layer to a JSON snapshot file (written to a temporary file, then swapped in)."""
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "product": product_name,
+        "max_level": max_level,
+        "combination_size": combination_size,
+        "substances": table.names,
+        "states": [[mask, list(path)] for mask, (_, path) in layer.items()],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(snapshot, file)
+    os.replace(tmp_path, path)
+
+
+def load_layer_snapshot(
+    path: str, table: TransitionTable, product_name: str, max_level: int, combination_size: int
+) -> Layer:
+    """Read a layer written by save_layer_snapshot; raises ValueError if it belongs to another search."""
+    with open(path) as file:
+        snapshot = json.load(file)
+
+    expected = {
+        "version": SNAPSHOT_VERSION,
+        "product": product_name,
+        "max_level": max_level,
+        "combination_size": combination_size,
+        "substances": table.names,
+    }
+    for key, value in expected.items():
+        if snapshot.get(key) != value:
+            raise ValueError(f"Snapshot '{path}' does not match ({key}: {snapshot.get(key)!r} != {value!r})")
+
+    prices = [float(price) for price in table.prices]
+    return {
+        mask: (sum(prices[index] for index in path), tuple(path))
+        for mask, path in snapshot["states"]
+    }
+
+
+def snapshot_path(snapshot_dir: str, product_name: str, max_level: int, combination_size: int) -> str:
+    return os.path.join(snapshot_dir, f"states_{product_name}_{max_level}_{combination_size}.json")
@@ -0,0 +1,293 @@
+import atexit
+import os
+import pickle
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from src.lookup.lookup import DATA_HASH
+from src.util.models import MemoStats
+
+# Entries per memo table (transitions, modifiers); about 200 bytes each
+DEFAULT_MAX_ENTRIES = int(os.environ.get("TRANSITION_MEMO_SIZE", 200_000))
+# Bump when the layout of the persistence file changes
+MEMO_FILE_FORMAT = 2
+
+
+def _entry_size(key: Hashable, value) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class LRUMemo:
+    """
+    Bounded memo with approximate least-recently-used eviction.
+
+    Entries live in two generations of at most `max_entries // 2` each. New and reused
+    entries go to the current generation; when it is full, the previous generation is
+    dropped and the current one takes its place. So an entry survives as long as it is
+    used at least once per generation, and a hit costs a plain dict lookup (an exact
+    LRU would reorder on every hit, which costs more than most transitions it saves).
+
+    All operations are single dict calls on the current generation objects, so threads
+    can share a memo without a lock; the counters may then lose an increment now and then.
+    The bytes held by the keys and values are counted per generation as entries come
+    and go, so `stats` does not have to walk the entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._current: Dict[Hashable, object] = {}
+        self._previous: Dict[Hashable, object] = {}
+        self._current_bytes = 0
+        self._previous_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable):
+        """Cached value of `key` (marked as recently used) or None."""
+        value = self._current.get(key)
+        if value is None:
+            value = self._previous.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._previous_bytes -= _entry_size(key, value)
+            self.put(key, value)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        current = self._current
+        if len(current) >= max(self.max_entries // 2, 1):
+            self.evictions += len(self._previous)
+            self._previous, self._previous_bytes = current, self._current_bytes
+            current = self._current = {}
+            self._current_bytes = 0
+        current[key] = value
+        self._current_bytes += _entry_size(key, value)
+
+    def resize(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        for key, value in self.items():
+            self.put(key, value)
+
+    def items(self) -> List[Tuple[Hashable, object]]:
+        """All entries, least recently used first."""
+        previous = [(key, value) for key, value in list(self._previous.items()) if key not in self._current]
+        return previous + list(self._current.items())
+
+    def clear(self) -> None:
+        self._current = {}
+        self._previous = {}
+        self._current_bytes = self._previous_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def stats(self) -> MemoStats:
+        """Counters and size in constant time, e.g. for a health check."""
+        return MemoStats(
+            entries=len(self),
+            max_entries=self.max_entries,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            memory_bytes=(
+                sys.getsizeof(self._current) + sys.getsizeof(self._previous)
+                + self._current_bytes + self._previous_bytes
+            ),
+        )
+
+
+class FrozenStates:
+    """
+    Read-only successor rows and modifiers of a fixed set of effect-states, in flat arrays:
+    the sorted state masks, one row of successor masks per state and the modifiers.
+
+    A lookup is a binary search that only reads the array buffers. Built before a server
+    forks its workers, the arrays therefore stay shared between them, unlike the dicts
+    of an LRUMemo, whose entries and reference counts every lookup writes to.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, Sequence[int]]], modifiers: Iterable[Tuple[int, float]]):
+        rows = dict(rows)
+        modifiers = dict(modifiers)
+        self.row_masks = array("Q", sorted(rows))
+        self.stride = len(next(iter(rows.values()))) if rows else 0
+        self.rows = array("Q")
+        for mask in self.row_masks:
+            self.rows.extend(rows[mask])
+        self.modifier_masks = array("Q", sorted(modifiers))
+        self.modifiers = array("d", (modifiers[mask] for mask in self.modifier_masks))
+
+    def __len__(self) -> int:
+        return len(self.modifier_masks)
+
+    @staticmethod
+    def _find(masks: array, mask: int) -> int:
+        index = bisect_left(masks, mask)
+        return index if index < len(masks) and masks[index] == mask else -1
+
+    def row(self, mask: int) -> Optional[array]:
+        index = self._find(self.row_masks, mask)
+        if index < 0:
+            return None
+        return self.rows[index * self.stride:(index + 1) * self.stride]
+
+    def modifier(self, mask: int) -> Optional[float]:
+        index = self._find(self.modifier_masks, mask)
+        return None if index < 0 else self.modifiers[index]
+
+    def row_items(self) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(mask, tuple(self.row(mask))) for mask in self.row_masks]
+
+    def modifier_items(self) -> List[Tuple[int, float]]:
+        return list(zip(self.modifier_masks, self.modifiers))
+
+
+class TransitionMemo:
+    """
+    Process-wide memo of effect-state transitions and modifier sums.
+
+    `transitions` holds the state after adding a substance and `modifiers` the total
+    modifier of a state, both keyed by the bitmask of the state (in lookup effect order)
+    and used by TransitionTable; its transition entries hold the successor of every
+    substance at once, indexed by substance id. `name_transitions` and `name_modifiers`
+    hold the same for `_calculate_modificator`, keyed by (tuple of effect names in
+    activation order, substance name) and by that tuple. The two key kinds live in
+    separate tables so that neither evicts the other's entries. Nothing here depends on
+    prices or levels, so every search and every request shares the same entries.
+
+    `freeze` moves the bitmask entries into `frozen` (FrozenStates), which TransitionTable
+    consults on a miss before computing a transition or modifier.
+
+    With a `path`, the memo is loaded from that file (if it was written for the same
+    lookup data) and written back at exit.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, path: Optional[str] = None):
+        self.transitions = LRUMemo(max_entries)
+        self.modifiers = LRUMemo(max_entries)
+        self.name_transitions = LRUMemo(max_entries)
+        self.name_modifiers = LRUMemo(max_entries)
+        self.frozen: Optional[FrozenStates] = None
+        self.path: Optional[str] = None
+        self._lock = threading.Lock()
+        if path:
+            self.configure(path=path)
+
+    def configure(self, max_entries: Optional[int] = None, path: Optional[str] = None) -> None:
+        """Change the size limit and/or set the persistence file (loaded now, saved at exit)."""
+        if max_entries is not None:
+            for table in self.tables().values():
+                table.resize(max_entries)
+        if path and path != self.path:
+            first = self.path is None
+            self.path = path
+            if os.path.exists(path):
+                self.load(path)
+            if first:
+                atexit.register(self._save_at_exit)
+
+    def tables(self) -> Dict[str, LRUMemo]:
+        return {
+            "transitions": self.transitions,
+            "modifiers": self.modifiers,
+            "name_transitions": self.name_transitions,
+            "name_modifiers": self.name_modifiers,
+        }
+
+    def stats(self) -> Dict[str, MemoStats]:
+        return {name: table.stats() for name, table in self.tables().items()}
+
+    def clear(self) -> None:
+        for table in self.tables().values():
+            table.clear()
+        self.frozen = None
+
+    def freeze(self) -> int:
+        """
+        Move the bitmask transitions and modifiers (plus earlier frozen ones) into
+        read-only flat arrays and empty their LRU tables, e.g. before a server forks.
+
+        Returns:
+            int: Number of frozen states.
+        """
+        self.frozen = FrozenStates(self._row_items(), self._modifier_items())
+        self.transitions.clear()
+        self.modifiers.clear()
+        return len(self.frozen)
+
+    def frozen_row(self, mask: int) -> Optional[Sequence[int]]:
+        frozen = self.frozen
+        return frozen.row(mask) if frozen is not None else None
+
+    def frozen_modifier(self, mask: int) -> Optional[float]:
+        frozen = self.frozen
+        return frozen.modifier(mask) if frozen is not None else None
+
+    def _row_items(self) -> List[Tuple[int, Tuple[int, ...]]]:
+        frozen = self.frozen.row_items() if self.frozen is not None else []
+        return frozen + [(mask, tuple(row)) for mask, row in self.transitions.items()]
+
+    def _modifier_items(self) -> List[Tuple[int, float]]:
+        frozen = self.frozen.modifier_items() if self.frozen is not None else []
+        return frozen + self.modifiers.items()
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write all tables, frozen entries included, to `path` (default: the configured file) via a temporary file."""
+        path = path or self.path
+        if not path:
+            raise ValueError("No memo file configured")
+        entries = {name: table.items() for name, table in self.tables().items()}
+        entries["transitions"] = self._row_items()
+        entries["modifiers"] = self._modifier_items()
+        payload = (MEMO_FILE_FORMAT, DATA_HASH, entries)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, "wb") as file:
+                pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Add the entries of a memo file. Returns False (and loads nothing) if the file is
+        unreadable or was written for other lookup data.
+        """
+        path = path or self.path
+        try:
+            with open(path, "rb") as file:
+                file_format, data_hash, entries = pickle.load(file)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return False
+        if file_format != MEMO_FILE_FORMAT or data_hash != DATA_HASH:
+            return False
+        tables = self.tables()
+        for name, items in entries.items():
+            table = tables.get(name)
+            if table is not None:
+                for key, value in items:
+                    table.put(key, value)
+        return True
+
+    def _save_at_exit(self) -> None:
+        try:
+            self.save()
+        except OSError:
+            pass
+
+
+# Shared by all TransitionTables and `_calculate_modificator` of this process
+memo = TransitionMemo(path=os.environ.get("TRANSITION_MEMO_PATH"))
+
+
+def format_memo_stats(stats: Dict[str, MemoStats]) -> str:
+    return ", ".join(
+        f"{name}: {entry.entries:,}/{entry.max_entries:,} entries, hit rate {entry.hit_rate:.1%}, "
+        f"{entry.memory_bytes / 1e6:.1f} MB"
+        for name, entry in stats.items()
+    )
@@ -0,0 +1,319 @@
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.lookup.lookup import substances, effects, products, substance_ids, substance_transitions
+from functionality.transition_memo import TransitionMemo, memo
+
+# Effect-states are represented as integer bitmasks, one bit per effect
+# in the order of the `effects` list from the lookup data.
+EFFECT_NAMES: List[str] = [effect.name for effect in effects]
+EFFECT_BITS: Dict[str, int] = {name: 1 << index for index, name in enumerate(EFFECT_NAMES)}
+EFFECT_MODIFICATORS: List[float] = [effect.modificator for effect in effects]
+
+# Result bit and (effect bit, replacement bit) pairs of every substance, by substance id
+_RESULT_BITS: List[int] = [1 << result_id for result_id, _ in substance_transitions]
+_REPLACEMENT_BITS: List[Tuple[Tuple[int, int], ...]] = [
+    tuple((1 << effect_id, 1 << replacement_id) for effect_id, replacement_id in replacements)
+    for _, replacements in substance_transitions
+]
+
+
+def _replaced_by() -> List[List[Tuple[int, int]]]:
+    """Per effect id: (substance id, replacement bit) of every substance that replaces the effect."""
+    replaced_by: List[List[Tuple[int, int]]] = [[] for _ in effects]
+    for substance_id, (_, replacements) in enumerate(substance_transitions):
+        for effect_id, replacement_id in replacements:
+            replaced_by[effect_id].append((substance_id, 1 << replacement_id))
+    return replaced_by
+
+
+_REPLACED_BY = _replaced_by()
+
+# Tables built by TransitionTable.shared, keyed by their substance names
+_shared_tables: Dict[Tuple[str, ...], "TransitionTable"] = {}
+
+# States are sampled exactly up to this depth and extrapolated beyond it
+_SAMPLE_DEPTH = 3
+
+# (substance names, product) -> exact state counts of layers 0.._SAMPLE_DEPTH
+_sampled_layer_sizes: Dict[Tuple[Tuple[str, ...], str], List[int]] = {}
+
+
+def effects_to_mask(effect_names: Iterable[str]) -> int:
+    """Convert effect names to an effect-state bitmask."""
+    mask = 0
+    for name in effect_names:
+        bit = EFFECT_BITS.get(name)
+        if bit is None:
+            raise ValueError(f"Effect '{name}' not found!")
+        mask |= bit
+    return mask
+
+
+def mask_to_effects(mask: int) -> List[str]:
+    """Convert an effect-state bitmask back to effect names (in lookup order)."""
+    return [name for index, name in enumerate(EFFECT_NAMES) if mask >> index & 1]
+
+
+def _bits(mask: int) -> Iterator[int]:
+    """Single-bit masks of all bits set in `mask`."""
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+def product_start_mask(product_name: str) -> int:
+    """Effect-state of the product before any substance is added."""
+    for product in products:
+        if product.name == product_name:
+            return effects_to_mask(product.effects)
+    raise ValueError(f"Product '{product_name}' not found!")
+
+
+def _successor_row(mask: int) -> Tuple[int, ...]:
+    """Effect-state after adding each substance of the lookup data (by substance id) to `mask`."""
+    replaced = [0] * len(_RESULT_BITS)
+    added = [0] * len(_RESULT_BITS)
+    remaining = mask
+    while remaining:
+        effect_bit = remaining & -remaining
+        remaining ^= effect_bit
+        for substance_id, replacement_bit in _REPLACED_BY[effect_bit.bit_length() - 1]:
+            replaced[substance_id] |= effect_bit
+            added[substance_id] |= replacement_bit
+    return tuple(
+        (mask & ~replaced[substance_id]) | added[substance_id] | result_bit
+        for substance_id, result_bit in enumerate(_RESULT_BITS)
+    )
+
+
+class TransitionTable:
+    """
+    Compiled effect-state transitions for a list of substances.
+
+    Substances are addressed by their index in `names`. Applying a substance
+    replaces every active effect listed in its `side_effect_replacements` and then
+    adds its resulting effect, exactly like `_calculate_modificator`.
+    """
+
+    def __init__(self, substance_names: Iterable[str], transition_memo: Optional[TransitionMemo] = None):
+        self.names: List[str] = []
+        self.prices: List[Decimal] = []
+        self.levels: List[int] = []
+        self._result_bits: List[int] = []
+        self._replacements: List[tuple] = []
+        # substance ids of the lookup data; the memo is shared by tables of all levels
+        # unless the table gets its own `transition_memo`
+        self._ids: List[int] = []
+        transition_memo = transition_memo or memo
+        self._transition_memo = transition_memo.transitions
+        self._modifier_memo = transition_memo.modifiers
+        self._frozen_row = transition_memo.frozen_row
+        self._frozen_modifier = transition_memo.frozen_modifier
+
+        for name in substance_names:
+            index = substance_ids.get(name)
+            if index is None:
+                raise ValueError(f"Substance '{name}' not found!")
+            substance = substances[index]
+            self.names.append(name)
+            self.prices.append(substance.price)
+            self.levels.append(substance.level)
+            self._ids.append(index)
+            self._result_bits.append(_RESULT_BITS[index])
+            self._replacements.append(_REPLACEMENT_BITS[index])
+
+    @classmethod
+    def for_level(cls, max_level: int) -> "TransitionTable":
+        """Table over all substances up to `max_level`, in lookup order."""
+        return cls(substance.name for substance in substances if substance.level <= max_level)
+
+    @classmethod
+    def shared(cls, max_level: int) -> "TransitionTable":
+        """
+        Process-wide table for `max_level`, built on first use. Levels that unlock no
+        new substance share one table. Built before a server forks its workers (see
+        `functionality.engine`), the table is inherited by every worker instead of
+        being rebuilt per request.
+        """
+        names = tuple(substance.name for substance in substances if substance.level <= max_level)
+        table = _shared_tables.get(names)
+        if table is None:
+            table = _shared_tables.setdefault(names, cls(names))
+        return table
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def apply(self, mask: int, index: int) -> int:
+        """
+        Effect-state after adding substance `index` to `mask`. The states after every
+        substance are computed together (or read from the frozen states) and memoized
+        process-wide per `mask`, because the searches expand a state with all substances
+        one after another.
+        """
+        row = self._transition_memo.get(mask)
+        if row is None:
+            row = self._frozen_row(mask)
+            if row is None:
+                row = _successor_row(mask)
+            self._transition_memo.put(mask, row)
+        return row[self._ids[index]]
+
+    def commutes(self, a: int, b: int) -> bool:
+        """
+        True if substances `a` and `b` commute on every effect-state: neither one
+        replaces an effect that the other one reads, removes or adds.
+        """
+        def read_and_written(index: int) -> Tuple[int, int]:
+            read, written = 0, self._result_bits[index]
+            for effect_bit, replacement_bit in self._replacements[index]:
+                read |= effect_bit
+                written |= effect_bit | replacement_bit
+            return read, written
+
+        read_a, written_a = read_and_written(a)
+        read_b, written_b = read_and_written(b)
+        return not (read_a & written_b) and not (read_b & written_a)
+
+    def commutes_at(self, mask: int, a: int, b: int) -> bool:
+        """True if adding `a` then `b` to `mask` gives the same effect-state as `b` then `a`."""
+        return self.apply(self.apply(mask, a), b) == self.apply(self.apply(mask, b), a)
+
+    def _sources(self, index: int, effect_bit: int) -> Optional[Tuple[int, ...]]:
+        """
+        Inverse transition of one effect: after adding substance `index`, `effect_bit` is
+        active iff one of the returned effects was active before (None: always active).
+        """
+        if effect_bit == self._result_bits[index]:
+            return None
+        sources = [effect for effect, replacement in self._replacements[index] if replacement == effect_bit]
+        if all(effect != effect_bit for effect, _ in self._replacements[index]):
+            sources.append(effect_bit)  # not replaced by this substance, so it stays
+        return tuple(sources)
+
+    def preimage(self, index: int, must: int, must_not: int) -> List[Tuple[int, int]]:
+        """
+        States from which adding substance `index` leads into the cube of states that have
+        all effects of `must` and none of `must_not`, as a list of such cubes.
+
+        Every effect after a transition is an OR of effects before it, so "none of" maps to
+        a single cube and each "has" effect to a choice of one source effect.
+        """
+        if must_not & self._result_bits[index]:
+            return []
+
+        new_must_not = 0
+        for bit in _bits(must_not):
+            for source in self._sources(index, bit):
+                new_must_not |= source
+
+        cubes = {0}
+        for bit in _bits(must):
+            sources = self._sources(index, bit)
+            if sources is None:
+                continue
+            cubes = {
+                cube | source for cube in cubes for source in sources if not source & new_must_not
+            }
+        return [(cube, new_must_not) for cube in cubes]
+
+    def max_modifier_gain(self) -> float:
+        """
+        Upper bound for the modifier increase caused by adding a single substance:
+        its resulting effect plus every replacement that swaps in a more valuable effect.
+        """
+        gains = []
+        for index in range(len(self.names)):
+            gain = EFFECT_MODIFICATORS[self._result_bits[index].bit_length() - 1]
+            for effect_bit, replacement_bit in self._replacements[index]:
+                gain += max(
+                    0.0,
+                    EFFECT_MODIFICATORS[replacement_bit.bit_length() - 1]
+                    - EFFECT_MODIFICATORS[effect_bit.bit_length() - 1]
+                )
+            gains.append(gain)
+        return max(gains, default=0.0)
+
+    def removable_mask(self) -> int:
+        """Effects that at least one substance can replace."""
+        mask = 0
+        for replacements in self._replacements:
+            for effect_bit, _ in replacements:
+                mask |= effect_bit
+        return mask
+
+    def producible_mask(self) -> int:
+        """Effects that at least one substance can add (as result or replacement)."""
+        mask = 0
+        for index, replacements in enumerate(self._replacements):
+            mask |= self._result_bits[index]
+            for _, replacement_bit in replacements:
+                mask |= replacement_bit
+        return mask
+
+    def modifier_bound(self) -> Callable[[int, int], float]:
+        """
+        Function (mask, remaining) -> upper bound of the modifier reachable from `mask`
+        with at most `remaining` more substances. Each substance raises the modifier by at
+        most `max_modifier_gain` and adds at most one effect to the state.
+        """
+        gain = self.max_modifier_gain()
+        top_sums = [0.0]
+        for modificator in sorted(EFFECT_MODIFICATORS, reverse=True):
+            top_sums.append(top_sums[-1] + modificator)
+
+        def bound(mask: int, remaining: int) -> float:
+            effect_count = min(bin(mask).count("1") + remaining, len(top_sums) - 1)
+            return min(self.modifier(mask) + remaining * gain, top_sums[effect_count])
+        return bound
+
+    def modifier(self, mask: int) -> float:
+        """Total price modifier of an effect-state."""
+        modifier = self._modifier_memo.get(mask)
+        if modifier is None:
+            modifier = self._frozen_modifier(mask)
+            if modifier is None:
+                modifier = sum(
+                    EFFECT_MODIFICATORS[index] for index in range(len(EFFECT_NAMES)) if mask >> index & 1
+                )
+            self._modifier_memo.put(mask, modifier)
+        return modifier
+
+
+def reachable_states(table: TransitionTable, start_mask: int, depth: int) -> List[Set[int]]:
+    """
+    Distinct effect-states reachable with exactly 0..`depth` substances.
+
+    Returns:
+        List[Set[int]]: Element k holds the states reachable with k substances.
+    """
+    layers = [{start_mask}]
+    for _ in range(depth):
+        layers.append({
+            table.apply(state, index)
+            for state in layers[-1]
+            for index in range(len(table))
+        })
+    return layers
+
+
+def estimate_layer_sizes(table: TransitionTable, product_name: str, depth: int) -> List[int]:
+    """Distinct states per layer 0..depth: exact up to _SAMPLE_DEPTH, then extrapolated."""
+    key = (tuple(table.names), product_name)
+    sampled = _sampled_layer_sizes.get(key)
+    if sampled is None:
+        sampled = [len(layer) for layer in reachable_states(table, product_start_mask(product_name), _SAMPLE_DEPTH)]
+        _sampled_layer_sizes[key] = sampled
+
+    layers = sampled[:depth + 1]
+    growth = layers[-1] / layers[-2] if len(layers) > 1 and layers[-2] else len(table)
+    while len(layers) <= depth:
+        layers.append(min(int(layers[-1] * growth), len(table) ** len(layers)))
+    return layers
+
+
+def estimate_transitions(table: TransitionTable, product_name: str, depth: int) -> int:
+    """Estimated transitions of a layered search to `depth`: every state of layers 0..depth-1 is expanded once."""
+    return sum(estimate_layer_sizes(table, product_name, depth)[:-1]) * len(table)
@@ -0,0 +1,240 @@
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from src.lookup.lookup import products
+from src.util.models import CombinationResult, WarmupStatus
+from functionality.logging.logging_config import DEFAULT_LOG_DIR
+from functionality.planner import plan_search, resolve_max_level, run_plan
+from functionality.search_control import CancellationToken, SearchControl
+
+logger = logging.getLogger(__name__)
+
+# (product name, max level, combination size)
+Query = Tuple[str, int, int]
+
+DEFAULT_WARMUP_SIZES = (3, 4, 5)
+# Line written for every planned request by the webapp (see planner.explain)
+_PLAN_LOG_PATTERN = re.compile(r"Plan for best_mix: product=(\w+), level=(\d+), size=(\d+)")
+
+
+class BestMixCache:
+    """Thread-safe LRU cache of optimal best-mix results per (product, max level, size)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Query, Tuple[CombinationResult, CombinationResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: Query) -> Optional[Tuple[CombinationResult, CombinationResult]]:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None:
+                self._entries.move_to_end(query)
+            return entry
+
+    def put(self, query: Query, best_modifier: CombinationResult, best_profit: CombinationResult) -> None:
+        with self._lock:
+            self._entries[query] = (best_modifier, best_profit)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, query: Query) -> bool:
+        with self._lock:
+            return query in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def normalize_query(product_name: str, max_level, combination_size: int) -> Query:
+    """
+    The cache key of a best-mix request.
+
+    Raises:
+        ValueError: If the level is unknown or `combination_size` is below 1.
+    """
+    combination_size = int(combination_size)
+    if combination_size < 1:
+        raise ValueError("combination_size must be at least 1.")
+    return product_name.lower().replace(" ", "_"), resolve_max_level(max_level), combination_size
+
+
+def default_queries(sizes: Iterable[int] = DEFAULT_WARMUP_SIZES, max_level="max") -> List[Query]:
+    """Every product at `max_level` for each of `sizes`."""
+    return [normalize_query(product.name, max_level, size) for size in sizes for product in products]
+
+
+def parse_queries(spec: str) -> List[Query]:
+    """
+    Parse "product:level:size" items separated by commas, e.g. "cocaine:max:4,og_kush:12:3".
+    """
+    queries = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) != 3:
+            raise ValueError(f"Invalid warm-up query '{item}', expected product:level:size")
+        product_name, level, size = parts
+        queries.append(normalize_query(product_name, int(level) if level.isdigit() else level, int(size)))
+    return queries
+
+
+def queries_from_logs(log_dir: Optional[str] = None, top: int = 20) -> List[Query]:
+    """
+    The `top` most frequent best-mix requests found in the log files (rotated ones included).
+
+    The requests are read from the plan lines the webapp logs at INFO level, so logs
+    written with a higher LOG_LEVEL for the webapp yield no queries.
+    """
+    counts: Counter = Counter()
+    for path in glob.glob(os.path.join(log_dir or DEFAULT_LOG_DIR, "*.log*")):
+        try:
+            with open(path, errors="replace") as file:
+                for line in file:
+                    match = _PLAN_LOG_PATTERN.search(line)
+                    if match and int(match.group(3)) >= 1:
+                        counts[(match.group(1), int(match.group(2)), int(match.group(3)))] += 1
+        except OSError:
+            continue
+    return [query for query, _ in counts.most_common(top)]
+
+
+class Warmer:
+    """
+    Precomputes best-mix queries into a BestMixCache on a background thread.
+
+    `start` returns immediately; requests are served while the warm-up runs and use
+    whatever it has cached so far. Queries that are already cached are skipped, those
+    whose estimated run time exceeds `max_estimated_seconds` too (the webapp would
+    reject them). The thread is started per process, so in a pre-fork server every
+    worker warms its own cache once it handles its first request. `run` can warm the
+    cache in the master process first, within a total time cap; the forked workers
+    inherit what it cached and their background warm-up only runs the rest.
+
+    Args:
+        cache (BestMixCache): Cache to fill.
+        queries (List[Query]): Queries in the order they are warmed.
+        max_estimated_seconds (float, optional): Skip queries estimated above this.
+        time_budget (float, optional): Time budget per query; results of queries that
+            hit it are not cached.
+    """
+
+    def __init__(
+        self,
+        cache: BestMixCache,
+        queries: List[Query],
+        max_estimated_seconds: Optional[float] = None,
+        time_budget: Optional[float] = None
+    ):
+        self.cache = cache
+        self.queries = list(dict.fromkeys(queries))
+        self.max_estimated_seconds = max_estimated_seconds
+        self.time_budget = time_budget
+
+        self._cancel_token = CancellationToken()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._status = WarmupStatus(state="idle", total=len(self.queries))
+        self._started_at = 0.0
+
+    def start(self) -> None:
+        """
+        Start the warm-up thread unless it already runs (or ran) in this process or
+        was completed by `run` before this process was forked.
+        """
+        with self._lock:
+            if self._pid == os.getpid() or self._status.state == "ready":
+                return
+            self._begin()
+            self._thread = threading.Thread(target=self._run, name="best-mix-warmup", daemon=True)
+            self._thread.start()
+
+    def run(self, max_seconds: float) -> None:
+        """
+        Warm up in the calling thread for at most `max_seconds`, e.g. before a pre-fork
+        server forks its workers. If the cap is hit, the state is "partial" and `start`
+        warms the remaining queries in the background.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._begin()
+        self._run(deadline=time.time() + max_seconds)
+        with self._lock:
+            if self._status.state == "partial":
+                self._pid = None
+
+    def _begin(self) -> None:
+        self._pid = os.getpid()
+        self._status = WarmupStatus(state="running", total=len(self.queries))
+        self._started_at = time.time()
+
+    def stop(self) -> None:
+        self._cancel_token.cancel()
+
+    def status(self) -> WarmupStatus:
+        with self._lock:
+            status = WarmupStatus(**vars(self._status))
+        if status.state == "running":
+            status.elapsed = time.time() - self._started_at
+        return status
+
+    def _update(self, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self._status, name, value)
+
+    def _run(self, deadline: Optional[float] = None) -> None:
+        completed = skipped = failed = 0
+        for product_name, max_level, combination_size in self.queries:
+            if self._cancel_token.cancelled or (deadline is not None and time.time() >= deadline):
+                break
+            query = (product_name, max_level, combination_size)
+            self._update(current=f"{product_name}:{max_level}:{combination_size}")
+            try:
+                if query in self.cache:
+                    skipped += 1
+                    continue
+                plan = plan_search("best_mix", product_name, max_level, combination_size, allow_parallel=False)
+                if self.max_estimated_seconds is not None and plan.estimate.seconds > self.max_estimated_seconds:
+                    skipped += 1
+                    continue
+                control = SearchControl(
+                    time_budget=self.time_budget, deadline=deadline, cancel_token=self._cancel_token
+                )
+                best_modifier, best_profit = run_plan(plan, control)
+                if control.optimal:
+                    self.cache.put(query, best_modifier, best_profit)
+                    completed += 1
+                else:
+                    skipped += 1
+            except Exception:
+                logger.exception("Warm-up of %s failed", query)
+                failed += 1
+            finally:
+                self._update(completed=completed, skipped=skipped, failed=failed)
+
+        if self._cancel_token.cancelled:
+            state = "cancelled"
+        elif deadline is not None and time.time() >= deadline:
+            state = "partial"
+        else:
+            state = "ready"
+        self._update(
+            state=state,
+            current=None,
+            elapsed=time.time() - self._started_at,
+        )
+        logger.info(
+            "Warm-up finished: %d cached, %d skipped, %d failed in %.1fs",
+            completed, skipped, failed, time.time() - self._started_at
+        )
@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+from array import array
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.util.models import CombinationResult, PriceScenario
+from functionality.planner import resolve_max_level
+from functionality.solvers import get_product
+from functionality.transitions import TransitionTable, mask_to_effects, product_start_mask
+
+
+class RecipeTable:
+    """
+    Price-independent table of candidate recipes for fast what-if price analysis.
+
+    Effect-states and modifiers do not depend on prices, and all orders of the same
+    substances cost the same under every price vector. The table therefore keeps one
+    recipe per multiset of substances (the order with the highest modifier) and drops
+    multisets whose modifier is not higher than that of one of their sub-multisets,
+    because those can never be more profitable while prices are non-negative.
+
+    Modifiers, sizes and effect-states are stored in compact arrays, sorted by
+    descending modifier, so a scenario can stop scanning as soon as no remaining recipe
+    can beat the best one found.
+    """
+
+    def __init__(self, product_name: str, max_level: Union[int, str] = "max", combination_size: int = 4):
+        self.product = get_product(product_name.lower().replace(" ", "_"))
+        self.table = TransitionTable.for_level(resolve_max_level(max_level))
+        self.combination_size = combination_size
+
+        # (effect-state, sorted substance indices) -> first path reaching it
+        layer: Dict[Tuple[int, Tuple[int, ...]], Tuple[int, ...]] = {(product_start_mask(self.product.name), ()): ()}
+        best: Dict[Tuple[int, ...], Tuple[float, int, Tuple[int, ...]]] = {}
+        for _ in range(combination_size):
+            next_layer: Dict[Tuple[int, Tuple[int, ...]], Tuple[int, ...]] = {}
+            for (mask, multiset), path in layer.items():
+                for index in range(len(self.table)):
+                    key = (self.table.apply(mask, index), tuple(sorted(multiset + (index,))))
+                    if key not in next_layer:
+                        next_layer[key] = path + (index,)
+            for (mask, multiset), path in next_layer.items():
+                modifier = self.table.modifier(mask)
+                if multiset not in best or modifier > best[multiset][0]:
+                    best[multiset] = (modifier, mask, path)
+            layer = next_layer
+        self.enumerated = len(best)
+
+        # Highest modifier of any proper, non-empty sub-multiset
+        sub_best: Dict[Tuple[int, ...], float] = {}
+        for multiset in sorted(best, key=len):
+            sub_best[multiset] = max(
+                (
+                    max(best[smaller][0], sub_best[smaller])
+                    for smaller in {multiset[:i] + multiset[i + 1:] for i in range(len(multiset))}
+                    if smaller
+                ),
+                default=float("-inf"),
+            )
+        kept = sorted(
+            (entry for multiset, entry in best.items() if entry[0] > sub_best[multiset]),
+            key=lambda entry: -entry[0],
+        )
+
+        self.modifiers = array("d", (modifier for modifier, _, _ in kept))
+        self.masks = array("Q", (mask for _, mask, _ in kept))
+        self.sizes = array("B", (len(path) for _, _, path in kept))
+        self.paths: List[Tuple[int, ...]] = [path for _, _, path in kept]
+        # (substance index, count) per recipe, the only price-dependent part
+        self._terms: List[Tuple[Tuple[int, int], ...]] = [
+            tuple((index, path.count(index)) for index in sorted(set(path))) for path in self.paths
+        ]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _scenario_prices(self, scenario: PriceScenario) -> Tuple[List[Decimal], Decimal]:
+        prices = list(self.table.prices)
+        index_of = {name: index for index, name in enumerate(self.table.names)}
+        for name, price in (scenario.substance_prices or {}).items():
+            if name not in index_of:
+                raise ValueError(f"Substance '{name}' not found!")
+            prices[index_of[name]] = Decimal(str(price))
+        for name, factor in (scenario.price_factors or {}).items():
+            if name not in index_of:
+                raise ValueError(f"Substance '{name}' not found!")
+            prices[index_of[name]] *= Decimal(str(factor))
+        if any(price < 0 for price in prices):
+            raise ValueError("Substance prices must not be negative.")
+
+        base_price = self.product.base_sell_price
+        if scenario.base_sell_price is not None:
+            base_price = Decimal(str(scenario.base_sell_price))
+        return prices, base_price
+
+    def best_for_scenarios(self, scenarios: Iterable[PriceScenario]) -> List[Optional[CombinationResult]]:
+        """
+        Most profitable recipe for every scenario, in the order of `scenarios`.
+
+        Each scenario scans the recipes by descending modifier and stops once
+        base_price * (1 + modifier) minus the cheapest substance can no longer beat the
+        best profit found, so most recipes are never priced.
+        """
+        results = []
+        modifiers, terms = self.modifiers, self._terms
+        for scenario in scenarios:
+            prices, base_price = self._scenario_prices(scenario)
+            float_prices = [float(price) for price in prices]
+            base = float(base_price)
+            cheapest = min(float_prices)
+
+            best_profit = float("-inf")
+            best_index = None
+            for index, modifier in enumerate(modifiers):
+                revenue = base * (1 + modifier)
+                if revenue - cheapest <= best_profit:
+                    break
+                profit = revenue - sum(float_prices[substance] * count for substance, count in terms[index])
+                if profit > best_profit:
+                    best_profit, best_index = profit, index
+
+            results.append(None if best_index is None else self._result(best_index, prices, base_price))
+        return results
+
+    def _result(self, index: int, prices: List[Decimal], base_price: Decimal) -> CombinationResult:
+        path = self.paths[index]
+        return CombinationResult(
+            sell_price=Decimal(float(base_price) * (1 + self.modifiers[index])),
+            substance_cost=sum((prices[substance] for substance in path), Decimal("0")),
+            modifier=self.modifiers[index],
+            substances=[self.table.names[substance] for substance in path],
+            effects=mask_to_effects(self.masks[index]),
+        )
+
+
+def price_sensitivity(
+    recipe_table: RecipeTable,
+    substance_name: str,
+    factors: Iterable[float]
+) -> Dict[float, Optional[CombinationResult]]:
+    """Best recipe when the price of one substance is multiplied by each of `factors`."""
+    factors = list(factors)
+    scenarios = [
+        PriceScenario(name=f"{substance_name} x{factor}", price_factors={substance_name: factor})
+        for factor in factors
+    ]
+    return dict(zip(factors, recipe_table.best_for_scenarios(scenarios)))
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="What-if analysis of substance and product prices.")
+    parser.add_argument("--product", default="cocaine")
+    parser.add_argument("--max_level", default="max")
+    parser.add_argument("--combination_size", type=int, default=4)
+    parser.add_argument("--substance", default="cuke")
+    parser.add_argument("--factors", nargs="+", type=float, default=[0.5, 1.0, 1.2, 2.0, 5.0])
+    parser.add_argument("--benchmark", type=int, default=1000, help="random scenarios to time (0 = off)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    recipes = RecipeTable(args.product, args.max_level, args.combination_size)
+    print(
+        f"Recipe table: {len(recipes)} of {recipes.enumerated} substance multisets kept "
+        f"({time.perf_counter() - start:.2f}s)"
+    )
+
+    for factor, best in price_sensitivity(recipes, args.substance, args.factors).items():
+        profit = best.sell_price - best.substance_cost
+        print(f"{args.substance} x{factor:<5} profit {profit:8.2f}$  {', '.join(best.substances)}")
+
+    if args.benchmark:
+        rng = random.Random(0)
+        scenarios = [
+            PriceScenario(
+                price_factors={name: rng.uniform(0.5, 2.0) for name in recipes.table.names},
+                base_sell_price=float(recipes.product.base_sell_price) * rng.uniform(0.8, 1.2),
+            )
+            for _ in range(args.benchmark)
+        ]
+        start = time.perf_counter()
+        recipes.best_for_scenarios(scenarios)
+        elapsed = time.perf_counter() - start
+        print(f"{args.benchmark} random scenarios in {elapsed:.2f}s ({elapsed / args.benchmark * 1e3:.2f} ms each)")
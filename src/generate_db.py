@@ -0,0 +1,50 @@
+import argparse
+import os
+from typing import List
+
+from functionality.calc_modifier import extend_size_entries, generate_size_entries
+from src.datenbank.initialize_db import initialize_database
+from src.datenbank.populate_db import populate_database
+
+
+def main(
+    products: List[str],
+    sizes: List[int],
+    max_level: str,
+    db_path: str,
+    chunk_size: int,
+    layout: str = None,
+    extend: bool = False,
+    snapshot_dir: str = None,
+):
+    # create schema and reference data for a new database file
+    if not os.path.exists(db_path):
+        initialize_database(db_path, layout)
+        populate_database(db_path)
+
+    for product in products:
+        for size in sorted(sizes):
+            if extend:
+                written = extend_size_entries(size, product, max_level, db_path, snapshot_dir)
+            else:
+                written = generate_size_entries(size, product, max_level, db_path, chunk_size)
+            print(f"{product} / size {size}: {written} combination(s) written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resumable batch generation of stored combinations. "
+                    "Interrupted runs continue from the last committed chunk."
+    )
+    parser.add_argument("--products", nargs="+", required=True, help="e.g. cocaine og_kush")
+    parser.add_argument("--sizes", nargs="+", type=int, required=True, help="combination sizes, e.g. 1 2 3 4")
+    parser.add_argument("--max_level", default="max")
+    parser.add_argument("--db", default="combinations.db")
+    parser.add_argument("--chunk_size", type=int, default=50_000, help="combinations per transaction")
+    parser.add_argument("--layout", choices=("normalized", "packed"), help="layout of a new database file")
+    parser.add_argument("--extend", action="store_true",
+                        help="grow each size from the distinct states of the previous size (one row per state)")
+    parser.add_argument("--snapshot_dir", help="read/write state snapshots for --extend")
+    args = parser.parse_args()
+
+    main(args.products, args.sizes, args.max_level, args.db, args.chunk_size, args.layout, args.extend, args.snapshot_dir)
@@ -0,0 +1,248 @@
+import hashlib
+import marshal
+import os
+import sys
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.util.models import Effect, Product, Substance
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DATA_PATH = os.path.join(DATA_DIR, "lookup.json")
+# Version of the data file format this loader understands
+DATA_VERSION = 1
+# Bump when the layout of the snapshot tables changes, so old snapshots are recompiled
+SNAPSHOT_FORMAT = 2
+
+
+@dataclass
+class LookupData:
+    version: int
+    # SHA-256 of the data file the snapshot was compiled from
+    content_hash: str
+    level_name_to_int: Dict[str, int]
+    quality_name_to_int: Dict[str, int]
+    effects: List[Effect]
+    products: List[Product]
+    substances: List[Substance]
+    # Interned ids: index in `effects` / `substances`
+    effect_ids: Dict[str, int]
+    substance_ids: Dict[str, int]
+    # Per substance: (resulting effect id, ((replaced effect id, replacement effect id), ...))
+    transitions: List[Tuple[int, Tuple[Tuple[int, int], ...]]]
+
+
+def default_snapshot_path(data_path: str) -> str:
+    return os.path.splitext(data_path)[0] + ".snapshot"
+
+
+def _level(levels: Dict[str, int], value) -> int:
+    if isinstance(value, int):
+        return value
+    if value not in levels:
+        raise ValueError(f"Invalid level name: {value}")
+    return levels[value]
+
+
+def compile_lookup(raw: bytes) -> LookupData:
+    """
+    Validate the JSON lookup data and build LookupData from it: dataclasses with Decimal
+    prices, interned effect/substance ids and the per-substance transitions.
+    """
+    import json  # only needed when (re)compiling
+
+    data = json.loads(raw)
+    if data.get("version") != DATA_VERSION:
+        raise ValueError(f"Unsupported lookup data version: {data.get('version')!r} (expected {DATA_VERSION})")
+
+    levels = {name: int(value) for name, value in data["levels"].items()}
+    qualities = {name: int(value) for name, value in data["qualities"].items()}
+    effects = [Effect(name=entry["name"], modificator=float(entry["modificator"])) for entry in data["effects"]]
+    effect_ids = {effect.name: index for index, effect in enumerate(effects)}
+
+    def effect_id(name: str) -> int:
+        if name not in effect_ids:
+            raise ValueError(f"Effect '{name}' not found!")
+        return effect_ids[name]
+
+    products = []
+    for entry in data["products"]:
+        for name in entry.get("effects", []):
+            effect_id(name)
+        quality = entry.get("quality", "n_a")
+        products.append(Product(
+            name=entry["name"],
+            base_sell_price=Decimal(entry["base_sell_price"]),
+            buy_price=Decimal(entry["buy_price"]),
+            level=_level(levels, entry["level"]),
+            effects=list(entry.get("effects", [])),
+            quality=qualities[quality] if isinstance(quality, str) else int(quality),
+        ))
+
+    substances = []
+    transitions = []
+    for entry in data["substances"]:
+        replacements = dict(entry.get("side_effect_replacements", {}))
+        substances.append(Substance(
+            name=entry["name"],
+            price=Decimal(entry["price"]),
+            level=_level(levels, entry["level"]),
+            resulting_effect=entry["resulting_effect"],
+            side_effect_replacements=replacements,
+        ))
+        transitions.append((
+            effect_id(entry["resulting_effect"]),
+            tuple((effect_id(effect), effect_id(replacement)) for effect, replacement in replacements.items()),
+        ))
+
+    return LookupData(
+        version=data["version"],
+        content_hash=hashlib.sha256(raw).hexdigest(),
+        level_name_to_int=levels,
+        quality_name_to_int=qualities,
+        effects=effects,
+        products=products,
+        substances=substances,
+        effect_ids=effect_ids,
+        substance_ids={substance.name: index for index, substance in enumerate(substances)},
+        transitions=transitions,
+    )
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _to_tables(lookup: LookupData) -> tuple:
+    """Flat tables of `lookup` made of str, int, float, tuple and dict only (prices as str)."""
+    return (
+        lookup.version,
+        lookup.content_hash,
+        lookup.level_name_to_int,
+        lookup.quality_name_to_int,
+        tuple((effect.name, effect.modificator) for effect in lookup.effects),
+        tuple(
+            (product.name, str(product.base_sell_price), str(product.buy_price), product.level,
+             tuple(product.effects or ()), product.quality)
+            for product in lookup.products
+        ),
+        tuple(
+            (substance.name, str(substance.price), substance.level, substance.resulting_effect,
+             substance.side_effect_replacements)
+            for substance in lookup.substances
+        ),
+        tuple(lookup.transitions),
+    )
+
+
+def _from_tables(tables: tuple) -> LookupData:
+    version, content_hash, levels, qualities, effect_rows, product_rows, substance_rows, transitions = tables
+    effects = [Effect(name=name, modificator=modificator) for name, modificator in effect_rows]
+    substances = [
+        Substance(name=name, price=Decimal(price), level=level, resulting_effect=resulting_effect,
+                  side_effect_replacements=dict(replacements))
+        for name, price, level, resulting_effect, replacements in substance_rows
+    ]
+    return LookupData(
+        version=version,
+        content_hash=content_hash,
+        level_name_to_int=dict(levels),
+        quality_name_to_int=dict(qualities),
+        effects=effects,
+        products=[
+            Product(name=name, base_sell_price=Decimal(base_sell_price), buy_price=Decimal(buy_price),
+                    level=level, effects=list(product_effects), quality=quality)
+            for name, base_sell_price, buy_price, level, product_effects, quality in product_rows
+        ],
+        substances=substances,
+        effect_ids={effect.name: index for index, effect in enumerate(effects)},
+        substance_ids={substance.name: index for index, substance in enumerate(substances)},
+        transitions=list(transitions),
+    )
+
+
+def write_snapshot(lookup: LookupData, data_path: str, snapshot_path: str) -> None:
+    """
+    Write the tables of `lookup` with the data file's stamp (to a temporary file, then swapped in).
+
+    The snapshot is written with marshal and holds plain values only, so loading it never
+    imports modules or runs code the way unpickling can.
+    """
+    payload = (SNAPSHOT_FORMAT, _file_stamp(data_path), _to_tables(lookup))
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        marshal.dump(payload, file)
+    os.replace(tmp_path, snapshot_path)
+
+
+def _read_snapshot(snapshot_path: str) -> Optional[tuple]:
+    """(file stamp, LookupData) of the snapshot, or None if it is missing, malformed or outdated."""
+    try:
+        with open(snapshot_path, "rb") as file:
+            payload = marshal.loads(file.read())
+        if not isinstance(payload, tuple) or len(payload) != 3 or payload[0] != SNAPSHOT_FORMAT:
+            return None
+        return tuple(payload[1]), _from_tables(payload[2])
+    except (OSError, EOFError, ValueError, TypeError, ArithmeticError):
+        return None
+
+
+def load_lookup(data_path: Optional[str] = None, snapshot_path: Optional[str] = None) -> LookupData:
+    """
+    Load the lookup data, from the compiled snapshot if it is up to date.
+
+    The snapshot is trusted if the data file's modification time and size match the ones
+    stored in it, or else if the data file's hash matches its content hash. Otherwise the
+    data file is compiled and the snapshot rewritten (skipped if the directory is not
+    writable). `data_path` defaults to the LOOKUP_DATA environment variable or
+    `data/lookup.json`; the snapshot lies next to it. The snapshot holds plain values only:
+    a tampered one can give wrong data (as a tampered data file can), but cannot run code.
+    """
+    data_path = data_path or os.environ.get("LOOKUP_DATA") or DEFAULT_DATA_PATH
+    snapshot_path = snapshot_path or default_snapshot_path(data_path)
+
+    snapshot = _read_snapshot(snapshot_path)
+    if snapshot is not None and snapshot[0] == _file_stamp(data_path):
+        return snapshot[1]
+
+    with open(data_path, "rb") as file:
+        raw = file.read()
+    if snapshot is not None and snapshot[1].content_hash == hashlib.sha256(raw).hexdigest():
+        lookup = snapshot[1]
+    else:
+        lookup = compile_lookup(raw)
+    try:
+        write_snapshot(lookup, data_path, snapshot_path)
+    except OSError:
+        pass
+    return lookup
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Compile the lookup data file into its binary snapshot.")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--snapshot", default=None)
+    args = parser.parse_args()
+
+    snapshot = args.snapshot or default_snapshot_path(args.data)
+    start = time.perf_counter()
+    with open(args.data, "rb") as data_file:
+        compiled = compile_lookup(data_file.read())
+    compile_seconds = time.perf_counter() - start
+    write_snapshot(compiled, args.data, snapshot)
+
+    start = time.perf_counter()
+    load_lookup(args.data, snapshot)
+    load_seconds = time.perf_counter() - start
+    print(
+        f"{len(compiled.effects)} effects, {len(compiled.products)} products, {len(compiled.substances)} substances; "
+        f"hash {compiled.content_hash[:12]}; compile {compile_seconds * 1e3:.2f} ms, "
+        f"snapshot load {load_seconds * 1e3:.2f} ms -> {snapshot}"
+    )
@@ -1,11 +1,19 @@
 import argparse
+import sys
+from contextlib import nullcontext
 from typing import Optional
 
 from functionality.calc_modifier import (
     find_min_substances_for_effect,
+    find_min_substances_for_effects,
     get_best_mix,
     print_result,
 )
+from functionality.batch import run_batch_file
+from functionality.profiling import DEFAULT_PROFILE_DIR, profile_search
+from functionality.search_control import SearchControl
+from functionality.transition_memo import format_memo_stats, memo
+from functionality.planner import calibrate, plan_search, run_plan, explain
 
 def main(
     product: str,
@@ -14,6 +22,9 @@ def main(
     max_level: str,
     max_search_size: int,
     combination_size: int,
+    time_budget: Optional[float] = None,
+    show_plan: bool = False,
+    beam_width: Optional[int] = None,
 ):
     # call find_min_substances_for_effect (use keyword args to avoid positional mixups)
     size, results = find_min_substances_for_effect(
@@ -24,6 +35,7 @@ def main(
         max_search_size=max_search_size,
         max_results=10,
         combination_search_limit=200_000,
+        control=SearchControl(time_budget=time_budget),
     )
 
     if size == 0:
@@ -34,14 +46,28 @@ def main(
             print(f"\nResult {idx}:")
             print_result(res)
 
-    # call get_best_mix
-    all_combinations, best_modifier, best_profit = get_best_mix(
-        combination_size=combination_size,
-        product_name=product,
-        max_level=max_level,
-    )
+    control = SearchControl(time_budget=time_budget)
+    if show_plan:
+        # let the planner pick the strategy and show estimated vs. actual cost
+        calibrate(product)
+        plan = plan_search("best_mix", product, max_level, combination_size)
+        best_modifier, best_profit = run_plan(plan, control)
+        print(explain(plan))
+    else:
+        # call get_best_mix
+        # a beam width switches to the approximate beam search
+        all_combinations, best_modifier, best_profit = get_best_mix(
+            combination_size=combination_size,
+            product_name=product,
+            max_level=max_level,
+            control=control,
+            approximate=beam_width is not None,
+            beam_width=beam_width or 200,
+        )
 
     print("\n--- Best Results from get_best_mix ---")
+    if not control.optimal:
+        print(f"Search stopped early ({control.reason}); results may not be optimal.")
     if best_modifier:
         print("Best modifier-combination:")
         print_result(best_modifier)
@@ -54,6 +80,32 @@ def main(
     else:
         print("No best profit-combination found.")
 
+def print_all_effects(
+    product: str,
+    not_desired: Optional[str],
+    max_level: str,
+    max_search_size: int,
+    time_budget: Optional[float] = None,
+):
+    """Cheapest minimal combination for every single effect, from one search."""
+    control = SearchControl(time_budget=time_budget)
+    answers = find_min_substances_for_effects(
+        product_name=product,
+        not_desired_effects=not_desired,
+        max_level=max_level,
+        max_search_size=max_search_size,
+        max_results=1,
+        control=control,
+    )
+    if not control.optimal:
+        print(f"Search stopped early ({control.reason}); unanswered effects may still be reachable.")
+    for effect, (size, results) in answers.items():
+        if size:
+            print(f"{effect}: {size} — {', '.join(results[0].substances)} (cost {results[0].substance_cost})")
+        else:
+            print(f"{effect}: not found up to size {max_search_size}")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run calc_modifier quick checks.")
     parser.add_argument("--product", default="cocaine")
@@ -62,13 +114,44 @@ if __name__ == "__main__":
     parser.add_argument("--max_level", default="max", help="Level name or int")
     parser.add_argument("--max_search_size", type=int, default=4)
     parser.add_argument("--combination_size", type=int, default=4)
+    parser.add_argument("--time_budget", type=float, default=None, help="Seconds per search (default: unlimited)")
+    parser.add_argument("--explain", action="store_true", help="Use the search planner and print its plan")
+    parser.add_argument("--beam_width", type=int, default=None,
+                        help="Approximate best mix with a beam search of this width (for large sizes)")
+    parser.add_argument("--all_effects", action="store_true",
+                        help="Print the minimal combination for every single effect (one search)")
+    parser.add_argument("--batch", default=None,
+                        help="Answer JSONL queries from this file ('-' for stdin) instead of a single query")
+    parser.add_argument("--output", default=None, help="JSONL output file for --batch (default: stdout)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --batch")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the run (pstats + collapsed stacks, worker profiles merged)")
+    parser.add_argument("--profile_dir", default=DEFAULT_PROFILE_DIR, help="Output directory for --profile")
 
     args = parser.parse_args()
-    main(
-        product=args.product,
-        desired=args.desired,
-        not_desired=args.not_desired,
-        max_level=args.max_level,
-        max_search_size=args.max_search_size,
-        combination_size=args.combination_size,
-    )
\ No newline at end of file
+    profiling = profile_search("batch" if args.batch else "cli", args.profile_dir) if args.profile else nullcontext()
+    with profiling as report:
+        if args.batch:
+            stats = run_batch_file(args.batch, args.output, args.workers)
+            print(
+                f"{stats['queries']} queries ({stats['unique']} unique, {stats['errors']} errors) "
+                f"in {stats['seconds']:.2f}s",
+                file=sys.stderr,
+            )
+            print(f"Transition memo: {format_memo_stats(memo.stats())}", file=sys.stderr)
+        elif args.all_effects:
+            print_all_effects(args.product, args.not_desired, args.max_level, args.max_search_size, args.time_budget)
+        else:
+            main(
+                product=args.product,
+                desired=args.desired,
+                not_desired=args.not_desired,
+                max_level=args.max_level,
+                max_search_size=args.max_search_size,
+                combination_size=args.combination_size,
+                time_budget=args.time_budget,
+                show_plan=args.explain,
+                beam_width=args.beam_width,
+            )
+    if report:
+        print(f"Profile: {report.pstats_path} / {report.collapsed_path}", file=sys.stderr)
\ No newline at end of file
@@ -1,6 +1,6 @@
 from decimal import Decimal
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Union
 
 @dataclass
 class CombinationResult:
@@ -31,3 +31,105 @@ class Substance:
     level: int
     resulting_effect: str
     side_effect_replacements: Dict[str, str]
+
+@dataclass
+class DominanceReport:
+    kept: List[str]
+    pruned: Dict[str, str]
+    original_space: int
+    reduced_space: int
+
+@dataclass
+class CommutationReport:
+    commuting_pairs: List[Tuple[str, str]]
+    state_commuting_share: float
+    original_space: int
+    static_space: int
+    per_state_space: int
+    results_preserved: Optional[bool] = None
+
+@dataclass
+class SearchProgress:
+    evaluated: int
+    total: int
+    percent: float
+    elapsed: float
+    best_so_far: Optional[CombinationResult] = None
+
+@dataclass
+class StrategyEstimate:
+    work: int
+    seconds: float
+    memory: int
+
+@dataclass
+class SearchPlan:
+    objective: str
+    product_name: str
+    max_level: int
+    combination_size: int
+    strategy: str
+    estimates: Dict[str, StrategyEstimate]
+    actual_work: Optional[int] = None
+    actual_seconds: Optional[float] = None
+
+    @property
+    def estimate(self) -> StrategyEstimate:
+        return self.estimates[self.strategy]
+
+@dataclass
+class RecipeQuery:
+    product_name: str
+    max_level: Union[int, str] = "max"
+    include_effects: List[str] = None
+    exclude_effects: List[str] = None
+    max_substance_cost: Optional[Decimal] = None
+    min_profit: Optional[Decimal] = None
+    max_substances: int = 4
+    max_results: int = 10
+
+@dataclass
+class PriceScenario:
+    name: str = ""
+    substance_prices: Dict[str, Decimal] = None
+    price_factors: Dict[str, float] = None
+    base_sell_price: Optional[Decimal] = None
+
+@dataclass
+class WarmupStatus:
+    state: str
+    total: int
+    completed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    current: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+@dataclass
+class ProfileReport:
+    directory: str
+    pstats_path: Optional[str] = None
+    collapsed_path: Optional[str] = None
+    # (function, own seconds, cumulative seconds, calls), hottest first
+    top_functions: List[Tuple[str, float, float, int]] = None
+    worker_profiles: int = 0
+    samples: int = 0
+
+@dataclass
+class MemoStats:
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    evictions: int
+    # approximate bytes held by the keys, values and the table itself
+    memory_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,71 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from functionality import export
+from functionality.export import export_columns, export_combinations, stored_chunks
+from functionality.planner import resolve_max_level
+from functionality.transitions import TransitionTable
+
+PRODUCT = "cocaine"
+SIZES = [1, 2]
+# small chunks, so the effect dictionary grows over many record batches
+CHUNK_SIZE = 17
+
+
+def _export_csv(tmp_path):
+    path = str(tmp_path / "combinations.csv")
+    export_combinations([PRODUCT], path, "csv", sizes=SIZES, chunk_size=CHUNK_SIZE)
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_csv_export_has_every_combination(tmp_path):
+    rows = _export_csv(tmp_path)
+    substance_count = len(TransitionTable.shared(resolve_max_level("max")))
+
+    assert rows[0] == export_columns(max(SIZES))
+    assert len(rows) - 1 == substance_count + substance_count ** 2
+    header = rows[0]
+    first = dict(zip(header, rows[1]))
+    assert first["combination_size"] == "1"
+    assert first["substance_2"] == ""
+
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_arrow_export_matches_csv(tmp_path, file_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    expected = _export_csv(tmp_path)
+    header = expected[0]
+    path = str(tmp_path / f"combinations{export.FILE_EXTENSIONS[file_format]}")
+    export_combinations([PRODUCT], path, file_format, sizes=SIZES, chunk_size=CHUNK_SIZE)
+
+    if file_format == "parquet":
+        table = pq.read_table(path)
+    else:
+        with pa.ipc.open_stream(path) as reader:
+            table = reader.read_all()
+
+    assert table.num_rows == len(expected) - 1
+    for column in ("effects", "substance_1", "substance_2"):
+        values = ["" if value is None else value for value in table.column(column).to_pylist()]
+        assert values == [row[header.index(column)] for row in expected[1:]]
+
+
+def test_stored_chunks_rejects_unknown_substance(monkeypatch):
+    id_maps = {"substances": {"unknown_weed": 999}, "effects": {}}
+    monkeypatch.setattr(export, "get_id_map", lambda db_path, table: id_maps[table])
+    # (id, modifier, sell price, substance cost, effect mask, max level, substance ids)
+    monkeypatch.setattr(
+        export, "iter_stored_combinations", lambda *args: iter([[(1, 0.5, 10.0, 5.0, 0, 1, (999,))]])
+    )
+
+    with pytest.raises(ValueError, match="unknown_weed"):
+        list(stored_chunks(PRODUCT, 1, db_path="combinations.db"))
@@ -1,16 +1,222 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, current_app, g, render_template, request, jsonify
 import sys, os
+import hashlib
+import logging
+import threading
+from dataclasses import asdict
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
-from functionality.calc_modifier import get_best_mix
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from functionality.search_control import SearchControl
+from functionality.planner import calibrate, plan_search, run_plan, explain
+from functionality.engine import lookup_data_hash, preload_engine
+from functionality.profiling import DEFAULT_PROFILE_DIR, profile_search
+from functionality.transition_memo import memo
+from functionality.warmup import (
+    BestMixCache, Warmer, default_queries, normalize_query, parse_queries, queries_from_logs
+)
 from src.lookup.lookup import level_name_to_int, products
 from functionality.logging.logging_config import setup_logging
 
-logger = setup_logging()
+logger = setup_logging(__name__)
 
-app = Flask(__name__)
+bp = Blueprint("main", __name__)
 
-@app.route('/', methods=['GET', 'POST'])
+
+def create_app(config=None, preload=None):
+    """
+    Application factory and the only entry point, e.g. for a pre-fork server:
+    gunicorn --preload -w 4 "webapp.app:create_app()"
+    The module builds no app on import, so the server builds exactly one.
+
+    With `preload` (default: PRELOAD_ENGINE environment variable, on) the transition
+    tables and planner estimates are built here, i.e. once in the master process, and
+    the forked workers share them instead of building their own. The result cache is
+    warmed in the background after startup; only with WARMUP_BEFORE_FORK a capped
+    part of the warm-up runs here first.
+    """
+    app = Flask(__name__)
+    # Maximum seconds a single request may spend in the search (0 disables the limit)
+    app.config["SEARCH_TIME_BUDGET"] = float(os.environ.get("SEARCH_TIME_BUDGET", 30))
+    # Requests whose estimated run time exceeds MAX_ESTIMATED_SECONDS are rejected,
+    # those above QUEUE_ESTIMATED_SECONDS wait for one of HEAVY_SEARCH_SLOTS
+    app.config["MAX_ESTIMATED_SECONDS"] = float(os.environ.get("MAX_ESTIMATED_SECONDS", 120))
+    app.config["QUEUE_ESTIMATED_SECONDS"] = float(os.environ.get("QUEUE_ESTIMATED_SECONDS", 5))
+    app.config["HEAVY_SEARCH_SLOTS"] = int(os.environ.get("HEAVY_SEARCH_SLOTS", 1))
+    app.config["ALLOW_PARALLEL_SEARCH"] = os.environ.get("ALLOW_PARALLEL_SEARCH", "0") == "1"
+    app.config["PRELOAD_ENGINE"] = os.environ.get("PRELOAD_ENGINE", "1") == "1"
+    # Scale the planner's run time estimates to this machine (ignored if PLANNER_SPEED_FACTOR is set)
+    app.config["CALIBRATE_PLANNER"] = os.environ.get("CALIBRATE_PLANNER", "1") == "1"
+    # Warm-up: WARMUP_QUERIES ("product:level:size,...", default: every product at max
+    # level, sizes 3-5) plus the WARMUP_FROM_LOGS most frequent requests in the logs
+    app.config["WARMUP_ENABLED"] = os.environ.get("WARMUP_ENABLED", "1") == "1"
+    app.config["WARMUP_QUERIES"] = os.environ.get("WARMUP_QUERIES")
+    app.config["WARMUP_FROM_LOGS"] = int(os.environ.get("WARMUP_FROM_LOGS", 20))
+    # Opt-in: warm up in create_app (with preloading) for at most WARMUP_BEFORE_FORK_SECONDS,
+    # so pre-forked workers inherit the results; the rest is warmed in the background
+    app.config["WARMUP_BEFORE_FORK"] = os.environ.get("WARMUP_BEFORE_FORK", "0") == "1"
+    app.config["WARMUP_BEFORE_FORK_SECONDS"] = float(os.environ.get("WARMUP_BEFORE_FORK_SECONDS", 10))
+    app.config["RESULT_CACHE_SIZE"] = int(os.environ.get("RESULT_CACHE_SIZE", 1024))
+    # Seconds browsers and proxies may reuse a /get_best_mix response without revalidating
+    app.config["RESULT_MAX_AGE"] = int(os.environ.get("RESULT_MAX_AGE", 300))
+    # Per-request profiling (?profile=1 or "X-Profile: 1"), only if PROFILING_ENABLED
+    app.config["PROFILING_ENABLED"] = os.environ.get("PROFILING_ENABLED", "0") == "1"
+    app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+    app.config.update(config or {})
+
+    app.extensions["heavy_search_slots"] = threading.BoundedSemaphore(app.config["HEAVY_SEARCH_SLOTS"])
+    # one profiled request at a time: Python 3.12+ allows only one active profiler
+    app.extensions["profile_lock"] = threading.Lock()
+    cache = app.extensions["best_mix_cache"] = BestMixCache(app.config["RESULT_CACHE_SIZE"])
+    app.extensions["warmer"] = Warmer(
+        cache,
+        _warmup_queries(app.config) if app.config["WARMUP_ENABLED"] else [],
+        max_estimated_seconds=app.config["MAX_ESTIMATED_SECONDS"],
+        time_budget=app.config["SEARCH_TIME_BUDGET"] or None,
+    )
+    app.register_blueprint(bp)
+
+    if app.config["CALIBRATE_PLANNER"]:
+        logger.info("Planner speed factor: %.2f", calibrate())
+    preload = app.config["PRELOAD_ENGINE"] if preload is None else preload
+    if preload:
+        stats = preload_engine()
+        logger.info(
+            "Engine preloaded: %d table(s), %d frozen state(s) in %.2fs",
+            stats["tables"], stats["states"], stats["seconds"]
+        )
+        if app.config["WARMUP_BEFORE_FORK"]:
+            app.extensions["warmer"].run(app.config["WARMUP_BEFORE_FORK_SECONDS"])
+    return app
+
+
+def _warmup_queries(config):
+    queries = config["WARMUP_QUERIES"]
+    if queries is None:
+        queries = default_queries()
+    elif isinstance(queries, str):
+        queries = parse_queries(queries)
+    if config["WARMUP_FROM_LOGS"]:
+        if not logger.isEnabledFor(logging.INFO):
+            logger.warning(
+                "WARMUP_FROM_LOGS reads the request plans logged at INFO level, which the log level suppresses"
+            )
+        queries = list(queries) + queries_from_logs(top=config["WARMUP_FROM_LOGS"])
+    return queries
+
+
+@bp.before_app_request
+def _start_warmup():
+    # started by the first request of each process, i.e. after a pre-fork server forked
+    # (a no-op if WARMUP_BEFORE_FORK already warmed everything in create_app)
+    current_app.extensions["warmer"].start()
+
+
+# Part of every ETag; bump when the response format or the search results change
+BEST_MIX_RESPONSE_VERSION = 1
+
+
+def _result_etag(query, plan):
+    """
+    ETag of a /get_best_mix response: the normalized request, the lookup-data hash and
+    everything else that decides which of several equally good results is returned
+    (the chosen strategy and ALLOW_PARALLEL_SEARCH).
+    """
+    parts = (
+        BEST_MIX_RESPONSE_VERSION, lookup_data_hash(), *query,
+        plan.strategy, int(current_app.config["ALLOW_PARALLEL_SEARCH"]),
+    )
+    key = ":".join(map(str, parts))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _set_cache_headers(response, etag):
+    """ETag on every optimal result; only GET responses may be stored by shared caches."""
+    response.set_etag(etag)
+    if request.method == 'GET':
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config["RESULT_MAX_AGE"]
+    return response
+
+
+class SearchTooExpensive(ValueError):
+    pass
+
+
+def _profiling_requested():
+    if not current_app.config["PROFILING_ENABLED"]:
+        return False
+    return request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+
+
+@bp.after_app_request
+def _add_profile_header(response):
+    report = g.get("profile_report")
+    if report is not None:
+        # run id, i.e. the directory below PROFILE_DIR; the server path is not exposed
+        response.headers["X-Profile"] = os.path.basename(report.directory)
+    return response
+
+
+def _search_control():
+    budget = current_app.config["SEARCH_TIME_BUDGET"]
+    return SearchControl(time_budget=budget if budget > 0 else None)
+
+
+def _run_plan_profiled(plan, control):
+    """run_plan, profiled into PROFILE_DIR if the request asked for it (one at a time)."""
+    if not _profiling_requested():
+        return run_plan(plan, control)
+    name = f"request-{plan.product_name}-{plan.combination_size}"
+    with current_app.extensions["profile_lock"]:
+        with profile_search(name, current_app.config["PROFILE_DIR"]) as report:
+            result = run_plan(plan, control)
+    g.profile_report = report
+    return result
+
+
+def _plan_best_mix(combination_size, product_name, max_level):
+    return plan_search(
+        "best_mix", product_name, max_level, combination_size,
+        allow_parallel=current_app.config["ALLOW_PARALLEL_SEARCH"]
+    )
+
+
+def _run_best_mix(plan):
+    """
+    Answer a planned search from the result cache if possible, otherwise reject or
+    queue it based on its estimate and run it within the time budget.
+
+    Returns (best_modifier, best_profit, optimal).
+    """
+    config = current_app.config
+    cache = current_app.extensions["best_mix_cache"]
+    query = (plan.product_name, plan.max_level, plan.combination_size)
+    cached = cache.get(query)
+    if cached is not None:
+        logger.info(explain(plan))
+        return cached[0], cached[1], True
+
+    if plan.estimate.seconds > config["MAX_ESTIMATED_SECONDS"]:
+        raise SearchTooExpensive(
+            f"Request rejected: estimated run time {plan.estimate.seconds:.0f}s exceeds "
+            f"the limit of {config['MAX_ESTIMATED_SECONDS']:.0f}s. Use a smaller combination size."
+        )
+
+    control = _search_control()
+    if plan.estimate.seconds > config["QUEUE_ESTIMATED_SECONDS"]:
+        with current_app.extensions["heavy_search_slots"]:
+            best_modifier, best_profit = _run_plan_profiled(plan, control)
+    else:
+        best_modifier, best_profit = _run_plan_profiled(plan, control)
+
+    logger.info(explain(plan))
+    if control.optimal:
+        cache.put(query, best_modifier, best_profit)
+    return best_modifier, best_profit, control.optimal
+
+
+@bp.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         combination_size = int(request.form['combination_size'])
@@ -18,7 +224,9 @@ def index():
         max_level = request.form['level']
 
         try:
-            combinations_data, best_modifier, best_profit = get_best_mix(combination_size, product_name, max_level)
+            best_modifier, best_profit, optimal = _run_best_mix(
+                _plan_best_mix(combination_size, product_name, max_level)
+            )
 
             # Log best results to console (best_modifier is a CombinationResult)
             try:
@@ -33,7 +241,7 @@ def index():
                 'index.html',
                 best_modifier=best_modifier,
                 best_profit=best_profit,
-                combinations_data=combinations_data,
+                optimal=optimal,
                 level_name_to_int=level_name_to_int,
                 products=products
             )
@@ -49,23 +257,39 @@ def index():
     return render_template('index.html', level_name_to_int=level_name_to_int, products=products)
 
 
-@app.route('/get_best_mix', methods=['POST'])
+@bp.route('/get_best_mix', methods=['GET', 'POST'])
 def get_best_mix_json():
     """AJAX JSON endpoint for the client script.
 
-    Expects JSON body: { level, combination_size, product_name }
+    Expects JSON body (POST) or query parameters (GET): { level, combination_size, product_name }
     Returns JSON with serialized best_modifier and best_profit or { error: message }.
+    'optimal' is false if the search hit SEARCH_TIME_BUDGET and returned its best result so far.
+
+    Optimal results carry an ETag (request, lookup-data hash, strategy and search flags);
+    GET responses are also public with a max-age, and a GET with a matching If-None-Match
+    is answered with 304 before any search runs.
     """
     try:
-        data = request.get_json(force=True)
+        data = request.args if request.method == 'GET' else request.get_json(force=True)
         if not data:
-            return jsonify({'error': 'Missing JSON body'}), 400
+            missing = 'Missing query parameters' if request.method == 'GET' else 'Missing JSON body'
+            return jsonify({'error': missing}), 400
+
+        try:
+            query = normalize_query(data.get('product_name'), data.get('level'), data.get('combination_size'))
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid request: {e}'}), 400
+        product_name, max_level, combination_size = query
 
-        combination_size = int(data.get('combination_size'))
-        product_name = data.get('product_name')
-        max_level = data.get('level')
+        try:
+            plan = _plan_best_mix(combination_size, product_name, max_level)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid request: {e}'}), 400
+        etag = _result_etag(query, plan)
+        if request.method == 'GET' and request.if_none_match.contains(etag):
+            return _set_cache_headers(current_app.response_class(status=304), etag)
 
-        combinations_data, best_modifier, best_profit = get_best_mix(combination_size, product_name, max_level)
+        best_modifier, best_profit, optimal = _run_best_mix(plan)
 
         # helper to convert dataclass-like CombinationResult to JSON-serializable dict
         def _serialize(cr):
@@ -89,13 +313,42 @@ def get_best_mix_json():
 
         response = {
             'best_modifier': _serialize(best_modifier),
-            'best_profit': _serialize(best_profit)
+            'best_profit': _serialize(best_profit),
+            'optimal': optimal
         }
 
-        return jsonify(response)
+        response = jsonify(response)
+        if optimal:
+            return _set_cache_headers(response, etag)
+        response.cache_control.no_store = True
+        return response
+    except SearchTooExpensive as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         logger.exception('Error in /get_best_mix')
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/health', methods=['GET'])
+def health():
+    """Liveness plus warm-up progress. Requests are served during the warm-up."""
+    status = current_app.extensions["warmer"].status()
+    return jsonify({
+        'status': 'ok',
+        'ready': status.ready,
+        'warmup': asdict(status),
+        'cached_results': len(current_app.extensions["best_mix_cache"]),
+        'transition_memo': {name: {**asdict(entry), 'hit_rate': entry.hit_rate} for name, entry in memo.stats().items()},
+    })
+
+
+@bp.route('/health/ready', methods=['GET'])
+def health_ready():
+    """200 once the warm-up has finished, 503 while it is running (for readiness probes)."""
+    status = current_app.extensions["warmer"].status()
+    return jsonify({'ready': status.ready, 'warmup': asdict(status)}), 200 if status.ready else 503
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # development server only; deployments use the factory, see create_app
+    create_app().run(debug=True)
\ No newline at end of file
@@ -9,17 +9,13 @@ document.addEventListener("DOMContentLoaded", function() {
         const combinationSize = document.getElementById("combination-size").value;
         const productName = document.getElementById("product-name").value;
 
-        fetch("/get_best_mix", {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json"
-            },
-            body: JSON.stringify({
-                level: level,
-                combination_size: combinationSize,
-                product_name: productName
-            })
-        })
+        // GET, so the browser can reuse cached results (ETag / Cache-Control)
+        const params = new URLSearchParams({
+            level: level,
+            combination_size: combinationSize,
+            product_name: productName
+        });
+        fetch(`/get_best_mix?${params}`)
         .then(response => response.json())
         .then(data => {
             if (data.error) {
@@ -34,6 +30,9 @@ document.addEventListener("DOMContentLoaded", function() {
                     <p>Substance Cost: ${data.best_modifier.substance_cost.toFixed(2)}$</p>
                     <p>Profit: ${(data.best_modifier.sell_price - data.best_modifier.substance_cost).toFixed(2)}$</p>
                 `;
+                if (data.optimal === false) {
+                    resultDiv.innerHTML += `<p>Time limit reached: this is the best result found so far and may not be optimal.</p>`;
+                }
             }
         })
         .catch(error => {